@@ -0,0 +1,228 @@
+# AcquisitionEngine.py
+# DATE: 18/10 2026
+
+# Polls several instruments (power supply, electronic load, more battery packs, ...) concurrently on
+# one shared timebase and writes all of them into a single sample log.
+#
+# Every channel owns its serial port and a dedicated thread, so the serial round trips of the
+# channels overlap instead of adding up. On each tick of the SamplingScheduler, all channels are
+# asked to sample at the same time. A channel that has not answered before the tick deadline, or is
+# still busy with an earlier tick, gets NaN for that tick instead of holding the others back.
+#
+# The getter functions of the collectors are used as the channel drivers.
+
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+from SampleLog import SampleLogWriter
+from SamplingScheduler import SamplingScheduler
+from SerialTransport import SerialTransport
+
+# Time units
+sec = 1
+min = 60 * sec
+hour = 60 * min
+day = 24 * hour
+
+# Parameters
+RUN_ID = "1"
+MEASURING_TIME = 3 * day # Measuring time in s
+MEASURING_INTERVAL = 1 * sec # Measuring interval in s
+TICK_TIMEOUT_FRACTION = 0.8 # Part of the interval that the channels get to answer before their sample is marked as missing
+FSYNC_EVERY = 60 # Amount of samples to write before forcing them to disk
+PRINT_EVERY = 600 # Amount of ticks between status prints
+OFF_ATTEMPTS = 3 # Times the off command of a channel is sent before the channel is reported as not off
+OFF_SETTLE_TIME = 1 * sec # Time between turning a channel off and reading its on state back
+
+RUN_NAME = f"MultiData_RUN_ID-{RUN_ID}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}"
+
+def openSerial(port):
+    return SerialTransport(port)
+
+class Channel:
+    # name: prefix of the columns of this channel in the run store, e.g. "load"
+    # read: function(ser) returning a tuple of values, one per column
+    # setup/shutdown: optional functions(ser) called at start and end of the run
+    # is_on: optional function(ser) returning the on state of the output, read back after shutdown
+    def __init__(self, name, port, read, columns, setup=None, shutdown=None, is_on=None, open=openSerial):
+        self.name = name
+        self.port = port
+        self.read = read
+        self.columns = list(columns)
+        self.setup = setup
+        self.shutdown = shutdown
+        self.is_on = is_on
+        self.open = open
+        self.ser = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"channel-{name}") # One thread per port
+        self.pending = None
+        self.missing = 0
+
+    # Sample in the channel thread. Returns (time of the sample relative to start, values)
+    def sample(self, clock, start):
+        before = clock()
+        values = self.read(self.ser)
+        after = clock()
+        return (before + after) / 2 - start, values
+
+    def missingValues(self):
+        return (np.nan,) * (len(self.columns) + 1)
+
+class AcquisitionEngine:
+    def __init__(self, channels, interval, duration, path, timeout_fraction=TICK_TIMEOUT_FRACTION, fsync_every=FSYNC_EVERY, clock=time.monotonic, sleep=time.sleep, metadata=None):
+        self.channels = channels
+        self.interval = interval
+        self.timeout = interval * timeout_fraction
+        self.clock = clock
+        self.sleep = sleep
+        self.columns = ["t"]
+        for channel in channels:
+            self.columns += [f"{channel.name}.t"] + [f"{channel.name}.{c}" for c in channel.columns]
+        meta = dict(metadata or {})
+        meta["channels"] = [{"name": c.name, "port": c.port, "columns": c.columns} for c in channels]
+        self.path = path
+        self.log = SampleLogWriter(path, self.columns, metadata=meta, fsync_every=fsync_every)
+        self.scheduler = SamplingScheduler(interval, duration, timing_path=path.replace(".bin", "_timing.bin"), clock=clock, sleep=sleep)
+
+    def connect(self):
+        for channel in self.channels:
+            channel.ser = channel.open(channel.port)
+            print(f"Connected channel {channel.name} on {channel.port}")
+            if channel.setup is not None:
+                channel.setup(channel.ser)
+
+    # Ask every idle channel for a sample and collect what has arrived before the deadline
+    def tick(self, t):
+        start = self.scheduler.start
+        for channel in self.channels:
+            if channel.pending is None:
+                channel.pending = channel.executor.submit(channel.sample, self.clock, start)
+        wait([c.pending for c in self.channels], timeout=self.timeout)
+
+        row = [t]
+        for channel in self.channels:
+            if channel.pending.done():
+                try:
+                    t_channel, values = channel.pending.result()
+                    row += [t_channel, *values]
+                except Exception as e:
+                    print(f"Channel {channel.name} failed to sample ({e})")
+                    channel.missing += 1
+                    row += channel.missingValues()
+                channel.pending = None
+            else: # Still busy, it is collected on a later tick instead
+                channel.missing += 1
+                row += channel.missingValues()
+        return row
+
+    def run(self):
+        for n, (t_nominal, t) in enumerate(self.scheduler.ticks()):
+            with self.scheduler.phase("query"):
+                row = self.tick(t)
+            with self.scheduler.phase("save"):
+                self.log.append(*row)
+            if n % PRINT_EVERY == 0:
+                print(f"Measurement time: {t:.0f} s, missing samples per channel: " + ", ".join(f"{c.name}: {c.missing}" for c in self.channels))
+                self.scheduler.printStats()
+
+    # Turn off every channel first, then the bookkeeping. Every step runs even if an earlier one fails.
+    # Raises at the end if a channel could not be turned off
+    def close(self):
+        not_off = []
+        for channel in self.channels:
+            # Let a sample still running in the channel thread finish, so the port is not used by two threads
+            channel.executor.shutdown(wait=True, cancel_futures=True)
+            if channel.ser is None:
+                continue
+            try:
+                if not self.turnOff(channel):
+                    print(f"Channel {channel.name} is still on after {OFF_ATTEMPTS} off commands")
+                    not_off.append(channel.name)
+            except Exception as e:
+                print(f"Could not turn off channel {channel.name} ({e})")
+                not_off.append(channel.name)
+            try:
+                channel.ser.close()
+                print(f"Closed channel {channel.name} on {channel.port}")
+            except Exception as e:
+                print(f"Could not close the port of channel {channel.name} ({e})")
+
+        for name, step in [("close the sample log", self.log.close), ("close the scheduler", self.scheduler.close),
+                ("print the timing statistics", self.scheduler.printStats), ("save the timing statistics", self.saveTimingStats),
+                ("save the serial statistics", self.saveSerialStats)]:
+            try:
+                step()
+            except Exception as e:
+                print(f"Could not {name} ({e}). Continuing...")
+        if not_off:
+            raise Exception(f"CHANNELS {', '.join(not_off)} MAY NOT BE OFF. PROCEED WITH CAUTION!")
+
+    # Send the off command of a channel and read the on state back, again if it is still on.
+    # Returns False if the channel is still on after OFF_ATTEMPTS tries
+    def turnOff(self, channel):
+        if channel.shutdown is None:
+            return True
+        for attempt in range(OFF_ATTEMPTS):
+            channel.shutdown(channel.ser)
+            if channel.is_on is None:
+                return True
+            self.sleep(OFF_SETTLE_TIME)
+            if not channel.is_on(channel.ser):
+                return True
+            print(f"Channel {channel.name} is still on after the off command. Retrying...")
+        return False
+
+    def saveTimingStats(self):
+        self.scheduler.saveStats(self.path.replace(".bin", "_timing.json"))
+
+    def saveSerialStats(self):
+        serial_stats = {c.name: c.ser.statsReport() for c in self.channels if isinstance(c.ser, SerialTransport)}
+        with open(self.path.replace(".bin", "_serial.json"), "w") as f:
+            json.dump(serial_stats, f, indent=4)
+
+# Channels for the standard setup: the power supply charging one pack and the electronic load discharging another
+def standardChannels():
+    import PowerSupplyDataCollector as psu
+    import DischargeDataCollector as load
+
+    def setupCharger(ser):
+        psu.setOnState(ser, False)
+        psu.setSetCurrent(ser, psu.CC_CURRENT)
+        psu.setSetVoltage(ser, psu.CC_VOLTAGE)
+        psu.setOnState(ser, True)
+
+    def setupLoad(ser):
+        load.setOnState(ser, False)
+        load.setCWPower(ser, load.CW_POWER)
+        load.setCCCurrent(ser, load.CC_MAX_CURRENT)
+        load.setOnState(ser, True)
+
+    return [
+        Channel("charger", psu.COM_PORT, lambda ser: (psu.getOutputCurrent(ser), psu.getOutputVoltage(ser)), ["I", "U"],
+            setup=setupCharger, shutdown=lambda ser: psu.setOnState(ser, False), is_on=psu.getOnState),
+        Channel("load", load.COM_PORT, load.getMeasureAll, ["I", "U", "P"],
+            setup=setupLoad, shutdown=lambda ser: load.setOnState(ser, False), is_on=load.getOnState),
+    ]
+
+def main():
+    from wakepy import keepawake # For keeping the computer turned awake when running
+
+    os.makedirs("data/multi", exist_ok=True)
+    engine = AcquisitionEngine(standardChannels(), MEASURING_INTERVAL, MEASURING_TIME, f"data/multi/{RUN_NAME}.bin",
+        metadata={"run_id": RUN_ID, "measuring_time": MEASURING_TIME, "measuring_interval": MEASURING_INTERVAL})
+    try:
+        with keepawake(keep_screen_awake=False):
+            engine.connect()
+            print("Measurement started!")
+            engine.run()
+            print("Measurement done!\n")
+    finally:
+        print("***********************************************************")
+        print("Program exiting... Turning off all channels and closing ports.")
+        engine.close()
+        print("***********************************************************\n")
+
+if __name__ == "__main__":
+    main()
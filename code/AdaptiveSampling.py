@@ -0,0 +1,58 @@
+# AdaptiveSampling.py
+# DATE: 18/10 2026
+
+# Chooses the sampling interval from how fast the signals change. On the hours-long plateau the
+# voltage and current hardly move and a sample every few minutes says everything, while at the
+# CC -> CV knee and at the end-of-discharge collapse they change within seconds.
+#
+# The interval is the time it takes the fastest changing signal to move by its resolution
+# (e.g. 10 mV or 10 mA), limited to [fast_interval, slow_interval]. Near a level (a cutoff voltage,
+# just below the CV voltage) the fast interval is always used. When the signals calm down, the interval grows
+# by at most backoff per sample, so a short quiet spell in the middle of a transient is not missed.
+#
+# The rates are measured against the newest sample that is at least `window` s old, and changes
+# smaller than the resolution are ignored, so measurement noise does not look like a fast change.
+
+from collections import deque
+
+# A level for the band from `start` to `end` below level, e.g. the approach to the CV voltage of a charge.
+# Unlike a margin around the level, the band does not hold the fast interval while the signal stays at the level
+def bandBelow(column, level, start, end):
+    return (column, level - (start + end) / 2, (start - end) / 2)
+
+class AdaptiveRate:
+    # resolutions: {column: change worth a sample}, e.g. {"U": 0.01, "I": 0.01}
+    # levels: list of (column, level, margin). Within margin of level, the fast interval is used
+    def __init__(self, fast_interval, slow_interval, resolutions, levels=(), window=10.0, backoff=2.0):
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.resolutions = dict(resolutions)
+        self.levels = list(levels)
+        self.window = window
+        self.backoff = backoff
+        self.history = deque() # (t, {column: value}) of the samples in the last window
+        self.interval = fast_interval
+        self.rates = {column: 0.0 for column in self.resolutions}
+
+    # Add a sample and return the interval until the next one
+    def update(self, t, **values):
+        self.history.append((t, values))
+        # Keep exactly one sample older than the window to measure the rates against
+        while len(self.history) > 2 and t - self.history[1][0] >= self.window:
+            self.history.popleft()
+        t_ref, ref = self.history[0]
+
+        interval = self.slow_interval
+        if t > t_ref:
+            for column, resolution in self.resolutions.items():
+                change = values[column] - ref[column]
+                self.rates[column] = change / (t - t_ref)
+                if abs(change) > resolution:
+                    interval = min(interval, resolution / abs(self.rates[column]))
+        for column, level, margin in self.levels:
+            if abs(values[column] - level) <= margin:
+                interval = self.fast_interval
+
+        interval = min(interval, self.interval * self.backoff) # Back off gradually
+        self.interval = max(self.fast_interval, min(self.slow_interval, interval))
+        return self.interval
@@ -0,0 +1,83 @@
+# AdaptiveSamplingBenchmark.py
+# DATE: 18/10 2026
+
+# Compares fixed rate and adaptive sampling (AdaptiveSampling.py) on simulated runs: a CW discharge
+# down to the voltage collapse and a CC-CV charge through the knee, using the battery model of the
+# simulated instruments with measurement noise. The reference is the trace at the fast interval.
+# For each strategy: samples (serial round trips), storage, the RMS error when the trace is
+# reconstructed by linear interpolation, and the error in the time to cutoff / time to charged.
+
+import numpy as np
+from SimulatedInstruments import BatteryModel, SimulatedElectronicLoad, SimulatedPowerSupply
+from AdaptiveSampling import AdaptiveRate
+from RunAnalysis import crossingTime, CURRENT_THRESHOLD
+
+# Parameters
+FAST_INTERVAL = 0.5 # s, also the step of the reference trace
+SLOW_INTERVAL = 120 # s
+RESOLUTIONS = {"U": 0.01, "I": 0.01}
+NOISE = 0.0005 # Relative measurement noise
+BYTES_PER_SAMPLE = 32 # t, I, U, P as float64
+CUTOFF_VOLTAGE = 9.0 # V
+CUTOFF_MARGIN = 0.5 # V
+
+# Reference trace at the fast interval: (t, I, U) with noise
+def referenceTrace(instrument, duration, rng):
+    n = int(duration / FAST_INTERVAL)
+    t = np.arange(n) * FAST_INTERVAL
+    I = np.empty(n)
+    U = np.empty(n)
+    for k in range(n):
+        instrument.applyOutput()
+        I[k] = abs(instrument.battery.current)
+        U[k] = instrument.battery.terminalVoltage()
+        instrument.battery.step(FAST_INTERVAL)
+    I *= 1 + rng.normal(0, NOISE, n)
+    U *= 1 + rng.normal(0, NOISE, n)
+    return t, I, U
+
+# Indices of the reference samples that a strategy would take
+def fixedIndices(n, interval):
+    return np.arange(0, n, int(round(interval / FAST_INTERVAL)))
+
+def adaptiveIndices(t, I, U, levels):
+    rate = AdaptiveRate(FAST_INTERVAL, SLOW_INTERVAL, RESOLUTIONS, levels=levels)
+    indices = []
+    k = 0
+    while k < len(t):
+        indices.append(k)
+        interval = rate.update(t[k], U=U[k], I=I[k])
+        k += max(1, int(round(interval / FAST_INTERVAL)))
+    return np.array(indices)
+
+def compare(name, t, I, U, levels, event):
+    print(f"\n{name}, {t[-1] / 3600:.1f} h")
+    print(f"{'Strategy':<14} {'Samples':>8} {'Storage (kB)':>13} {'RMS dU (mV)':>12} {'RMS dI (mA)':>12} {'Event error (s)':>16}")
+    t_event = event(t, I, U)
+    for strategy, indices in [("Fixed 0.5 s", fixedIndices(len(t), FAST_INTERVAL)), ("Fixed 1 s", fixedIndices(len(t), 1)),
+            (f"Fixed {SLOW_INTERVAL} s", fixedIndices(len(t), SLOW_INTERVAL)), ("Adaptive", adaptiveIndices(t, I, U, levels))]:
+        ts, Is, Us = t[indices], I[indices], U[indices]
+        rms_du = np.sqrt(np.mean((np.interp(t, ts, Us) - U) ** 2))
+        rms_di = np.sqrt(np.mean((np.interp(t, ts, Is) - I) ** 2))
+        t_sampled = event(ts, Is, Us)
+        event_error = abs(t_sampled - t_event) if t_sampled is not None and t_event is not None else float("nan")
+        print(f"{strategy:<14} {len(indices):>8} {len(indices) * BYTES_PER_SAMPLE / 1000:>13.1f} {rms_du * 1000:>12.1f} {rms_di * 1000:>12.1f} {event_error:>16.1f}")
+
+def main():
+    rng = np.random.default_rng(0)
+
+    load = SimulatedElectronicLoad(battery=BatteryModel(capacity=5.0, soc=1.0))
+    load.power = 24
+    load.on = True
+    t, I, U = referenceTrace(load, 3 * 3600, rng)
+    compare("Discharge at 24 W", t, I, U, [("U", CUTOFF_VOLTAGE, CUTOFF_MARGIN)], lambda t, I, U: crossingTime(t, U, CUTOFF_VOLTAGE, below=True))
+
+    psu = SimulatedPowerSupply(battery=BatteryModel(capacity=5.0, soc=0.05))
+    psu.iset = 2
+    psu.vset = 12.6
+    psu.on = True
+    t, I, U = referenceTrace(psu, 5 * 3600, rng)
+    compare("CC-CV charge at 2 A, 12.6 V", t, I, U, [], lambda t, I, U: crossingTime(t, I, CURRENT_THRESHOLD, below=True))
+
+if __name__ == "__main__":
+    main()
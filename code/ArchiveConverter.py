@@ -0,0 +1,82 @@
+# ArchiveConverter.py
+# DATE: 18/10 2026
+
+# Converts the charging and discharging runs in the run catalog to run archives (.arc, see
+# RunArchive.py) next to the original files, adds them to the catalog and reports the size
+# reduction and the read time against loading the .npy files like the plotters do.
+# The original files are kept.
+
+import os
+import time
+from RunArchive import ARCHIVE_EXTENSION, RunArchive, writeArchive, loadArchive
+from RunCatalog import RunCatalog, NPY_COLUMNS, fileSummary
+from RunMetadata import RunMetadata, metadataPath
+from SampleLog import SAMPLE_LOG_EXTENSION, loadRunArrays, mapSampleLog, CHARGE_COLUMNS, DISCHARGE_COLUMNS
+
+# Parameters
+MODES = ["charging", "discharging"]
+READ_REPEATS = 5 # Best of this many reads is reported
+COLUMNS = {"charging": CHARGE_COLUMNS, "discharging": DISCHARGE_COLUMNS}
+
+# Catalog fields that are stored in the archive metadata
+METADATA_FIELDS = ["mode", "run_id", "cw_power", "cc_current", "cc_voltage", "temperature", "date", "date_note", "notes",
+    "measuring_time", "measuring_interval", "merged_from", "idn"]
+
+def archiveMetadata(entry):
+    metadata = {field: entry[field] for field in METADATA_FIELDS if entry.get(field) is not None}
+    if entry["path"].endswith(SAMPLE_LOG_EXTENSION):
+        header = mapSampleLog(entry["path"])[1]
+        metadata.update({k: v for k, v in header.items() if k != "columns"})
+    record_path = metadataPath(entry["path"])
+    if os.path.exists(record_path): # The run metadata file (see RunMetadata.py) goes into the archive too
+        metadata["run_metadata"] = RunMetadata(record_path).record
+    metadata.setdefault("idn", entry.get("instrument_idn")) # Not recorded for the older runs
+    metadata["source"] = os.path.basename(entry["path"])
+    return metadata
+
+def convertRun(entry):
+    mode = entry["mode"]
+    arrays = loadRunArrays(entry["path"], NPY_COLUMNS[mode])
+    archive_path = os.path.splitext(entry["path"])[0] + ARCHIVE_EXTENSION
+    writeArchive(archive_path, dict(zip(COLUMNS[mode], arrays)), archiveMetadata(entry))
+    return archive_path
+
+def bestTime(function):
+    times = []
+    for _ in range(READ_REPEATS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    catalog = RunCatalog()
+    catalog.scan()
+    entries = [e for mode in MODES for e in catalog.find(mode=mode) if not e["path"].endswith(ARCHIVE_EXTENSION)]
+
+    print(f"{'Run':<28} {'Original (kB)':>14} {'Archive (kB)':>13} {'Ratio':>6} {'Load (ms)':>10} {'Archive (ms)':>13} {'U only (ms)':>12}")
+    totals = [0, 0, 0.0, 0.0, 0.0]
+    for entry in entries:
+        mode = entry["mode"]
+        archive_path = convertRun(entry)
+        archive_entry = {k: v for k, v in entry.items() if k != "path"}
+        archive_entry.update(fileSummary(archive_path, mode))
+        catalog.update(archive_path, **archive_entry)
+
+        original_size = os.path.getsize(entry["path"])
+        archive_size = os.path.getsize(archive_path)
+        load_time = bestTime(lambda: [a.sum() for a in loadRunArrays(entry["path"], NPY_COLUMNS[mode])]) # sum() so memory mapped data is really read
+        archive_time = bestTime(lambda: loadArchive(archive_path))
+        column_time = bestTime(lambda: RunArchive(archive_path).column("U"))
+        for k, value in enumerate([original_size, archive_size, load_time, archive_time, column_time]):
+            totals[k] += value
+        print(f"{mode + ' ' + entry['run_id']:<28} {original_size / 1000:>14.1f} {archive_size / 1000:>13.1f} {original_size / archive_size:>6.2f} "
+            f"{load_time * 1000:>10.2f} {archive_time * 1000:>13.2f} {column_time * 1000:>12.2f}")
+
+    catalog.save()
+    if entries:
+        print(f"{'Total':<28} {totals[0] / 1000:>14.1f} {totals[1] / 1000:>13.1f} {totals[0] / totals[1]:>6.2f} "
+            f"{totals[2] * 1000:>10.2f} {totals[3] * 1000:>13.2f} {totals[4] * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    main()
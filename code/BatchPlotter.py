@@ -0,0 +1,102 @@
+# BatchPlotter.py
+# DATE: 18/10 2026
+
+# Renders the final plots (plots/final/RUN_ID-*) of every run in the run catalog, in parallel with a
+# process pool. A run is skipped if its figures exist and neither its data, the plot settings nor
+# the code of the plotter and the modules it uses (PLOT_DEPENDENCIES) has changed since they were rendered. This is tracked with a content hash per run
+# in data/plot_cache.json.
+
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from FileHash import fileHash
+from RunCatalog import RunCatalog
+
+# Parameters
+CACHE_PATH = "data/plot_cache.json"
+NUMBER_OF_WORKERS = os.cpu_count() # Amount of processes rendering in parallel
+FORCE_REPLOT = False # Flag to choose if all runs are replotted, even if they are up to date
+PLOTTERS = {"discharging": "DischargeDataPlotter", "charging": "PowerSupplyDataPlotter"} # Plotter module per mode
+PLOT_DEPENDENCIES = ["RunData", "SampleLog", "RunArchive", "RunAnalysis", "Decimation"] # Modules the plotters read, calculate or decimate with
+
+# Hash of everything that decides how the figures of a run look: its data, the plot settings, the plotter
+# code and the code of the modules it depends on
+def plotKey(filename, plotter):
+    h = hashlib.sha256()
+    h.update(fileHash(filename).encode())
+    h.update(json.dumps(plotter.PLOT_SETTINGS, sort_keys=True).encode())
+    for module in [plotter] + [importlib.import_module(name) for name in PLOT_DEPENDENCIES]:
+        h.update(fileHash(module.__file__).encode())
+    return h.hexdigest()
+
+def loadCache(path=CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def saveCache(cache, path=CACHE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def initWorker():
+    import matplotlib
+    matplotlib.use("Agg") # No GUI in the workers
+
+# Runs in a worker process
+def renderRun(module_name, filename, path, name):
+    plotter = importlib.import_module(module_name)
+    plotter.plotRun(filename, path, name)
+    return plotter.figureFiles(path, name)
+
+def main():
+    catalog = RunCatalog()
+    cache = {} if FORCE_REPLOT else loadCache()
+
+    # Find the runs whose figures are missing or out of date
+    jobs = []
+    up_to_date = 0
+    missing = []
+    for mode, module_name in PLOTTERS.items():
+        plotter = importlib.import_module(module_name)
+        for entry in catalog.findRuns(mode=mode): # One job per run, also when it has been converted to an archive
+            filename = entry["path"]
+            if not os.path.exists(filename):
+                missing.append(filename)
+                continue
+            name = os.path.splitext(os.path.basename(filename))[0]
+            path = plotter.plotPath(entry["run_id"])
+            key = plotKey(filename, plotter)
+            cached = cache.get(filename)
+            if cached is not None and cached["key"] == key and all(os.path.exists(f) for f in plotter.figureFiles(path, name)):
+                up_to_date += 1
+                continue
+            jobs.append((module_name, filename, path, name, key))
+
+    for filename in missing:
+        print(f"\tData file {filename} of the run catalog is missing, not plotted")
+    print(f"Plotting {len(jobs)} runs ({up_to_date} up to date, {len(missing)} missing) with {NUMBER_OF_WORKERS} workers...")
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=NUMBER_OF_WORKERS, initializer=initWorker) as pool:
+        futures = {pool.submit(renderRun, *job[:4]): job for job in jobs}
+        for future in as_completed(futures):
+            module_name, filename, path, name, key = futures[future]
+            try:
+                figures = future.result()
+            except Exception as e:
+                print(f"\tFailed to plot {filename} ({e})")
+                failed += 1
+                continue
+            cache[filename] = {"key": key, "figures": figures}
+            saveCache(cache) # Save after every run, so an interrupted batch does not redo finished runs
+            print(f"\tPlotted {name}")
+    print(f"Done in {time.perf_counter() - start:.1f} s ({failed} failed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# ColumnBuffer.py
+# DATE: 18/10 2026
+
+# Growable column store for samples. Replaces np.append, which copies the whole array on every
+# call. Each column is a preallocated numpy array and the capacity is doubled when it runs out, so
+# appending is amortized O(1) per sample.
+
+import numpy as np
+
+class ColumnBuffer:
+    # columns: list of column names, e.g. ["t", "I", "U", "P"]
+    # dtypes: a single dtype for all columns, or a dict with a dtype per column name
+    def __init__(self, columns, dtypes=np.float64, capacity=1024):
+        self.columns = list(columns)
+        if not isinstance(dtypes, dict):
+            dtypes = {name: dtypes for name in self.columns}
+        self.capacity = max(int(capacity), 1)
+        self.data = {name: np.empty(self.capacity, dtype=dtypes[name]) for name in self.columns}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    # Make room for at least `needed` samples
+    def reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self.columns:
+            grown = np.empty(capacity, dtype=self.data[name].dtype)
+            grown[:self.length] = self.data[name][:self.length]
+            self.data[name] = grown
+        self.capacity = capacity
+
+    # Append one sample, with the values in the same order as the columns
+    def append(self, *values):
+        if self.length == self.capacity:
+            self.reserve(self.length + 1)
+        for name, value in zip(self.columns, values):
+            self.data[name][self.length] = value
+        self.length += 1
+
+    # Append many samples at once, with one array per column
+    def extend(self, *arrays):
+        n = len(arrays[0])
+        self.reserve(self.length + n)
+        for name, array in zip(self.columns, arrays):
+            self.data[name][self.length:self.length + n] = array
+        self.length += n
+
+    # Zero-copy view of the filled part of a column.
+    # NOTE: The view still points at the old storage after the buffer grows, so get a new view after appending.
+    def column(self, name):
+        return self.data[name][:self.length]
+
+    # Zero-copy views of all columns, in column order (e.g. t, I, U, P)
+    def arrays(self):
+        return tuple(self.column(name) for name in self.columns)
+
+    # Copy of all columns, for handing to code that may keep it while we keep appending
+    def snapshot(self):
+        return tuple(self.column(name).copy() for name in self.columns)
+
+    def clear(self):
+        self.length = 0
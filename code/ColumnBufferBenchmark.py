@@ -0,0 +1,39 @@
+# ColumnBufferBenchmark.py
+# DATE: 18/10 2026
+
+# Benchmark of the per-sample cost of appending to a ColumnBuffer compared to np.append.
+# For the ColumnBuffer, the cost per sample should stay flat as the number of samples grows.
+
+import time
+import numpy as np
+from ColumnBuffer import ColumnBuffer
+
+# Parameters
+SAMPLE_COUNTS = [10**3, 10**4, 10**5, 10**6, 4 * 10**6]
+NP_APPEND_MAX_SAMPLES = 10**5 # np.append is quadratic, so dont run it for the large sample counts
+COLUMNS = ["t", "I", "U", "P"]
+
+def benchmarkColumnBuffer(n):
+    samples = ColumnBuffer(COLUMNS)
+    start = time.perf_counter()
+    for k in range(n):
+        samples.append(k, 2.0, 12.0, 24.0)
+    return (time.perf_counter() - start) / n
+
+def benchmarkNpAppend(n):
+    arrays = [np.array([]) for _ in COLUMNS]
+    start = time.perf_counter()
+    for k in range(n):
+        for c, value in enumerate((k, 2.0, 12.0, 24.0)):
+            arrays[c] = np.append(arrays[c], value)
+    return (time.perf_counter() - start) / n
+
+def main():
+    print(f"{'Samples':>10} {'ColumnBuffer (us/sample)':>26} {'np.append (us/sample)':>23}")
+    for n in SAMPLE_COUNTS:
+        buffer_time = benchmarkColumnBuffer(n)
+        np_append_time = f"{benchmarkNpAppend(n) * 1e6:.2f}" if n <= NP_APPEND_MAX_SAMPLES else "-"
+        print(f"{n:>10} {buffer_time * 1e6:>26.2f} {np_append_time:>23}")
+
+if __name__ == "__main__":
+    main()
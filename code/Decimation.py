@@ -0,0 +1,32 @@
+# Decimation.py
+# DATE: 18/10 2026
+
+# Min/max decimation of long traces before plotting. A 5 day run at 1 Hz has ~430k points per trace,
+# far more than the figure has pixel columns. The trace is split into buckets (about one per pixel
+# column) and only the first, last, minimum and maximum sample of each bucket are kept. Unlike
+# taking every n:th sample, this keeps short spikes such as the voltage collapses at -50 C.
+
+import numpy as np
+
+DECIMATION_BUCKETS = 2000 # Amount of buckets. Should be at least the width of the plot in pixels
+
+# Indices of the samples to keep: first, last, min and max of every bucket, sorted
+def minMaxIndices(y, buckets=DECIMATION_BUCKETS):
+    n = len(y)
+    if n <= 4 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets) # Samples per bucket, rounded up
+    padded = np.pad(y, (0, size * buckets - n), mode="edge").reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    indices = np.concatenate([
+        offsets,
+        offsets + padded.argmin(axis=1),
+        offsets + padded.argmax(axis=1),
+        np.minimum(offsets + size - 1, n - 1),
+    ])
+    return np.unique(np.minimum(indices, n - 1)) # Padding repeats the last sample, so clip into range
+
+# Decimate one trace. Returns the kept (x, y)
+def minMaxDecimate(x, y, buckets=DECIMATION_BUCKETS):
+    indices = minMaxIndices(y, buckets)
+    return x[indices], y[indices]
@@ -0,0 +1,52 @@
+# DecimationBenchmark.py
+# DATE: 18/10 2026
+
+# Benchmark of render time and PNG size vs. raw point count, with and without min/max decimation.
+# The synthetic trace is a slowly falling voltage with short collapses, like the -50 C runs, and
+# the benchmark also checks that the decimated trace still contains every collapse.
+
+import io
+import time
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import pyplot as plt
+from Decimation import minMaxDecimate
+
+# Parameters
+POINT_COUNTS = [10**4, 10**5, 432000, 10**6] # 432000 = 5 days at 1 Hz
+SPIKE_COUNT = 20 # Amount of short voltage collapses in the trace
+FIGSIZE = (4, 3)
+DPI = 300
+
+def syntheticTrace(n, rng):
+    t = np.linspace(0, 5 * 24 * 3600, n)
+    u = 12.5 - 1.5 * t / t[-1] + rng.normal(0, 0.005, n)
+    spikes = rng.choice(n, SPIKE_COUNT, replace=False)
+    u[spikes] = 0.5 # One sample long collapse
+    return t, u, spikes
+
+def render(t, u):
+    start = time.perf_counter()
+    plt.figure(figsize=FIGSIZE)
+    plt.plot(t / 3600, u)
+    buffer = io.BytesIO()
+    plt.savefig(buffer, dpi=DPI, format="png")
+    plt.close()
+    return time.perf_counter() - start, len(buffer.getvalue())
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'Points':>8} {'Raw (s)':>8} {'Raw (kB)':>9} {'Decimated':>10} {'Dec. (s)':>9} {'Dec. (kB)':>10} {'Spikes kept':>12}")
+    for n in POINT_COUNTS:
+        t, u, spikes = syntheticTrace(n, rng)
+        raw_time, raw_size = render(t, u)
+        start = time.perf_counter()
+        t_dec, u_dec = minMaxDecimate(t, u)
+        decimate_time = time.perf_counter() - start
+        dec_time, dec_size = render(t_dec, u_dec)
+        spikes_kept = np.isin(t[spikes], t_dec).sum()
+        print(f"{n:>8} {raw_time:>8.2f} {raw_size / 1000:>9.0f} {len(t_dec):>10} {decimate_time + dec_time:>9.2f} {dec_size / 1000:>10.0f} {spikes_kept:>9}/{SPIKE_COUNT}")
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,20 @@
 # AUTHOR: Sigfrid Stjärnholm
 # DATE: 2/5 2022
 
-import serial
+import os
 import time
 import numpy as np
-from matplotlib import pyplot as plt
-from wakepy import keepawake # For keeping the computer turned awake when running
+from SampleLog import SampleLogWriter, DISCHARGE_COLUMNS
+from ColumnBuffer import ColumnBuffer
+from PlotWorker import PlotWorker
+from SamplingScheduler import SamplingScheduler
+from RunCatalog import updateCatalog
+from TelemetryServer import TelemetryServer
+from RunCheckpoint import RunState, resumeRun, checkpointPath
+from OnlineStatistics import OnlineStatistics
+from Profiling import openProfiler
+from RunMetadata import RunMetadata, metadataPath
+from SerialTransport import SerialTransport, TransportError
 
 # NOTE: This assumes that the electronic load is connected to COM4. This can be changed in the code below.
 
@@ -20,82 +29,194 @@ day = 24 * hour
 RUN_ID = "7"
 COM_PORT = "COM4"
 CW_POWER = 24 # CW power in W
+TEMPERATURE = 20 # Chamber temperature in C (for the run metadata and catalog)
+NOTES = "" # Free text about the run, stored in the run metadata
 MEASURING_TIME = 3 * day # Measuring time in s
 MEASURING_INTERVAL = 2 * min # Measuring interval in s
 NUMBER_OF_TIMES_TO_PLOT = 40 # Amount of times to do plotting during the measure interval
+FSYNC_EVERY = 10 # Amount of samples to write before forcing them to disk
+SIMULATE = False # Use a simulated electronic load instead of the one on COM_PORT (see SimulatedInstruments.py)
+SIMULATION_TIME_SCALE = 1 # Simulated seconds per real second for the simulated battery
+USE_BATCHED_QUERIES = True # Send all measurement queries in one write. Turned off automatically if the load rejects it
+TELEMETRY_PORT = 8082 # Local HTTP port for following the run live (see TelemetryServer.py). None turns it off
+RESUME = False # Continue the interrupted run with these parameters from its checkpoint (see RunCheckpoint.py)
+ADAPTIVE_SAMPLING = False # Sample faster when the voltage or current changes quickly (see AdaptiveSampling.py). MEASURING_INTERVAL is then the slowest interval
+ADAPTIVE_FAST_INTERVAL = 0.5 * sec # Fastest interval in adaptive sampling
+VOLTAGE_RESOLUTION = 0.01 # V. In adaptive sampling, a sample is taken when the voltage is expected to have changed this much
+CURRENT_RESOLUTION = 0.01 # A. Same for the current
+CUTOFF_VOLTAGE = 9.0 # End of discharge voltage in V (1.0 V per cell). Adaptive sampling uses the fast interval near it
+CUTOFF_MARGIN = 0.5 # V
+NOMINAL_VOLTAGE = 12 # V, for the expected current in the alerts
+PROFILE = False # Write timed spans, counters and stack samples to data/discharging/<run name>_profile.jsonl (see Profiling.py)
+PROFILE_SAMPLE_INTERVAL = 0.01 # Time between stack samples of the sampling profiler in s. None turns the sampling profiler off
+ALERTS = [ # Checked on every sample, see OnlineStatistics.py
+    # Abort if less than half of the expected charge has come out after 30 minutes (the battery does nothing)
+    {"metric": "capacity", "below": 0.5 * CW_POWER / NOMINAL_VOLTAGE * 30 * min / hour, "after": 30 * min, "action": "abort"},
+]
 
 # NOTE: Not sure if CC_MAX_CURRENT works, as we are doing CW. 
 CC_MAX_CURRENT = 10 # The maximum current to ouput (to prevent current spike in the end)
 
-def byte_to_float(b):
-    return float(b.decode())
+RUN_NAME = f"DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}"
+RUN_FILE = f"data/discharging/{RUN_NAME}.bin"
+CHECKPOINT_FILE = checkpointPath(RUN_FILE)
+METADATA_FILE = metadataPath(RUN_FILE)
+USER_FIELDS = {"temperature": TEMPERATURE, "notes": NOTES} # User supplied fields of the run metadata (see RunMetadata.py)
+RUN_SETPOINTS = {"run_id": RUN_ID, "cw_power": CW_POWER, "measuring_time": MEASURING_TIME, "measuring_interval": MEASURING_INTERVAL}
 
-def byte_to_bool(b):
-    return bool(int(b.decode()))
+# Parse a measurement reply such as "2.0744A" into a float (the unit is removed). A reply with another
+# unit than the query asks for is rejected, so a late voltage reply is never stored as the current
+def parseMeasurement(s, unit):
+    s = s.strip()
+    if s[-1:].upper() != unit:
+        raise ValueError(f"Expected a value in {unit}, got {s!r}")
+    return float(s[:-1])
 
-def byte_to_string(b):
-    return b.decode()
+def parseAmpere(s):
+    return parseMeasurement(s, "A")
 
-def encode(s):
-    return (s + "\n").encode()
+def parseVolt(s):
+    return parseMeasurement(s, "V")
+
+def parseWatt(s):
+    return parseMeasurement(s, "W")
 
 # Get the on state
 def getOnState(ser):
-    ser.write(encode(":INPut?"))
-    res = byte_to_string(ser.readline()).strip()
-    if res == "OFF":
-        return False
-    else:
-        return True
+    return ser.query(":INPut?") != "OFF"
 
 # Set the on state
 def setOnState(ser, state):
     if state:
-        ser.write(b":INPut ON\n")
+        ser.send(":INPut ON")
     else:
-        ser.write(b":INPut OFF\n")
+        ser.send(":INPut OFF")
 
 def getCWPower(ser):
-    ser.write(encode(f":POW?"))
-    return float(byte_to_string(ser.readline()).strip()[:-1]) # strip to remove newline, [:-1] to remove unit
+    return ser.query(":POW?", parseWatt)
 
 def setCWPower(ser, power):
-    ser.write(encode(f":POW {power}W"))
+    ser.send(f":POW {power}W")
     return ser.readline()
 
 def setCCCurrent(ser, current):
-    ser.write(encode(f":CURR {current}W"))
+    ser.send(f":CURR {current}W")
     return ser.readline()
 
 def getMeasureCurrent(ser):
-    ser.write(encode(f":MEASure:CURRent?"))
-    return float(byte_to_string(ser.readline()).strip()[:-1]) # strip to remove newline, [:-1] to remove unit
+    return ser.query(":MEASure:CURRent?", parseAmpere)
 
 def getMeasureVoltage(ser):
-    ser.write(encode(f":MEASure:VOLTage?"))
-    return float(byte_to_string(ser.readline()).strip()[:-1]) # strip to remove newline, [:-1] to remove unit
+    return ser.query(":MEASure:VOLTage?", parseVolt)
 
 def getMeasurePower(ser):
-    ser.write(encode(f":MEASure:POWer?"))
-    return float(byte_to_string(ser.readline()).strip()[:-1]) # strip to remove newline, [:-1] to remove unit
+    return ser.query(":MEASure:POWer?", parseWatt)
+
+MEASURE_QUERIES = [":MEASure:CURRent?", ":MEASure:VOLTage?", ":MEASure:POWer?"]
+MEASURE_PARSERS = [parseAmpere, parseVolt, parseWatt] # One per query, in the same order
+
+# Statistics of the measurement queries, for the timing report
+query_stats = {"samples": 0, "round_trips": 0, "time": 0.0, "batched": USE_BATCHED_QUERIES}
+
+# Send current, voltage and power queries in one write and parse all replies in one pass.
+# Some firmware versions answer each query on its own line instead of one ;-separated line, the transport handles both
+def getMeasureAllBatched(ser):
+    return ser.query(";".join(MEASURE_QUERIES), MEASURE_PARSERS, fields=len(MEASURE_QUERIES))
+
+# Get measured current, voltage and power. Uses a batched query if the load supports it, otherwise one query at a time
+def getMeasureAll(ser):
+    start = time.perf_counter()
+    values = None
+    if query_stats["batched"]:
+        try:
+            values = getMeasureAllBatched(ser)
+            round_trips = 1
+        except TransportError as e:
+            print(f"Batched query failed ({e}). Falling back to one query at a time.")
+            query_stats["batched"] = False
+            ser.reset_input_buffer()
+    if values is None:
+        values = (getMeasureCurrent(ser), getMeasureVoltage(ser), getMeasurePower(ser))
+        round_trips = len(MEASURE_QUERIES)
+    query_stats["samples"] += 1
+    query_stats["round_trips"] += round_trips
+    query_stats["time"] += time.perf_counter() - start
+    return values
+
+def printQueryReport():
+    n = query_stats["samples"]
+    if n == 0:
+        return
+    print(f"Queries: {query_stats['round_trips'] / n:.1f} round trips/sample, {query_stats['time'] / n * 1000:.1f} ms/sample (batched: {query_stats['batched']})")
 
 def setMode(ser, mode):
     raise Exception("setMode NOT WORKING!...")
-    ser.write(encode(f":FUNC {mode}"))
+    ser.send(f":FUNC {mode}")
     return ser.readline()
 
 def getMode(ser):
-    ser.write(encode(f":FUNC?"))
-    return byte_to_string(ser.readline()).strip() # .strip() to remove newline (\n)
+    return ser.query(":FUNC?")
 
 def test(ser):
-    ser.write(encode("*IDN?"))
-    return byte_to_string(ser.readline())
+    return ser.query("*IDN?")
+
+simulated_instrument = None
+
+# Open the serial port of the electronic load (or the simulated one)
+def openPort(port):
+    global simulated_instrument
+    if SIMULATE:
+        from SimulatedInstruments import SimulatedElectronicLoad
+        if simulated_instrument is None:
+            simulated_instrument = SimulatedElectronicLoad(port=port, time_scale=SIMULATION_TIME_SCALE)
+        simulated_instrument.open() # Reopening keeps the state of the instrument, as with the real one
+        return simulated_instrument
+    import serial # Not needed for the simulated instrument
+    return serial.Serial(port, baudrate=115200, timeout=1)
+
+# Connect to the electronic load through the transport (retries, reopening the port, statistics)
+def openSerial():
+    return SerialTransport(COM_PORT, open=openPort)
+
+# Update the entry of this run in the run catalog. The temperature, date, notes, ... come from the run metadata
+def updateRunCatalog(samples, metadata):
+    try:
+        t_array = samples.column("t")
+        time_range = {"t_start": float(t_array[0]), "t_end": float(t_array[-1])} if len(t_array) > 0 else {}
+        updateCatalog(RUN_FILE, mode="discharging", columns=len(DISCHARGE_COLUMNS), sample_count=len(t_array), **RUN_SETPOINTS, **time_range, **metadata.catalogFields())
+    except Exception as e:
+        print(f"Could not update the run catalog ({e}). Continuing...")
+
+# Add the render times of the plot worker process to the profile
+def recordRenderTimes(plot_worker, profiler):
+    for filename, duration in plot_worker.takeTimings():
+        profiler.record("render", duration, file=os.path.basename(filename))
+
+# Run one bookkeeping step when exiting. A failing step is reported and does not stop the others. Returns True if it worked
+def cleanupStep(name, function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+        return True
+    except Exception as e:
+        print(f"Could not {name} ({e}). Continuing...")
+        return False
+
+# Build a job for the plot worker from a snapshot of the samples
+def plotJob(samples):
+    t_array, I_array, U_array, P_array = samples.snapshot()
+    return [
+        (t_array, I_array, 'Time (s)', 'Current (A)', f"data/discharging/plots/CURRENT_{RUN_NAME}.png"),
+        (t_array, U_array, 'Time (s)', 'Voltage (V)', f"data/discharging/plots/VOLTAGE_{RUN_NAME}.png"),
+        (t_array, P_array, 'Time (s)', 'Power (W)', f"data/discharging/plots/POWER_{RUN_NAME}.png"),
+    ]
 
 def main():
+    from wakepy import keepawake # For keeping the computer turned awake when running
+
     # Connect to power supply
-    ser = serial.Serial(COM_PORT, baudrate=115200, timeout=1)  # open serial port
-    print("Connected to electronic load:", test(ser))
+    ser = openSerial()  # open serial port
+    idn = test(ser)
+    print("Connected to electronic load:", idn)
 
     # Check that the mode is CW
     mode = getMode(ser)
@@ -109,116 +230,164 @@ def main():
     print(f"\t Out voltage: {getMeasureVoltage(ser)} V")
     print(f"\t Out power: {getMeasurePower(ser)} W")
 
-    # Initilize
+    # Resume an interrupted run, or start a new one
+    previous_samples = None
+    if RESUME:
+        state, previous_samples = resumeRun(RUN_FILE, lambda i, u, p: (i, p))
+        print(f"Resuming run at {state.elapsed:.0f} s: {state.sample_count} samples, {state.charge:.2f} Ah and {state.energy:.2f} Wh delivered")
+    else:
+        if os.path.exists(RUN_FILE):
+            raise Exception(f"{RUN_FILE} already exists. Set RESUME = True to continue it, or change RUN_ID")
+        state = RunState(RUN_SETPOINTS, MEASURING_INTERVAL)
+    stats = OnlineStatistics(ALERTS, current_sign=-1, charge=state.charge, energy=state.energy)
+
+    # Initilize (the setpoints are restored from the checkpoint when resuming)
     print("\nInitializing measurement...")
     setOnState(ser, False)
-    setCWPower(ser, CW_POWER)
+    setCWPower(ser, state.setpoints["cw_power"])
     setCCCurrent(ser, CC_MAX_CURRENT)
+
+    # Record how the run is made, with the setpoints as the load reports them
+    readback = {"cw_power": getCWPower(ser), "mode": getMode(ser)}
+    metadata = RunMetadata(METADATA_FILE)
+    start_record = metadata.start("discharging", dict(state.setpoints, cc_max_current=CC_MAX_CURRENT), readback, idn, COM_PORT, USER_FIELDS, resumed=RESUME)
     print("Measurement started!")
     
+    log = None
+    samples = None
+    end_reason = "interrupted"
+    telemetry = None
+    scheduler = None
+    profiler = openProfiler(RUN_FILE, PROFILE, PROFILE_SAMPLE_INTERVAL)
+    ser.profiler = profiler
+    plot_worker = PlotWorker(report_timings=PROFILE)
     try:
         # Use keepawake context to prevent computer from going asleep when we are running
         with keepawake(keep_screen_awake=False):
             pass
+            samples = ColumnBuffer(DISCHARGE_COLUMNS, capacity=MEASURING_TIME // MEASURING_INTERVAL + 1)
+            if previous_samples is not None:
+                samples.extend(*previous_samples)
+                previous_samples = None # The samples are in the buffer now, dont keep a second copy
+            # The telemetry port is bound before the output is turned on, a port conflict does not stop the run
+            telemetry = TelemetryServer(samples, dict(RUN_SETPOINTS, run_name=RUN_NAME, on=False), port=TELEMETRY_PORT)
+            telemetry.start()
+
             # Turn on and start measuring
             setOnState(ser, True)
+            telemetry.updateStatus(on=True)
             time.sleep(1) # Sleep for 1 second before measurements start
-            t_array = np.array([])
-            I_array = np.array([])
-            U_array = np.array([])
-            P_array = np.array([])
-            start = time.time()
-            has_plotted_amount_of_times = 0
-            while time.time() - start < MEASURING_TIME:
-                t = time.time() - start
-                i = getMeasureCurrent(ser)
-                u = getMeasureVoltage(ser)
-                p = getMeasurePower(ser)
-                t_array = np.append(t_array, t)
-                I_array = np.append(I_array, i)
-                U_array = np.append(U_array, u)
-                P_array = np.append(P_array, p)
-                # print(f"Data: u = {u}, i = {i}")
-
-                # Save data
-                with open(f'data/discharging/DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.npy', 'wb') as f:
-                    np.save(f, t_array)
-                    np.save(f, I_array)
-                    np.save(f, U_array)
-                    np.save(f, P_array)
-                
-                # Plot data occationally
-                try:
+            log = SampleLogWriter(RUN_FILE, DISCHARGE_COLUMNS, metadata=dict(RUN_SETPOINTS, run_metadata=start_record), fsync_every=FSYNC_EVERY)
+            log.profiler = profiler
+            state.save(CHECKPOINT_FILE) # A crash before the first sync can still be resumed
+            updateRunCatalog(samples, metadata)
+            adaptive = None
+            if ADAPTIVE_SAMPLING:
+                from AdaptiveSampling import AdaptiveRate # Only loaded when adaptive sampling is on
+                adaptive = AdaptiveRate(ADAPTIVE_FAST_INTERVAL, MEASURING_INTERVAL, {"U": VOLTAGE_RESOLUTION, "I": CURRENT_RESOLUTION}, levels=[("U", CUTOFF_VOLTAGE, CUTOFF_MARGIN)])
+            scheduler = SamplingScheduler(ADAPTIVE_FAST_INTERVAL if ADAPTIVE_SAMPLING else MEASURING_INTERVAL, MEASURING_TIME - state.t_offset, timing_path=f'data/discharging/{RUN_NAME}_timing.bin')
+            has_plotted_amount_of_times = int(state.t_offset / MEASURING_TIME * NUMBER_OF_TIMES_TO_PLOT) # Plots already made before a resume
+            for t_nominal, t in scheduler.ticks():
+                t += state.t_offset # Continuous timebase when resuming
+                profiler.tick(t)
+                with scheduler.phase("query"), profiler.span("query"):
+                    i, u, p = getMeasureAll(ser)
+                telemetry.append(t, i, u, p)
+
+                # Save data (only the new sample is appended)
+                with scheduler.phase("save"), profiler.span("save"):
+                    log.append(t, i, u, p)
+                    state.update(t, i, p)
+                    if log.unsynced == 0: # Only checkpoint what is on disk
+                        with profiler.span("checkpoint"):
+                            state.save(CHECKPOINT_FILE)
+
+                # Online statistics and alerts
+                with profiler.span("stats"):
+                    abort = stats.update(t, i, u, p)
+                if abort is not None:
+                    print(f"Run aborted: {abort}")
+                    end_reason = f"aborted: {abort}"
+                    break
+
+                # Choose the time to the next sample from how fast the signals change
+                if adaptive is not None:
+                    scheduler.setInterval(adaptive.update(t, U=u, I=i))
+
+                # Plot data occationally (rendering happens in the plot worker process)
+                with scheduler.phase("plot"), profiler.span("plot"):
                     if t / MEASURING_TIME * NUMBER_OF_TIMES_TO_PLOT > has_plotted_amount_of_times:
                         has_plotted_amount_of_times += 1
                         print(f"Plotting... ({has_plotted_amount_of_times}/{NUMBER_OF_TIMES_TO_PLOT}). Measurement time: {t:.0f}/{MEASURING_TIME} s ({(t/MEASURING_TIME*100):.0f} %)")
-
-                        plt.plot(t_array, I_array)
-                        plt.xlabel('Time (s)')
-                        plt.ylabel('Current (A)')
-                        plt.savefig(f"data/discharging/plots/CURRENT_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-                        plt.close()
-
-                        plt.plot(t_array, U_array)
-                        plt.xlabel('Time (s)')
-                        plt.ylabel('Voltage (V)')
-                        plt.savefig(f"data/discharging/plots/VOLTAGE_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-                        plt.close()
-
-                        plt.plot(t_array, P_array)
-                        plt.xlabel('Time (s)')
-                        plt.ylabel('Power (W)')
-                        plt.savefig(f"data/discharging/plots/POWER_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-                        plt.close()
-                except: 
-                    print("Error occureted when plotting. Continuing...")
-
-                time.sleep(MEASURING_INTERVAL)
+                        printQueryReport()
+                        scheduler.printStats()
+                        stats.printStats()
+                        plot_worker.submit(plotJob(samples))
+                        updateRunCatalog(samples, metadata)
+                recordRenderTimes(plot_worker, profiler)
 
             # Turn off power supply
             setOnState(ser, False)
+            telemetry.updateStatus(on=False)
+            state.finished = True
+            if not end_reason.startswith("aborted"):
+                end_reason = "finished"
 
-            # Plot one last time
-            plt.plot(t_array, I_array)
-            plt.xlabel('Time (s)')
-            plt.ylabel('Current (A)')
-            plt.savefig(f"data/discharging/plots/CURRENT_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-            plt.close()
-
-            plt.plot(t_array, U_array)
-            plt.xlabel('Time (s)')
-            plt.ylabel('Voltage (V)')
-            plt.savefig(f"data/discharging/plots/VOLTAGE_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-            plt.close()
-
-            plt.plot(t_array, P_array)
-            plt.xlabel('Time (s)')
-            plt.ylabel('Power (W)')
-            plt.savefig(f"data/discharging/plots/POWER_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-            plt.close()
+            # Plot one last time and wait for it to finish
+            plot_worker.submit(plotJob(samples))
+            plot_worker.close()
 
+            printQueryReport()
             print("Measurement done!\n")
             
+    except BaseException as e:
+        end_reason = f"error: {type(e).__name__}: {e}" if not isinstance(e, KeyboardInterrupt) else "stopped by the user"
+        raise
     finally:
-        pass
         print("***********************************************************")
         print("Program exiting...")
-        if ser.is_open:
-            print("Port was open. Turnining off electronic load and closing.")
-            setOnState(ser, False)
-            time.sleep(1)
-            if getOnState(ser):
-                raise Exception("THE ELECTRONIC LOAD IS NOT OFF. PROCEED WITH CAUTION!")
-            ser.close()             # close port
-        else:
-            print("Port was not open. Opening port, turnining off electronic load and closing.")
-            ser = serial.Serial(COM_PORT, baudrate=115200, timeout=1)  # open serial port
-            setOnState(ser, False)
+        # Turn the electronic load off first. The bookkeeping below takes time and may fail (full disk, I/O errors)
+        not_off = None
+        try:
+            if ser.is_open:
+                print("Port was open. Turnining off electronic load and closing.")
+                port = ser
+            else:
+                print("Port was not open. Opening port, turnining off electronic load and closing.")
+                port = openSerial()  # open serial port
+            setOnState(port, False)
             time.sleep(1)
-            if getOnState(ser):
-                raise Exception("THE ELECTRONIC LOAD IS NOT OFF. PROCEED WITH CAUTION!")
-            ser.close()             # close port
-        print("Port has been closed, and electronic load is off. Exiting...")
+            if getOnState(port):
+                not_off = Exception("THE ELECTRONIC LOAD IS NOT OFF. PROCEED WITH CAUTION!")
+            port.close()             # close port
+        except Exception as e:
+            not_off = Exception(f"COULD NOT TURN OFF THE ELECTRONIC LOAD ({e}). PROCEED WITH CAUTION!")
+        if not_off is None:
+            print("Port has been closed, and electronic load is off.")
+
+        # Bookkeeping. Every step runs, even if an earlier one fails
+        if log is not None and cleanupStep("close the sample log", log.close):
+            cleanupStep("save the checkpoint", state.save, CHECKPOINT_FILE) # Only what is on disk
+        cleanupStep("write the end of the run metadata", metadata.end, end_reason, state.sample_count, state.elapsed, charge=state.charge, energy=state.energy)
+        if samples is not None:
+            updateRunCatalog(samples, metadata)
+        if scheduler is not None:
+            cleanupStep("close the scheduler", scheduler.close)
+            cleanupStep("print the timing statistics", scheduler.printStats)
+            cleanupStep("save the timing statistics", scheduler.saveStats, f'data/discharging/{RUN_NAME}_timing.json')
+        cleanupStep("print the online statistics", stats.printStats)
+        cleanupStep("save the online statistics", stats.save, f'data/discharging/{RUN_NAME}_stats.json')
+        print("Serial link:")
+        cleanupStep("print the serial statistics", ser.printStats)
+        cleanupStep("save the serial statistics", ser.saveStats, f'data/discharging/{RUN_NAME}_serial.json')
+        cleanupStep("stop the plot worker", plot_worker.close, timeout=60)
+        cleanupStep("record the render times", recordRenderTimes, plot_worker, profiler)
+        cleanupStep("close the profiler", profiler.close)
+        if telemetry is not None:
+            cleanupStep("stop the telemetry server", telemetry.close)
+        if not_off is not None:
+            raise not_off
+        print("Exiting...")
         print("***********************************************************\n")
 
 if __name__ == "__main__":
@@ -3,11 +3,16 @@
 # DATE: 2/5 2022
 
 import numpy as np
-from matplotlib import pyplot as plt
 import os
+from SampleLog import findRunFile
+from RunData import Run
+from Decimation import minMaxDecimate, DECIMATION_BUCKETS
+from RunCatalog import RunCatalog
+from RunAnalysis import dischargeSummary
 
 # Plot params
-plt.rc('figure', figsize=(4, 3))
+FIGSIZE = (4, 3)
+DPI = 300
 
 # Time units
 sec = 1
@@ -23,8 +28,6 @@ MEASURING_INTERVAL = 2 * min # Measuring interval in s
 plot_x_in_hours = True # Flag to choose if we are plotting x axis in hours instead of seconds
 do_calculate_capacity = True # Flag to choose if we are calculating the capacity
 
-path = f'data/discharging/plots/final/RUN_ID-{RUN_ID}'
-
 if plot_x_in_hours:
     x_label = "Time (h)"
     time_factor = 3600
@@ -32,41 +35,49 @@ else:
     x_label = "Time (s)"
     time_factor = 1
 
-# Check whether the specified path exists or not
-isExist = os.path.exists(path)
+# Settings that change how the figures look. Part of the plot cache key in BatchPlotter.py
+PLOT_SETTINGS = {"figsize": FIGSIZE, "dpi": DPI, "plot_x_in_hours": plot_x_in_hours, "do_calculate_capacity": do_calculate_capacity, "decimation_buckets": DECIMATION_BUCKETS}
 
-if not isExist:
-  # Create a new directory because it does not exist 
-  os.makedirs(path)
-  print(f"The new directory is created! ({path})")
+# Output directory of the final plots of a run
+def plotPath(run_id):
+    return f'data/discharging/plots/final/RUN_ID-{run_id}'
 
-def main():
-    # Load data
-    with open(f'data/discharging/DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.npy', 'rb') as f:
-        t_array = np.load(f)
-        I_array = np.load(f)
-        U_array = np.load(f)
-        P_array = np.load(f)
-        
+# The figure files that plotRun writes
+def figureFiles(path, name):
+    return [f"{path}/{quantity}_{yscale}_{name}.png" for yscale in ["linear", "log"] for quantity in ["CURRENT", "VOLTAGE", "POWER"]]
+
+# Plot the run stored in `filename` into the directory `path`. `name` is used in the figure filenames
+def plotRun(filename, path, name):
+    from matplotlib import pyplot as plt # Only loaded when plotting, not when looking up plotPath, figureFiles and PLOT_SETTINGS
+    plt.rc('figure', figsize=FIGSIZE)
+
+    # Create the directory if it does not exist
+    if not os.path.exists(path):
+        os.makedirs(path, exist_ok=True)
+        print(f"The new directory is created! ({path})")
+
+    t_array, I_array, U_array, P_array = Run(filename, "discharging").arrays("t", "I", "U", "P")
     capacity_string_I = ""
     capacity_string_P = ""
     capacity_string_U = ""
 
     if do_calculate_capacity:
-        # Find for which time the voltage drops below a certain threshold
-        # NOTE: The units below assume that plot_x_in_hours = True. Otherwise, change h -> s, Ah -> As and Wh -> Ws in the text (calculations are correct, however)
-        voltage_threshold = 0.5
-        voltage_drop_time = np.where(U_array < voltage_threshold)[0][0]
-        time_at_which_voltage_dropped = t_array[voltage_drop_time]
+        # Find for which time the voltage drops below a certain threshold, and integrate current and power until then
+        # NOTE: The times below assume that plot_x_in_hours = True. Otherwise, change h -> s in the text (calculations are correct, however)
+        summary = dischargeSummary(t_array, I_array, U_array, P_array, voltage_threshold=0.5)
+        if summary["time_to_cutoff"] is not None:
+            time_string = f"Time until discharge: {(summary['time_to_cutoff'] / time_factor):.1f} h"
+        else:
+            time_string = "Time until discharge: not reached (whole run)"
 
-        capacity_string_I = f"Discharging - current vs time\nTime until discharge: {(time_at_which_voltage_dropped / time_factor):.1f} h\nCapacity: {(time_at_which_voltage_dropped * np.average(I_array[0:voltage_drop_time]) / time_factor):.1f} Ah"
-        capacity_string_P = f"Discharging - power vs time\nTime until discharge: {(time_at_which_voltage_dropped / time_factor):.1f} h\nCapacity: {(time_at_which_voltage_dropped * CW_POWER / time_factor):.1f} Wh"
-        capacity_string_U = f"Discharging - voltage vs time\nTime until discharge: {(time_at_which_voltage_dropped / time_factor):.1f} h"
+        capacity_string_I = f"Discharging - current vs time\n{time_string}\nCapacity: {summary['capacity']:.1f} Ah"
+        capacity_string_P = f"Discharging - power vs time\n{time_string}\nCapacity: {summary['energy']:.1f} Wh"
+        capacity_string_U = f"Discharging - voltage vs time\n{time_string}"
 
 
     # Plot data in linear and log scale
     for yscale in ["linear", "log"]:
-        plt.plot(t_array / time_factor, I_array)
+        plt.plot(*minMaxDecimate(t_array / time_factor, I_array)) # Decimated, keeping spikes
         plt.xlabel(x_label)
         plt.ylabel('Current (A)')
         plt.yscale(yscale)
@@ -74,10 +85,10 @@ def main():
         plt.title(capacity_string_I)
         if yscale != "log": plt.gca().get_yaxis().get_major_formatter().set_useOffset(False) # Prevent y-axis from having an offset in tickers
         plt.tight_layout()
-        plt.savefig(f"{path}/CURRENT_{yscale}_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png", dpi=300)
+        plt.savefig(f"{path}/CURRENT_{yscale}_{name}.png", dpi=DPI)
         plt.close()
 
-        plt.plot(t_array / time_factor, U_array)
+        plt.plot(*minMaxDecimate(t_array / time_factor, U_array)) # Decimated, keeping spikes
         plt.xlabel(x_label)
         plt.ylabel('Voltage (V)')
         plt.yscale(yscale)
@@ -85,10 +96,10 @@ def main():
         plt.title(capacity_string_U)
         if yscale != "log": plt.gca().get_yaxis().get_major_formatter().set_useOffset(False) # Prevent y-axis from having an offset in tickers
         plt.tight_layout()
-        plt.savefig(f"{path}/VOLTAGE_{yscale}_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png", dpi=300)
+        plt.savefig(f"{path}/VOLTAGE_{yscale}_{name}.png", dpi=DPI)
         plt.close()
 
-        plt.plot(t_array / time_factor, P_array)
+        plt.plot(*minMaxDecimate(t_array / time_factor, P_array)) # Decimated, keeping spikes
         plt.xlabel(x_label)
         plt.ylabel('Power (W)')
         plt.yscale(yscale)
@@ -96,8 +107,15 @@ def main():
         plt.title(capacity_string_P)
         if yscale != "log": plt.gca().get_yaxis().get_major_formatter().set_useOffset(False) # Prevent y-axis from having an offset in tickers
         plt.tight_layout()
-        plt.savefig(f"{path}/POWER_{yscale}_DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png", dpi=300)
+        plt.savefig(f"{path}/POWER_{yscale}_{name}.png", dpi=DPI)
         plt.close()
 
+def main():
+    # Load data. Look the run up in the run catalog, and fall back to building the filename from the parameters
+    run = RunCatalog().get("discharging", RUN_ID)
+    filename = run["path"] if run is not None else findRunFile(f'data/discharging/DischargeData_RUN_ID-{RUN_ID}_POWER-{CW_POWER}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}')
+    name = os.path.splitext(os.path.basename(filename))[0]
+    plotRun(filename, plotPath(RUN_ID), name)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,289 @@
+# EquivalentCircuitFit.py
+# DATE: 18/10 2026
+
+# Fits an equivalent-circuit model of the battery to every run in the run catalog, and uses the fitted
+# models to predict the runtime of a CW discharge at a power (and temperature) that was not measured.
+#
+# Model, with i the current out of the battery (negative when charging):
+#   U = OCV(soc) - R0 * i - V1 - V2,    dVk/dt = (Rk * i - Vk) / tauk
+# soc is the state of charge within the run, from the integrated current (1 -> 0 during a discharge,
+# 0 -> 1 during a charge), and OCV is a Legendre polynomial in soc. For fixed time constants tau1, tau2
+# the model is linear in the OCV coefficients, R0, R1 and R2, so it is fitted by least squares for all
+# candidate (tau1, tau2) pairs from TIME_CONSTANTS at once, and the pair with the smallest error is kept.
+# The design matrices of the candidates are never built: their normal equations (AᵀA, Aᵀy, 11 x 11 for
+# two RC pairs) are put together from products of the columns they share, so the memory does not grow
+# with samples times candidates. The resistances are constrained to be non-negative: every subset of
+# them is solved with the others fixed at zero, and the best solution without a negative resistance is used.
+#
+# A run at constant current (or nearly constant, as a CW discharge) can not tell an RC voltage R * i
+# from a shift of the OCV curve, so the resistances get a small ridge penalty (RIDGE): without a
+# current step in the data they go to zero instead of to any value with an OCV curve to match.
+#
+# A discharge is fitted until the voltage first drops below FIT_CUTOFF_VOLTAGE; the collapse to 0 V
+# after that is not battery behaviour the model can describe. Runs with fewer than MIN_SAMPLES
+# samples in the fit window (e.g. the -50 C discharges that lasted minutes) are reported as not fitted.
+#
+# The runs are fitted in parallel in a process pool. A fit is reused if neither the data, the fit
+# settings nor this file have changed (content hash per run in data/model_cache.json, like the plot cache).
+# The models are written to data/models.json.
+
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from RunCatalog import RunCatalog
+from RunData import Run
+from RunAnalysis import cumulativeTrapezoid, firstCrossingIndex
+from FileHash import fileHash
+
+# Parameters
+CACHE_PATH = "data/model_cache.json"
+MODELS_PATH = "data/models.json"
+NUMBER_OF_WORKERS = os.cpu_count() # Amount of processes fitting in parallel
+FORCE_REFIT = False # Flag to choose if all runs are refitted, even if the cached fit is up to date
+FIT_CUTOFF_VOLTAGE = 9.0 # V. End of the fit window of a discharge, as CUTOFF_VOLTAGE in DischargeDataCollector.py
+MIN_CURRENT = 0.05 # A. Samples with less current are not part of the fit window
+MIN_SAMPLES = 50 # Least amount of samples in the fit window to fit a run
+OCV_DEGREE = 7 # Degree of the OCV polynomial
+RC_PAIRS = 2 # Amount of RC pairs, 1 or 2
+RIDGE = 1e-3 # (V/Ohm)^2. Penalty on the resistances: 1 Ohm costs as much as 32 mV rms error
+TIME_CONSTANTS = np.geomspace(300, 20 * 3600, 14) # Candidate RC time constants in s. The runs are sampled every 2 min, so faster ones can not be seen
+PREDICTION_STEP = 60 # Time step of the runtime prediction in s
+
+# Runtimes to predict from the fitted discharge models: CW power in W and chamber temperature in C
+PREDICTIONS = [{"power": 6, "temperature": 20}, {"power": 18, "temperature": 20}, {"power": 24, "temperature": 20}, {"power": 36, "temperature": 20}]
+
+FIT_SETTINGS = {"fit_cutoff_voltage": FIT_CUTOFF_VOLTAGE, "min_current": MIN_CURRENT, "min_samples": MIN_SAMPLES, "ocv_degree": OCV_DEGREE,
+    "rc_pairs": RC_PAIRS, "ridge": RIDGE, "time_constants": TIME_CONSTANTS.tolist()}
+
+def ocvBasis(soc, degree=OCV_DEGREE):
+    return np.polynomial.legendre.legvander(2 * soc - 1, degree) # Legendre polynomials on [-1, 1] are well conditioned
+
+def ocv(model, soc):
+    return np.polynomial.legendre.legval(2 * np.asarray(soc) - 1, model["ocv"])
+
+# Voltage over an RC pair with current i through it, for every time constant at once. Returns (samples, time constants).
+# This recursion over the samples is the only loop, every step works on all time constants together
+def rcVoltages(t, i, taus):
+    decay = np.exp(-np.diff(t)[:, None] / taus[None, :])
+    drive = (1 - decay) * i[:-1, None]
+    v = np.zeros((len(t), len(taus)))
+    for n in range(1, len(t)):
+        v[n] = decay[n - 1] * v[n - 1] + drive[n - 1]
+    return v
+
+# Normal equations of every candidate, with the columns [OCV basis, -i] (fixed) and -rc[:, pairs[k]].
+# Returns (AᵀA, Aᵀy) with shapes (candidates, parameters, parameters) and (candidates, parameters)
+def normalEquations(fixed, rc, U, pairs):
+    p = fixed.shape[1]
+    AA = np.empty((len(pairs), p + pairs.shape[1], p + pairs.shape[1]))
+    AA[:, :p, :p] = fixed.T @ fixed
+    AA[:, :p, p:] = np.moveaxis((-fixed.T @ rc)[:, pairs], 1, 0)
+    AA[:, p:, :p] = np.transpose(AA[:, :p, p:], (0, 2, 1))
+    AA[:, p:, p:] = (rc.T @ rc)[pairs[:, :, None], pairs[:, None, :]]
+    Ay = np.concatenate([np.broadcast_to(fixed.T @ U, (len(pairs), p)), -(rc.T @ U)[pairs]], axis=1)
+    return AA, Ay
+
+# Least squares solution of the normal equations of every candidate, with a ridge penalty on the resistances
+# (the parameters after the OCV coefficients) and none of them negative. Every subset of the resistances is
+# solved with the others fixed at zero; of the solutions without a negative resistance the one with the smallest
+# penalized error is kept (fixing all of them at zero is always one). Returns (candidates, parameters)
+def solveNonNegative(AA, Ay, ridge):
+    resistances = np.arange(OCV_DEGREE + 1, Ay.shape[1])
+    penalized = AA.copy()
+    penalized[:, resistances, resistances] += ridge
+    coefficients = np.zeros(Ay.shape)
+    best_objective = np.full(len(Ay), np.inf)
+    for free in itertools.product([True, False], repeat=len(resistances)):
+        keep = np.concatenate([np.ones(OCV_DEGREE + 1, dtype=bool), free])
+        c = np.zeros(Ay.shape)
+        c[:, keep] = np.linalg.solve(penalized[:, keep][:, :, keep], Ay[:, keep, None])[:, :, 0]
+        objective = -np.einsum("kp,kp->k", c, Ay) # Penalized squared error minus |U|², which is the same for every solution
+        better = np.all(c[:, resistances] >= 0, axis=1) & (objective < best_objective)
+        coefficients[better] = c[better]
+        best_objective[better] = objective[better]
+    return coefficients
+
+# The samples used for the fit and their state of charge. Returns (t, i, U, soc, capacity, reached_cutoff)
+def fitWindow(mode, t, I, U):
+    t, I, U = (np.asarray(a, dtype=np.float64) for a in (t, I, U))
+    end = len(t)
+    reached_cutoff = False
+    if mode == "discharging":
+        cutoff = firstCrossingIndex(U, FIT_CUTOFF_VOLTAGE, below=True)
+        if cutoff is not None:
+            end, reached_cutoff = cutoff, True
+    keep = np.abs(I[:end]) >= MIN_CURRENT
+    t, I, U = t[:end][keep], I[:end][keep], U[:end][keep]
+    charge = cumulativeTrapezoid(np.abs(I), t) / 3600
+    capacity = charge[-1] if len(charge) > 0 else 0.0
+    if mode == "discharging":
+        soc = 1 - charge / capacity if capacity > 0 else charge
+        i = I
+    else:
+        soc = charge / capacity if capacity > 0 else charge
+        i = -I
+    return t, i, U, soc, capacity, reached_cutoff
+
+# Fit the model to one run. Runs in a worker process
+def fitRun(path, entry):
+    mode = entry["mode"]
+    result = {"path": path, "mode": mode, "run_id": entry["run_id"], "temperature": entry.get("temperature")}
+    result.update({field: entry[field] for field in ["cw_power", "cc_current", "cc_voltage"] if field in entry})
+    t, i, U, soc, capacity, reached_cutoff = fitWindow(mode, *Run(path, mode, entry).arrays("t", "I", "U"))
+    if len(t) < MIN_SAMPLES or capacity <= 0:
+        result["error"] = f"{len(t)} samples in the fit window, at least {MIN_SAMPLES} are needed"
+        return result
+
+    # Design matrix per candidate (tau1, tau2): [OCV basis, -i, -V1(tau1), -V2(tau2)], solved as one batch
+    rc = rcVoltages(t, i, TIME_CONSTANTS)
+    if RC_PAIRS == 2:
+        pairs = [(a, b) for a in range(len(TIME_CONSTANTS)) for b in range(a + 1, len(TIME_CONSTANTS))]
+    else:
+        pairs = [(a,) for a in range(len(TIME_CONSTANTS))]
+    pairs = np.array(pairs)
+    fixed = np.column_stack([ocvBasis(soc), -i])
+    AA, Ay = normalEquations(fixed, rc, U, pairs)
+    coefficients = solveNonNegative(AA, Ay, RIDGE * len(t)) # (candidates, parameters)
+    # Squared error |U - A c|² = |U|² - 2 cᵀAᵀy + cᵀAᵀA c, without the penalty
+    squared_error = U @ U - 2 * np.einsum("kp,kp->k", coefficients, Ay) + np.einsum("kp,kpq,kq->k", coefficients, AA, coefficients)
+    best = int(np.argmin(squared_error))
+
+    c = coefficients[best]
+    A = np.column_stack([fixed, -rc[:, pairs[best]]])
+    rms = np.sqrt(np.mean((A @ c - U) ** 2)) # Computed from the residuals, without the cancellation of the sum above
+    result.update({
+        "samples": int(len(t)), "fit_window": [float(t[0]), float(t[-1])], "reached_cutoff": reached_cutoff,
+        "capacity": float(capacity), "ocv": c[:OCV_DEGREE + 1].tolist(), "r0": float(c[OCV_DEGREE + 1]),
+        "rc": [{"r": float(c[OCV_DEGREE + 2 + k]), "tau": float(TIME_CONSTANTS[pairs[best][k]])} for k in range(RC_PAIRS)],
+        "rms_error": float(rms),
+    })
+    return result
+
+# Hash of everything that decides the fit of a run: its data, the fit settings and this file
+def fitKey(path):
+    h = hashlib.sha256()
+    h.update(fileHash(path).encode())
+    h.update(json.dumps(FIT_SETTINGS, sort_keys=True).encode())
+    h.update(fileHash(__file__).encode())
+    return h.hexdigest()
+
+def loadCache(path=CACHE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def saveJson(data, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# Fit all runs in the catalog, reusing cached fits. Returns {path: model}
+def fitCatalog(catalog, force=FORCE_REFIT, workers=NUMBER_OF_WORKERS):
+    cache = loadCache()
+    models = {}
+    jobs = {}
+    for entry in catalog.findRuns(mode="charging") + catalog.findRuns(mode="discharging"):
+        path = entry["path"]
+        key = fitKey(path)
+        if not force and cache.get(path, {}).get("key") == key:
+            models[path] = cache[path]["model"]
+        else:
+            jobs[path] = (key, entry)
+    print(f"{len(models)} runs up to date, {len(jobs)} to fit")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fitRun, path, entry): path for path, (key, entry) in jobs.items()}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                models[path] = future.result()
+            except Exception as e:
+                print(f"Fitting {path} failed: {e}")
+                continue
+            cache[path] = {"key": jobs[path][0], "model": models[path]}
+            saveJson(cache, CACHE_PATH) # Saved after every run, so finished fits survive a crash
+    return models
+
+# The fitted discharge runs that reached the cutoff voltage at the measured temperature nearest to temperature, one per
+# power, sorted by power. Of several runs at the same power the one with the most capacity is used, so the last part of
+# a run that was split over several files (e.g. 3.1) is not used instead of the whole, merged run
+def dischargeModels(models, temperature):
+    candidates = [m for m in models if m["mode"] == "discharging" and "error" not in m and m["reached_cutoff"]]
+    if not candidates:
+        raise Exception("There are no fitted discharge runs that reached the cutoff voltage")
+    nearest_temperature = min({m["temperature"] for m in candidates}, key=lambda T: abs(T - temperature))
+    by_power = {}
+    for m in candidates:
+        if m["temperature"] == nearest_temperature and m["capacity"] > by_power.get(m["cw_power"], {}).get("capacity", 0):
+            by_power[m["cw_power"]] = m
+    return [by_power[power] for power in sorted(by_power)]
+
+# Simulate a CW discharge with a fitted model until the voltage drops below the cutoff. Returns the runtime in s
+def simulateRuntime(model, power, cutoff=FIT_CUTOFF_VOLTAGE, dt=PREDICTION_STEP):
+    capacity = model["capacity"] * 3600 # As
+    decay = np.array([np.exp(-dt / rc["tau"]) for rc in model["rc"]])
+    r = np.array([rc["r"] for rc in model["rc"]])
+    v = np.zeros(len(r))
+    r0 = max(model["r0"], 0.0)
+    charge = 0.0
+    t = 0.0
+    while charge < capacity:
+        source = ocv(model, 1 - charge / capacity) - v.sum()
+        discriminant = source ** 2 - 4 * r0 * power
+        if discriminant < 0:
+            break # The battery can not deliver the power any more
+        i = (source - np.sqrt(discriminant)) / (2 * r0) if r0 > 0 else power / source # P = (source - R0 * i) * i
+        if source - r0 * i < cutoff:
+            break
+        v = decay * v + (1 - decay) * r * i
+        charge += i * dt
+        t += dt
+    return t
+
+# Runtime of a CW discharge at power and temperature. Every model is simulated at the power, and between the
+# powers of two measured runs the runtimes of their models are interpolated in log(runtime) vs log(power),
+# which is a straight line for a battery that follows Peukert's law. Returns (runtime in s, temperature of the models)
+def predictRuntime(models, power, temperature):
+    candidates = dischargeModels(models, temperature)
+    powers = np.log([m["cw_power"] for m in candidates])
+    runtimes = np.array([simulateRuntime(m, power) for m in candidates])
+    if np.any(runtimes <= 0):
+        runtime = float(runtimes[np.argmin(np.abs(powers - np.log(power)))])
+    else:
+        runtime = float(np.exp(np.interp(np.log(power), powers, np.log(runtimes))))
+    return runtime, candidates[0]["temperature"]
+
+def main():
+    start = time.perf_counter()
+    models = fitCatalog(RunCatalog())
+    results = sorted(models.values(), key=lambda m: (m["mode"], m["run_id"]))
+    print(f"Fitted in {time.perf_counter() - start:.1f} s")
+    for m in results:
+        if "error" in m:
+            print(f"\t{m['mode']:<12} RUN_ID {m['run_id']:<10} not fitted: {m['error']}")
+            continue
+        rc = ", ".join(f"R {p['r'] * 1000:.0f} mOhm tau {p['tau'] / 60:.0f} min" for p in m["rc"])
+        print(f"\t{m['mode']:<12} RUN_ID {m['run_id']:<10} {m['capacity']:6.2f} Ah  OCV {ocv(m, 1):.2f}-{ocv(m, 0):.2f} V  "
+            f"R0 {m['r0'] * 1000:.0f} mOhm  {rc}  rms {m['rms_error'] * 1000:.1f} mV")
+
+    predictions = []
+    print("Predicted CW discharge runtimes:")
+    for p in PREDICTIONS:
+        try:
+            runtime, model_temperature = predictRuntime(results, p["power"], p["temperature"])
+        except Exception as e:
+            print(f"\t{e}")
+            break
+        predictions.append(dict(p, runtime=runtime, model_temperature=model_temperature))
+        print(f"\t{p['power']} W at {p['temperature']} C: {runtime / 3600:.1f} h (models at {model_temperature:g} C)")
+    saveJson({"models": results, "predictions": predictions, "settings": FIT_SETTINGS}, MODELS_PATH)
+    print(f"Models written to {MODELS_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+# FileHash.py
+# DATE: 18/10 2026
+
+# Content hash of a file, read in chunks so large run files are not loaded at once. Used by the caches
+# that decide if a run has to be processed again (BatchPlotter.py, EquivalentCircuitFit.py).
+
+import hashlib
+
+def fileHash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,128 @@
+# OnlineStatistics.py
+# DATE: 18/10 2026
+
+# Statistics that are updated on every sample while a run is measured, in O(1) time and memory per
+# sample, so problems show up during the run instead of days later in the post-run scripts:
+#   - charge (Ah) and energy (Wh) so far, by trapezoidal integration
+#   - running mean/std/min/max of current, voltage and power (Welford's algorithm)
+#   - dV/dt between the last two samples
+#   - internal resistance, estimated from -dU/dI whenever the current steps by more than current_step
+#
+# Alerts are rules on these values, e.g. "abort if less than 0.5 Ah after 30 minutes" to stop a run
+# where the battery does nothing instead of logging it for days.
+# A rule is a dict: {"metric": ..., "below"/"above": value, "after": s, "action": "warn"/"abort"}.
+# It is checked on every sample from `after` on, and fires at most once.
+
+import json
+import math
+
+METRICS = ["capacity", "energy", "current", "voltage", "power", "dvdt", "resistance"]
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def toDict(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.mean, "std": self.std(), "min": self.min, "max": self.max}
+
+class OnlineStatistics:
+    # current_sign: 1 if the current is positive into the battery (charging), -1 if out of it (discharging).
+    # charge and energy: starting values, when a run is resumed
+    def __init__(self, alerts=(), current_sign=1, current_step=0.2, charge=0.0, energy=0.0):
+        self.alerts = [dict(rule) for rule in alerts]
+        for rule in self.alerts:
+            if rule["metric"] not in METRICS:
+                raise Exception(f"Unknown alert metric '{rule['metric']}'. Known metrics: {', '.join(METRICS)}")
+            if rule.get("action", "warn") not in ["warn", "abort"]:
+                raise Exception(f"Unknown alert action '{rule['action']}'")
+        self.current_sign = current_sign
+        self.current_step = current_step
+        self.charge = charge
+        self.energy = energy
+        self.stats = {name: RunningStats() for name in ["current", "voltage", "power", "dvdt", "resistance"]}
+        self.dvdt = 0.0
+        self.resistance = None # Latest estimate
+        self.last = None # (t, current, voltage, power)
+        self.fired = [] # Alerts that have fired, with time and value
+
+    # Add a sample. Returns the abort alert message if a rule with action "abort" fired, otherwise None
+    def update(self, t, current, voltage, power=None):
+        if power is None:
+            power = current * voltage
+        if self.last is not None:
+            t_last, current_last, voltage_last, power_last = self.last
+            dt = t - t_last
+            if dt > 0:
+                self.charge += (abs(current) + abs(current_last)) / 2 * dt / 3600
+                self.energy += (abs(power) + abs(power_last)) / 2 * dt / 3600
+                self.dvdt = (voltage - voltage_last) / dt
+                self.stats["dvdt"].add(self.dvdt)
+            di = current - current_last
+            if abs(di) >= self.current_step:
+                resistance = self.current_sign * (voltage - voltage_last) / di
+                if resistance > 0:
+                    self.resistance = resistance
+                    self.stats["resistance"].add(resistance)
+        self.last = (t, current, voltage, power)
+        self.stats["current"].add(current)
+        self.stats["voltage"].add(voltage)
+        self.stats["power"].add(power)
+        return self.checkAlerts(t)
+
+    def value(self, metric):
+        return {
+            "capacity": self.charge, "energy": self.energy, "current": self.last[1], "voltage": self.last[2],
+            "power": self.last[3], "dvdt": self.dvdt, "resistance": self.resistance,
+        }[metric]
+
+    def checkAlerts(self, t):
+        abort = None
+        for rule in self.alerts:
+            if rule.get("fired") or t < rule.get("after", 0):
+                continue
+            value = self.value(rule["metric"])
+            if value is None:
+                continue
+            if ("below" in rule and value < rule["below"]) or ("above" in rule and value > rule["above"]):
+                rule["fired"] = True
+                limit = f"below {rule['below']}" if "below" in rule else f"above {rule['above']}"
+                message = f"{rule['metric']} is {value:.4g}, {limit} at {t:.0f} s"
+                self.fired.append({"t": t, "rule": {k: v for k, v in rule.items() if k != "fired"}, "value": value})
+                print(f"ALERT: {message}" + (". Aborting the run." if rule.get("action") == "abort" else ""))
+                if rule.get("action") == "abort" and abort is None:
+                    abort = message
+        return abort
+
+    def toDict(self):
+        return {
+            "capacity": self.charge, "energy": self.energy, "dvdt": self.dvdt, "resistance": self.resistance,
+            "stats": {name: s.toDict() for name, s in self.stats.items()}, "alerts": self.fired,
+        }
+
+    def printStats(self):
+        if self.last is None:
+            return
+        r = f"{self.resistance * 1000:.0f} mOhm" if self.resistance is not None else "-"
+        print(f"Online: {self.charge:.3f} Ah, {self.energy:.3f} Wh, dV/dt {self.dvdt * 3600:.3f} V/h, R {r}, "
+            f"U {self.stats['voltage'].min:.3f}-{self.stats['voltage'].max:.3f} V")
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.toDict(), f, indent=4)
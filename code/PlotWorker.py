@@ -0,0 +1,79 @@
+# PlotWorker.py
+# DATE: 18/10 2026
+
+# Renders plots in a separate process so that matplotlib never stalls the sampling loop.
+# The collectors submit a job with copies (snapshots) of their data. Only the newest job is kept:
+# if the worker is still busy when a new job arrives, the waiting job is dropped since it is stale.
+# With report_timings, the worker sends back how long every figure took to render and save, so it
+# can be profiled from the collector (see Profiling.py).
+
+import multiprocessing
+import queue
+import time
+from Decimation import minMaxDecimate
+
+# A job is a list of figures, each a tuple (x_array, y_array, x_label, y_label, filename)
+
+def renderJob(plt, job, timings=None):
+    for x, y, x_label, y_label, filename in job:
+        start = time.perf_counter()
+        plt.plot(*minMaxDecimate(x, y)) # Decimated, keeping spikes
+        plt.xlabel(x_label)
+        plt.ylabel(y_label)
+        plt.savefig(filename)
+        plt.close()
+        if timings is not None:
+            timings.put((filename, time.perf_counter() - start))
+
+def plotWorkerLoop(jobs, timings=None):
+    import matplotlib
+    matplotlib.use("Agg") # No GUI in the worker
+    from matplotlib import pyplot as plt
+
+    while True:
+        job = jobs.get()
+        if job is None: # Sentinel from close()
+            return
+        try:
+            renderJob(plt, job, timings)
+        except Exception as e:
+            print(f"Error occureted when plotting ({e}). Continuing...")
+
+class PlotWorker:
+    def __init__(self, report_timings=False):
+        self.jobs = multiprocessing.Queue(maxsize=1)
+        self.timings = multiprocessing.Queue() if report_timings else None
+        self.process = multiprocessing.Process(target=plotWorkerLoop, args=(self.jobs, self.timings), daemon=True)
+        self.process.start()
+
+    # Queue a job without blocking. A job that is still waiting is replaced by this one
+    def submit(self, job):
+        while True:
+            try:
+                self.jobs.put_nowait(job)
+                return
+            except queue.Full:
+                try:
+                    self.jobs.get_nowait() # Drop the stale job
+                except queue.Empty:
+                    pass
+
+    # The (filename, render time in s) of the figures rendered since the last call. Empty without report_timings
+    def takeTimings(self):
+        timings = []
+        while self.timings is not None:
+            try:
+                timings.append(self.timings.get_nowait())
+            except queue.Empty:
+                break
+        return timings
+
+    # Let the worker finish the queued job and stop it
+    def close(self, timeout=None):
+        if not self.process.is_alive():
+            return
+        self.jobs.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print("Plot worker did not finish in time. Terminating it.")
+            self.process.terminate()
@@ -2,11 +2,20 @@
 # AUTHOR: Sigfrid Stjärnholm
 # DATE: 2/5 2022
 
-import serial
+import os
 import time
 import numpy as np
-from matplotlib import pyplot as plt
-from wakepy import keepawake # For keeping the computer turned awake when running
+from SampleLog import SampleLogWriter, CHARGE_COLUMNS
+from ColumnBuffer import ColumnBuffer
+from PlotWorker import PlotWorker
+from SamplingScheduler import SamplingScheduler
+from RunCatalog import updateCatalog
+from TelemetryServer import TelemetryServer
+from RunCheckpoint import RunState, resumeRun, checkpointPath
+from OnlineStatistics import OnlineStatistics
+from Profiling import openProfiler
+from RunMetadata import RunMetadata, metadataPath
+from SerialTransport import SerialTransport
 
 # NOTE: This assumes that the power supply is connected to COM3. This can be changed in the code below.
 # NOTE: This assumes that the power supply has RS485 ID 01. This is set by holding down the "VSET" button.
@@ -22,162 +31,292 @@ RUN_ID = "8"
 COM_PORT = "COM3"
 CC_CURRENT = 2 # CC current in A
 CC_VOLTAGE = 9*1.50 # CC max voltage in V
+TEMPERATURE = 20 # Chamber temperature in C (for the run metadata and catalog)
+NOTES = "" # Free text about the run, stored in the run metadata
 MEASURING_TIME = 3 * day # Measuring time in s
 MEASURING_INTERVAL = 2 * min # Measuring interval in s
 NUMBER_OF_TIMES_TO_PLOT = 40 # Amount of times to do plotting during the measure interval
+FSYNC_EVERY = 10 # Amount of samples to write before forcing them to disk
+SIMULATE = False # Use a simulated power supply instead of the one on COM_PORT (see SimulatedInstruments.py)
+SIMULATION_TIME_SCALE = 1 # Simulated seconds per real second for the simulated battery
+TELEMETRY_PORT = 8081 # Local HTTP port for following the run live (see TelemetryServer.py). None turns it off
+RESUME = False # Continue the interrupted run with these parameters from its checkpoint (see RunCheckpoint.py)
+ADAPTIVE_SAMPLING = False # Sample faster when the voltage or current changes quickly (see AdaptiveSampling.py). MEASURING_INTERVAL is then the slowest interval
+ADAPTIVE_FAST_INTERVAL = 0.5 * sec # Fastest interval in adaptive sampling
+VOLTAGE_RESOLUTION = 0.01 # V. In adaptive sampling, a sample is taken when the voltage is expected to have changed this much
+CURRENT_RESOLUTION = 0.01 # A. Same for the current
+CV_KNEE_MARGIN = 0.3 # V. In adaptive sampling, the fast interval is used from this far below the CV voltage (the CC -> CV knee)...
+CV_TOLERANCE = 0.05 # V. ...up to this far below it. At the CV voltage the current taper sets the interval again
+PROFILE = False # Write timed spans, counters and stack samples to data/charging/<run name>_profile.jsonl (see Profiling.py)
+PROFILE_SAMPLE_INTERVAL = 0.01 # Time between stack samples of the sampling profiler in s. None turns the sampling profiler off
+ALERTS = [ # Checked on every sample, see OnlineStatistics.py
+    # Warn if less than half of the set current has gone into the battery during the first 30 minutes.
+    # Only a warning: a battery that is nearly full is in CV and takes little current from the start
+    {"metric": "capacity", "below": 0.5 * CC_CURRENT * 30 * min / hour, "after": 30 * min, "action": "warn"},
+]
 
-def byte_to_float(b):
-    return float(b.decode())
-
-def byte_to_bool(b):
-    return bool(int(b.decode()))
-
-def encode(s):
-    return (s + "\n").encode()
+RUN_NAME = f"PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}"
+RUN_FILE = f"data/charging/{RUN_NAME}.bin"
+CHECKPOINT_FILE = checkpointPath(RUN_FILE)
+METADATA_FILE = metadataPath(RUN_FILE)
+USER_FIELDS = {"temperature": TEMPERATURE, "notes": NOTES} # User supplied fields of the run metadata (see RunMetadata.py)
+RUN_SETPOINTS = {"run_id": RUN_ID, "cc_current": CC_CURRENT, "cc_voltage": CC_VOLTAGE, "measuring_time": MEASURING_TIME, "measuring_interval": MEASURING_INTERVAL}
 
 # Get the set current and convert into a float representation
 def getSetCurrent(ser):
-    ser.write(encode("ISET01?"))
-    return byte_to_float(ser.readline())
+    return ser.query("ISET01?", float)
 
 # Get the set voltage and convert into a float representation
 def getSetVoltage(ser):
-    ser.write(encode("VSET01?"))
-    return byte_to_float(ser.readline())
+    return ser.query("VSET01?", float)
 
 # Get the set current and convert into a float representation
 def setSetCurrent(ser, current):
-    ser.write(encode("ISET01:" + str(current)))
+    ser.send("ISET01:" + str(current))
     return 
 
 # Get the set voltage and convert into a float representation
 def setSetVoltage(ser, voltage):
-    ser.write(encode("VSET01:" + str(voltage)))
+    ser.send("VSET01:" + str(voltage))
     return 
 
 # Get the output current and convert into a float representation
 def getOutputCurrent(ser):
-    ser.write(encode("IOUT01?"))
-    return byte_to_float(ser.readline())
+    return ser.query("IOUT01?", float)
 
 # Get the output voltage and convert into a float representation
 def getOutputVoltage(ser):
-    ser.write(encode("VOUT01?"))
-    return byte_to_float(ser.readline())
+    return ser.query("VOUT01?", float)
 
 # Get the on state
 def getOnState(ser):
-    ser.write(encode("OUT01?"))
-    return byte_to_bool(ser.readline())
+    return ser.query("OUT01?", lambda s: bool(int(s)))
 
 # Set the on state
 def setOnState(ser, state):
     if state:
-        ser.write(b"OUT01:1\n")
+        ser.send("OUT01:1")
     else:
-        ser.write(b"OUT01:0\n")
+        ser.send("OUT01:0")
+
+simulated_instrument = None
+
+# Open the serial port of the power supply (or the simulated one)
+def openPort(port):
+    global simulated_instrument
+    if SIMULATE:
+        from SimulatedInstruments import SimulatedPowerSupply
+        if simulated_instrument is None:
+            simulated_instrument = SimulatedPowerSupply(port=port, time_scale=SIMULATION_TIME_SCALE)
+        simulated_instrument.open() # Reopening keeps the state of the instrument, as with the real one
+        return simulated_instrument
+    import serial # Not needed for the simulated instrument
+    return serial.Serial(port, baudrate=115200, timeout=1)
+
+# Connect to the power supply through the transport (retries, reopening the port, statistics)
+def openSerial():
+    return SerialTransport(COM_PORT, open=openPort)
+
+# Update the entry of this run in the run catalog. The temperature, date, notes, ... come from the run metadata
+def updateRunCatalog(samples, metadata):
+    try:
+        t_array = samples.column("t")
+        time_range = {"t_start": float(t_array[0]), "t_end": float(t_array[-1])} if len(t_array) > 0 else {}
+        updateCatalog(RUN_FILE, mode="charging", columns=len(CHARGE_COLUMNS), sample_count=len(t_array), **RUN_SETPOINTS, **time_range, **metadata.catalogFields())
+    except Exception as e:
+        print(f"Could not update the run catalog ({e}). Continuing...")
+
+# Add the render times of the plot worker process to the profile
+def recordRenderTimes(plot_worker, profiler):
+    for filename, duration in plot_worker.takeTimings():
+        profiler.record("render", duration, file=os.path.basename(filename))
+
+# Run one bookkeeping step when exiting. A failing step is reported and does not stop the others. Returns True if it worked
+def cleanupStep(name, function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+        return True
+    except Exception as e:
+        print(f"Could not {name} ({e}). Continuing...")
+        return False
+
+# Build a job for the plot worker from a snapshot of the samples
+def plotJob(samples):
+    t_array, I_array, U_array = samples.snapshot()
+    return [
+        (t_array, I_array, 'Time (s)', 'Current (A)', f"data/charging/plots/CURRENT_{RUN_NAME}.png"),
+        (t_array, U_array, 'Time (s)', 'Voltage (V)', f"data/charging/plots/VOLTAGE_{RUN_NAME}.png"),
+    ]
 
 def main():
+    from wakepy import keepawake # For keeping the computer turned awake when running
+
     # Connect to power supply
-    ser = serial.Serial(COM_PORT, baudrate=115200, timeout=1)  # open serial port
+    ser = openSerial()  # open serial port
 
     # Print details
     print(f"Port: {ser.port}, Onstate: {getOnState(ser)}")
     print(f"\t Set: Current: {getSetCurrent(ser)} A, Voltage: {getSetVoltage(ser)}")
     print(f"\t Out: Current: {getOutputCurrent(ser)} A, Voltage: {getOutputVoltage(ser)}")
 
-    # Initilize
+    # Resume an interrupted run, or start a new one
+    previous_samples = None
+    if RESUME:
+        state, previous_samples = resumeRun(RUN_FILE, lambda i, u: (i, u * i))
+        print(f"Resuming run at {state.elapsed:.0f} s: {state.sample_count} samples, {state.charge:.2f} Ah and {state.energy:.2f} Wh charged")
+    else:
+        if os.path.exists(RUN_FILE):
+            raise Exception(f"{RUN_FILE} already exists. Set RESUME = True to continue it, or change RUN_ID")
+        state = RunState(RUN_SETPOINTS, MEASURING_INTERVAL)
+    stats = OnlineStatistics(ALERTS, current_sign=1, charge=state.charge, energy=state.energy)
+
+    # Initilize (the setpoints are restored from the checkpoint when resuming)
     print("\nInitializing measurement...")
     setOnState(ser, False)
-    setSetCurrent(ser, CC_CURRENT)
-    setSetVoltage(ser, CC_VOLTAGE)
+    setSetCurrent(ser, state.setpoints["cc_current"])
+    setSetVoltage(ser, state.setpoints["cc_voltage"])
+
+    # Record how the run is made, with the setpoints as the power supply reports them.
+    # The power supply has no identification query, so there is no IDN
+    readback = {"cc_current": getSetCurrent(ser), "cc_voltage": getSetVoltage(ser)}
+    metadata = RunMetadata(METADATA_FILE)
+    start_record = metadata.start("charging", state.setpoints, readback, None, COM_PORT, USER_FIELDS, resumed=RESUME)
     print("Measurement started!")
     
+    log = None
+    samples = None
+    end_reason = "interrupted"
+    telemetry = None
+    scheduler = None
+    profiler = openProfiler(RUN_FILE, PROFILE, PROFILE_SAMPLE_INTERVAL)
+    ser.profiler = profiler
+    plot_worker = PlotWorker(report_timings=PROFILE)
     try:
         # Use keepawake context to prevent computer from going asleep when we are running
         with keepawake(keep_screen_awake=False):
+            samples = ColumnBuffer(CHARGE_COLUMNS, capacity=MEASURING_TIME // MEASURING_INTERVAL + 1)
+            if previous_samples is not None:
+                samples.extend(*previous_samples)
+                previous_samples = None # The samples are in the buffer now, dont keep a second copy
+            # The telemetry port is bound before the output is turned on, a port conflict does not stop the run
+            telemetry = TelemetryServer(samples, dict(RUN_SETPOINTS, run_name=RUN_NAME, on=False), port=TELEMETRY_PORT)
+            telemetry.start()
+
             # Turn on and start measuring
             setOnState(ser, True)
+            telemetry.updateStatus(on=True)
             time.sleep(1) # Sleep for 1 second before measurements start
-            t_array = np.array([])
-            I_array = np.array([])
-            U_array = np.array([])
-            start = time.time()
-            has_plotted_amount_of_times = 0
-            while time.time() - start < MEASURING_TIME:
-                t = time.time() - start
-                i = getOutputCurrent(ser)
-                u = getOutputVoltage(ser)
-                t_array = np.append(t_array, t)
-                I_array = np.append(I_array, i)
-                U_array = np.append(U_array, u)
-                # print(f"Data: u = {u}, i = {i}")
-
-                # Save data
-                with open(f'data/charging/PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.npy', 'wb') as f:
-                    np.save(f, t_array)
-                    np.save(f, I_array)
-                    np.save(f, U_array)
-                
-                # Plot data occationally
-                try:
-                    if t / MEASURING_TIME * NUMBER_OF_TIMES_TO_PLOT > has_plotted_amount_of_times:
-                        has_plotted_amount_of_times += 1
-                        print(f"Plotting... ({has_plotted_amount_of_times}/{NUMBER_OF_TIMES_TO_PLOT}). Measurement time: {t:.0f}/{MEASURING_TIME} s ({(t/MEASURING_TIME*100):.0f} %)")
+            log = SampleLogWriter(RUN_FILE, CHARGE_COLUMNS, metadata=dict(RUN_SETPOINTS, run_metadata=start_record), fsync_every=FSYNC_EVERY)
+            log.profiler = profiler
+            state.save(CHECKPOINT_FILE) # A crash before the first sync can still be resumed
+            updateRunCatalog(samples, metadata)
+            adaptive = None
+            if ADAPTIVE_SAMPLING:
+                from AdaptiveSampling import AdaptiveRate, bandBelow # Only loaded when adaptive sampling is on
+                adaptive = AdaptiveRate(ADAPTIVE_FAST_INTERVAL, MEASURING_INTERVAL, {"U": VOLTAGE_RESOLUTION, "I": CURRENT_RESOLUTION},
+                    levels=[bandBelow("U", state.setpoints["cc_voltage"], CV_KNEE_MARGIN, CV_TOLERANCE)])
+            scheduler = SamplingScheduler(ADAPTIVE_FAST_INTERVAL if ADAPTIVE_SAMPLING else MEASURING_INTERVAL, MEASURING_TIME - state.t_offset, timing_path=f'data/charging/{RUN_NAME}_timing.bin')
+            has_plotted_amount_of_times = int(state.t_offset / MEASURING_TIME * NUMBER_OF_TIMES_TO_PLOT) # Plots already made before a resume
+            for t_nominal, t in scheduler.ticks():
+                t += state.t_offset # Continuous timebase when resuming
+                profiler.tick(t)
+                with scheduler.phase("query"), profiler.span("query"):
+                    i = getOutputCurrent(ser)
+                    u = getOutputVoltage(ser)
+                telemetry.append(t, i, u)
+
+                # Save data (only the new sample is appended)
+                with scheduler.phase("save"), profiler.span("save"):
+                    log.append(t, i, u)
+                    state.update(t, i, u * i)
+                    if log.unsynced == 0: # Only checkpoint what is on disk
+                        with profiler.span("checkpoint"):
+                            state.save(CHECKPOINT_FILE)
 
-                        plt.plot(t_array, I_array)
-                        plt.xlabel('Time (s)')
-                        plt.ylabel('Current (A)')
-                        plt.savefig(f"data/charging/plots/CURRENT_PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-                        plt.close()
+                # Online statistics and alerts
+                with profiler.span("stats"):
+                    abort = stats.update(t, i, u)
+                if abort is not None:
+                    print(f"Run aborted: {abort}")
+                    end_reason = f"aborted: {abort}"
+                    break
 
-                        plt.plot(t_array, U_array)
-                        plt.xlabel('Time (s)')
-                        plt.ylabel('Voltage (V)')
-                        plt.savefig(f"data/charging/plots/VOLTAGE_PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-                        plt.close()
-                except: 
-                    print("Error occureted when plotting. Continuing...")
+                # Choose the time to the next sample from how fast the signals change
+                if adaptive is not None:
+                    scheduler.setInterval(adaptive.update(t, U=u, I=i))
 
-                time.sleep(MEASURING_INTERVAL)
+                # Plot data occationally (rendering happens in the plot worker process)
+                with scheduler.phase("plot"), profiler.span("plot"):
+                    if t / MEASURING_TIME * NUMBER_OF_TIMES_TO_PLOT > has_plotted_amount_of_times:
+                        has_plotted_amount_of_times += 1
+                        print(f"Plotting... ({has_plotted_amount_of_times}/{NUMBER_OF_TIMES_TO_PLOT}). Measurement time: {t:.0f}/{MEASURING_TIME} s ({(t/MEASURING_TIME*100):.0f} %)")
+                        scheduler.printStats()
+                        stats.printStats()
+                        plot_worker.submit(plotJob(samples))
+                        updateRunCatalog(samples, metadata)
+                recordRenderTimes(plot_worker, profiler)
 
             # Turn off power supply
             setOnState(ser, False)
+            telemetry.updateStatus(on=False)
+            state.finished = True
+            if not end_reason.startswith("aborted"):
+                end_reason = "finished"
 
-            # Plot one last time
-            plt.plot(t_array, I_array)
-            plt.xlabel('Time (s)')
-            plt.ylabel('Current (A)')
-            plt.savefig(f"data/charging/plots/CURRENT_PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-            plt.close()
-
-            plt.plot(t_array, U_array)
-            plt.xlabel('Time (s)')
-            plt.ylabel('Voltage (V)')
-            plt.savefig(f"data/charging/plots/VOLTAGE_PowerSupplyData_RUN_ID-{RUN_ID}_CURRENT-{CC_CURRENT}_VOLTAGE-{CC_VOLTAGE}_TIME-{MEASURING_TIME}_INTERVAL-{MEASURING_INTERVAL}.png")
-            plt.close()
+            # Plot one last time and wait for it to finish
+            plot_worker.submit(plotJob(samples))
+            plot_worker.close()
 
             print("Measurement done!\n")
             
+    except BaseException as e:
+        end_reason = f"error: {type(e).__name__}: {e}" if not isinstance(e, KeyboardInterrupt) else "stopped by the user"
+        raise
     finally:
         print("***********************************************************")
         print("Program exiting...")
-        if ser.is_open:
-            print("Port was open. Turnining off power supply and closing.")
-            setOnState(ser, False)
+        # Turn the power supply off first. The bookkeeping below takes time and may fail (full disk, I/O errors)
+        not_off = None
+        try:
+            if ser.is_open:
+                print("Port was open. Turnining off power supply and closing.")
+                port = ser
+            else:
+                print("Port was not open. Opening port, turnining off power supply and closing.")
+                port = openSerial()  # open serial port
+            setOnState(port, False)
             time.sleep(1)
-            if getOnState(ser):
-                raise Exception("THE POWER SUPPLY IS NOT OFF. PROCEED WITH CAUTION!")
-            ser.close()             # close port
-        else:
-            print("Port was not open. Opening port, turnining off power supply and closing.")
-            ser = serial.Serial(COM_PORT, baudrate=115200, timeout=1)  # open serial port
-            setOnState(ser, False)
-            time.sleep(1)
-            if getOnState(ser):
-                raise Exception("THE POWER SUPPLY IS NOT OFF. PROCEED WITH CAUTION!")
-            ser.close()             # close port
-        print("Port has been closed, and power supply is off. Exiting...")
+            if getOnState(port):
+                not_off = Exception("THE POWER SUPPLY IS NOT OFF. PROCEED WITH CAUTION!")
+            port.close()             # close port
+        except Exception as e:
+            not_off = Exception(f"COULD NOT TURN OFF THE POWER SUPPLY ({e}). PROCEED WITH CAUTION!")
+        if not_off is None:
+            print("Port has been closed, and power supply is off.")
+
+        # Bookkeeping. Every step runs, even if an earlier one fails
+        if log is not None and cleanupStep("close the sample log", log.close):
+            cleanupStep("save the checkpoint", state.save, CHECKPOINT_FILE) # Only what is on disk
+        cleanupStep("write the end of the run metadata", metadata.end, end_reason, state.sample_count, state.elapsed, charge=state.charge, energy=state.energy)
+        if samples is not None:
+            updateRunCatalog(samples, metadata)
+        if scheduler is not None:
+            cleanupStep("close the scheduler", scheduler.close)
+            cleanupStep("print the timing statistics", scheduler.printStats)
+            cleanupStep("save the timing statistics", scheduler.saveStats, f'data/charging/{RUN_NAME}_timing.json')
+        cleanupStep("print the online statistics", stats.printStats)
+        cleanupStep("save the online statistics", stats.save, f'data/charging/{RUN_NAME}_stats.json')
+        print("Serial link:")
+        cleanupStep("print the serial statistics", ser.printStats)
+        cleanupStep("save the serial statistics", ser.saveStats, f'data/charging/{RUN_NAME}_serial.json')
+        cleanupStep("stop the plot worker", plot_worker.close, timeout=60)
+        cleanupStep("record the render times", recordRenderTimes, plot_worker, profiler)
+        cleanupStep("close the profiler", profiler.close)
+        if telemetry is not None:
+            cleanupStep("stop the telemetry server", telemetry.close)
+        if not_off is not None:
+            raise not_off
+        print("Exiting...")
         print("***********************************************************\n")
 
 if __name__ == "__main__":
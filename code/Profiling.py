@@ -0,0 +1,194 @@
+# Profiling.py
+# DATE: 18/10 2026
+
+# Opt-in instrumentation of the collectors, to find out what made a tick run long: the serial round
+# trips, writing the sample log and checkpoint, or the plotting.
+#   - spans: named, timed blocks (with profiler.span("query"): ...). Spans can be nested
+#   - counters: amounts per tick, e.g. bytes written and serial calls (profiler.count("serial_calls"))
+#   - a sampling profiler: a background thread that looks at the stack of the sampling thread every
+#     sample_interval s and counts the functions it is in. It costs one stack walk per sample and
+#     nothing in the sampling loop itself
+#
+# Everything is written as JSON lines to <run name>_profile.jsonl next to the run data, one record
+# per line: {"type": "span", ...}, {"type": "counters", ...} once per tick and {"type": "stacks", ...}
+# at the end. When profiling is turned off, the collectors get NULL_PROFILER, whose spans and
+# counters do nothing.
+#
+# Running this file prints a summary of PROFILE_FILE: time per span (count, total, p50, p99, max),
+# counter totals and the functions the sampling profiler saw most.
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Parameters
+PROFILE_FILE = "data/discharging/DischargeData_RUN_ID-7_POWER-24_TIME-259200_INTERVAL-120_profile.jsonl" # File to summarize
+TOP_FUNCTIONS = 15 # Amount of functions to show from the sampling profiler
+
+PROFILE_SUFFIX = "_profile.jsonl"
+STACK_DEPTH = 8 # Frames kept per stack sample
+
+def profilePath(run_file):
+    return os.path.splitext(run_file)[0] + PROFILE_SUFFIX
+
+class NullProfiler:
+    def span(self, name, **fields):
+        return nullcontext()
+
+    def count(self, name, amount=1):
+        pass
+
+    def record(self, name, duration, **fields):
+        pass
+
+    def tick(self, t):
+        pass
+
+    def close(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+class Profiler:
+    # sample_interval: time between stack samples in s, None to not run the sampling profiler.
+    # The stacks of the thread that creates the profiler are sampled
+    def __init__(self, path, sample_interval=0.01, flush_every=100, clock=time.perf_counter):
+        self.path = path
+        self.f = open(path, "a")
+        self.clock = clock
+        self.flush_every = flush_every
+        self.unflushed = 0
+        self.tick_number = 0
+        self.t = None # Run time of the current tick
+        self.counters = Counter() # Amounts in the current tick
+        self.totals = Counter()
+        self.stacks = Counter()
+        self.stack_samples = 0
+        self.sample_interval = sample_interval
+        self.thread_id = threading.get_ident()
+        self.stop = threading.Event()
+        self.sampler = None
+        self.write({"type": "start", "wall_clock": time.time(), "sample_interval": sample_interval})
+        if sample_interval is not None:
+            self.sampler = threading.Thread(target=self.sampleStacks, daemon=True)
+            self.sampler.start()
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + "\n")
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.f.flush()
+            self.unflushed = 0
+
+    @contextmanager
+    def span(self, name, **fields):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, self.clock() - start, **fields)
+
+    # Add a span that was timed elsewhere (e.g. in the plot worker process)
+    def record(self, name, duration, **fields):
+        self.write({"type": "span", "name": name, "tick": self.tick_number, "t": self.t, "duration": duration, **fields})
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    # Start a new tick at run time t. The counters of the previous tick are written
+    def tick(self, t):
+        self.writeCounters()
+        self.tick_number += 1
+        self.t = t
+
+    def writeCounters(self):
+        if self.counters:
+            self.write({"type": "counters", "tick": self.tick_number, "t": self.t, **self.counters})
+            self.totals.update(self.counters)
+            self.counters = Counter()
+
+    # Sampling profiler thread: count the innermost STACK_DEPTH frames of the profiled thread
+    def sampleStacks(self):
+        while not self.stop.wait(self.sample_interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(stack)] += 1
+                self.stack_samples += 1
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.sampler is not None:
+            self.stop.set()
+            self.sampler.join()
+        self.writeCounters()
+        self.write({"type": "stacks", "samples": self.stack_samples, "sample_interval": self.sample_interval,
+            "stacks": [{"stack": list(stack), "count": count} for stack, count in self.stacks.most_common()]})
+        self.write({"type": "end", "wall_clock": time.time(), "ticks": self.tick_number, "totals": dict(self.totals)})
+        self.f.close()
+
+# The profiler of a run: a Profiler writing next to run_file if enabled, otherwise NULL_PROFILER
+def openProfiler(run_file, enabled, sample_interval=0.01):
+    if not enabled:
+        return NULL_PROFILER
+    return Profiler(profilePath(run_file), sample_interval=sample_interval)
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+# Summary of a profile file: {"spans": {name: stats}, "counters": {name: total}, "functions": [(function, share)], ...}
+def summarize(path):
+    spans = {}
+    counters = Counter()
+    stacks = Counter()
+    stack_samples = 0
+    ticks = 0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # A line cut off by a crash
+            if record["type"] == "span":
+                spans.setdefault(record["name"], []).append(record["duration"])
+            elif record["type"] == "counters":
+                counters.update({k: v for k, v in record.items() if k not in ["type", "tick", "t"]})
+                ticks = max(ticks, record["tick"])
+            elif record["type"] == "stacks":
+                stack_samples += record["samples"]
+                for s in record["stacks"]:
+                    stacks[s["stack"][0]] += s["count"] # Innermost frame: where the time was spent
+    span_stats = {}
+    for name, durations in spans.items():
+        durations.sort()
+        span_stats[name] = {"count": len(durations), "total": sum(durations), "p50": percentile(durations, 50),
+            "p99": percentile(durations, 99), "max": durations[-1]}
+    functions = [(function, count / stack_samples) for function, count in stacks.most_common(TOP_FUNCTIONS)] if stack_samples else []
+    return {"spans": span_stats, "counters": dict(counters), "ticks": ticks, "stack_samples": stack_samples, "functions": functions}
+
+def printSummary(summary):
+    print("Spans:")
+    for name, s in sorted(summary["spans"].items(), key=lambda item: -item[1]["total"]):
+        print(f"\t{name:<12} {s['count']:8d} x  total {s['total']:9.3f} s  p50 {s['p50'] * 1000:8.2f} ms  p99 {s['p99'] * 1000:8.2f} ms  max {s['max'] * 1000:8.2f} ms")
+    print("Counters:")
+    for name, total in sorted(summary["counters"].items()):
+        per_tick = f" ({total / summary['ticks']:.1f} per tick)" if summary["ticks"] > 0 else ""
+        print(f"\t{name:<20} {total:g}{per_tick}")
+    if summary["functions"]:
+        print(f"Sampling profiler ({summary['stack_samples']} samples):")
+        for function, share in summary["functions"]:
+            print(f"\t{share * 100:5.1f} %  {function}")
+
+def main():
+    printSummary(summarize(PROFILE_FILE))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# ProtocolRunner.py
+# DATE: 18/10 2026
+
+# Runs a charge/discharge cycle test from a declarative step list, with the power supply and the
+# electronic load connected to the same battery. Each step ends on an electrical condition that is
+# checked on every sample (e.g. current below 0.5 A for a CC-CV charge, voltage below the cutoff for
+# a CW discharge), with max_time as a safety limit, so no dead time is logged after the battery is done.
+# Between steps the runner hands over between the instruments: the active one is turned off and
+# read back as off before the other one is turned on.
+#
+# Every charge and discharge step is written as a normal run (sample log in data/charging or
+# data/discharging, run metadata file, entry in the run catalog, RUN_ID "<protocol run id>-c<cycle>"),
+# so the plotters and RunAnalysis work on them as usual. Rest steps record the open circuit voltage (measured by the
+# load with its input off) in data/protocol. A summary of all steps (end reason, duration, Ah, Wh)
+# is saved as data/protocol/<name>.json.
+#
+# The protocol is PROTOCOL below, or a JSON file with the same structure (PROTOCOL_FILE).
+
+import json
+import os
+import time
+import PowerSupplyDataCollector as psu
+import DischargeDataCollector as load
+from SampleLog import SampleLogWriter, CHARGE_COLUMNS, DISCHARGE_COLUMNS
+from SamplingScheduler import SamplingScheduler
+from AdaptiveSampling import AdaptiveRate, bandBelow
+from RunCheckpoint import RunState
+from RunCatalog import updateCatalog
+from RunMetadata import RunMetadata, metadataPath
+
+# Time units
+sec = 1
+min = 60 * sec
+hour = 60 * min
+day = 24 * hour
+
+# Parameters
+PROTOCOL_FILE = None # JSON file with the protocol. None uses PROTOCOL below
+SIMULATE = False # Use simulated instruments on a shared simulated battery (see SimulatedInstruments.py)
+SIMULATION_TIME_SCALE = 1 # Simulated seconds per real second for the simulated battery
+FSYNC_EVERY = 10 # Amount of samples to write before forcing them to disk
+HOLD_SAMPLES = 3 # An end condition must hold for this many samples in a row, so one noisy sample does not end a step
+REFERENCE_TEMPERATURE = 20 # C. The charge voltage per cell in the protocol is the voltage at this temperature
+
+PROTOCOL = {
+    "name": "Cycle_RUN_ID-9",
+    "run_id": "9",
+    "cells": 9,
+    "temperature": 20, # Chamber temperature in C
+    "temperature_coefficient": 0.003, # Charge voltage increase in V per cell per C below REFERENCE_TEMPERATURE (runs 5/6: 1.14 * 1.50 V at -50 C)
+    "interval": 2 * min, # Measuring interval in s (the slowest interval with adaptive sampling)
+    "fast_interval": None, # Fastest interval in s for adaptive sampling, None to sample at a fixed interval
+    "repeat": 3,
+    "steps": [
+        {"type": "charge", "current": 2, "voltage_per_cell": 1.50, "until": {"current_below": 0.5}, "min_time": 10 * min, "max_time": 3 * day},
+        {"type": "rest", "time": 1 * hour},
+        {"type": "discharge", "power": 24, "until": {"voltage_below": 9.0}, "min_time": 1 * min, "max_time": 5 * day},
+        {"type": "rest", "time": 1 * hour},
+    ],
+}
+
+# End conditions: name -> function(sample, value). A sample is a dict with "I" and "U"
+CONDITIONS = {
+    "current_below": lambda sample, value: sample["I"] < value,
+    "current_above": lambda sample, value: sample["I"] > value,
+    "voltage_below": lambda sample, value: sample["U"] < value,
+    "voltage_above": lambda sample, value: sample["U"] > value,
+}
+
+def loadProtocol():
+    if PROTOCOL_FILE is None:
+        return PROTOCOL
+    with open(PROTOCOL_FILE) as f:
+        return json.load(f)
+
+# Charge voltage for the chamber temperature. Cold cells need a higher voltage to take any charge
+def compensatedVoltage(voltage_per_cell, cells, temperature, coefficient):
+    return round(cells * (voltage_per_cell + coefficient * (REFERENCE_TEMPERATURE - temperature)), 3)
+
+# Levels where adaptive sampling uses the fast interval: the CC -> CV knee of a charge and the cutoff voltage of a discharge
+def adaptiveLevels(step):
+    if step["type"] == "charge":
+        return [bandBelow("U", step["voltage"], psu.CV_KNEE_MARGIN, psu.CV_TOLERANCE)]
+    if step["type"] == "discharge" and "voltage_below" in step.get("until", {}):
+        return [("U", step["until"]["voltage_below"], load.CUTOFF_MARGIN)]
+    return []
+
+# Checks the end conditions of a step on every sample. Returns the reason the step ended, or None
+class EndCondition:
+    def __init__(self, until, min_time=0, hold=HOLD_SAMPLES):
+        for name in until:
+            if name not in CONDITIONS:
+                raise Exception(f"Unknown end condition '{name}'. Known conditions: {', '.join(CONDITIONS)}")
+        self.until = until
+        self.min_time = min_time
+        self.hold = hold
+        self.count = 0
+
+    def check(self, t, sample):
+        met = [f"{name} {value}" for name, value in self.until.items() if CONDITIONS[name](sample, value)]
+        self.count = self.count + 1 if met and t >= self.min_time else 0
+        return met[0] if self.count >= self.hold else None
+
+class ProtocolRunner:
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.name = protocol["name"]
+        self.charger = None
+        self.load = None
+        self.records = []
+
+    def connect(self):
+        if SIMULATE:
+            from SimulatedInstruments import BatteryModel, SimulatedPowerSupply, SimulatedElectronicLoad
+            battery = BatteryModel(soc=0.05, temperature=self.protocol["temperature"])
+            psu.simulated_instrument = SimulatedPowerSupply(port=psu.COM_PORT, battery=battery, time_scale=SIMULATION_TIME_SCALE)
+            load.simulated_instrument = SimulatedElectronicLoad(port=load.COM_PORT, battery=battery, time_scale=SIMULATION_TIME_SCALE)
+            psu.SIMULATE = load.SIMULATE = True
+        self.charger = psu.openSerial()
+        self.load = load.openSerial()
+        print(f"Connected to power supply on {self.charger.port} and electronic load on {self.load.port}: {load.test(self.load)}")
+        mode = load.getMode(self.load)
+        if mode != "CW":
+            raise Exception(f"The mode of the electronic load is not CW. Set the mode to CW and try again. Mode was '{mode}'")
+
+    # Turn both instruments off and check that they are
+    def allOff(self):
+        for module, ser, name in [(psu, self.charger, "POWER SUPPLY"), (load, self.load, "ELECTRONIC LOAD")]:
+            if ser is None:
+                continue
+            module.setOnState(ser, False)
+            time.sleep(1)
+            if module.getOnState(ser):
+                raise Exception(f"THE {name} IS NOT OFF. PROCEED WITH CAUTION!")
+
+    def runFile(self, step, cycle, index):
+        run_id = f"{self.protocol['run_id']}-c{cycle}"
+        interval = self.protocol["interval"]
+        if step["type"] == "charge":
+            return run_id, f"data/charging/PowerSupplyData_RUN_ID-{run_id}_CURRENT-{step['current']}_VOLTAGE-{step['voltage']}_TIME-{step['max_time']}_INTERVAL-{interval}.bin"
+        if step["type"] == "discharge":
+            return run_id, f"data/discharging/DischargeData_RUN_ID-{run_id}_POWER-{step['power']}_TIME-{step['max_time']}_INTERVAL-{interval}.bin"
+        return run_id, f"data/protocol/{self.name}_cycle-{cycle}_step-{index}_rest.bin"
+
+    # Hand over to the instrument of the step and return (columns, read function, setpoints)
+    def startStep(self, step):
+        self.allOff()
+        if step["type"] == "charge":
+            psu.setSetCurrent(self.charger, step["current"])
+            psu.setSetVoltage(self.charger, step["voltage"])
+            psu.setOnState(self.charger, True)
+            def read():
+                i, u = psu.getOutputCurrent(self.charger), psu.getOutputVoltage(self.charger)
+                return (i, u), {"I": i, "U": u, "P": i * u}
+            return CHARGE_COLUMNS, read, {"cc_current": step["current"], "cc_voltage": step["voltage"]}
+        if step["type"] == "discharge":
+            load.setCWPower(self.load, step["power"])
+            load.setCCCurrent(self.load, load.CC_MAX_CURRENT)
+            load.setOnState(self.load, True)
+            def read():
+                i, u, p = load.getMeasureAll(self.load)
+                return (i, u, p), {"I": i, "U": u, "P": p}
+            return DISCHARGE_COLUMNS, read, {"cw_power": step["power"]}
+        if step["type"] == "rest":
+            def read():
+                u = load.getMeasureVoltage(self.load) # Open circuit voltage, the input is off
+                return (u,), {"I": 0.0, "U": u, "P": 0.0}
+            return ["t", "U"], read, {}
+        raise Exception(f"Unknown step type '{step['type']}'")
+
+    # Record how the run of a charge or discharge step is made (see RunMetadata.py), with the setpoints as the instrument reports them
+    def startMetadata(self, step, path, setpoints, max_time, cycle, index):
+        if step["type"] == "charge":
+            readback = {"cc_current": psu.getSetCurrent(self.charger), "cc_voltage": psu.getSetVoltage(self.charger)}
+            mode, idn, port = "charging", None, self.charger.port # The power supply has no identification query
+        else:
+            readback = {"cw_power": load.getCWPower(self.load), "mode": load.getMode(self.load)}
+            mode, idn, port = "discharging", load.test(self.load), self.load.port
+        user_fields = {"temperature": self.protocol["temperature"], "protocol": self.name, "cycle": cycle, "step": index}
+        metadata = RunMetadata(metadataPath(path))
+        start_record = metadata.start(mode, dict(setpoints, measuring_time=max_time, measuring_interval=self.protocol["interval"]), readback, idn, port, user_fields)
+        return metadata, start_record
+
+    def runStep(self, step, cycle, index):
+        step = dict(step)
+        if step["type"] == "charge":
+            step["voltage"] = compensatedVoltage(step["voltage_per_cell"], self.protocol["cells"], self.protocol["temperature"], self.protocol["temperature_coefficient"])
+        max_time = step.get("max_time", step.get("time"))
+        run_id, path = self.runFile(step, cycle, index)
+        if os.path.exists(path):
+            raise Exception(f"{path} already exists. Change the run_id of the protocol")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        print(f"\nCycle {cycle}/{self.protocol['repeat']}, step {index + 1}/{len(self.protocol['steps'])}: {step}")
+
+        columns, read, setpoints = self.startStep(step)
+        interval = self.protocol["interval"]
+        fast_interval = self.protocol.get("fast_interval")
+        metadata = dict(setpoints, run_id=run_id, protocol=self.name, cycle=cycle, step=index, measuring_time=max_time, measuring_interval=interval)
+        run_metadata = None
+        if step["type"] != "rest":
+            run_metadata, metadata["run_metadata"] = self.startMetadata(step, path, setpoints, max_time, cycle, index)
+        end = EndCondition(step.get("until", {}), step.get("min_time", 0))
+        adaptive = AdaptiveRate(fast_interval, interval, {"U": load.VOLTAGE_RESOLUTION, "I": load.CURRENT_RESOLUTION}, levels=adaptiveLevels(step)) if fast_interval else None
+        scheduler = SamplingScheduler(fast_interval or interval, max_time)
+        state = RunState(setpoints, interval)
+        reason = "max_time" if step["type"] != "rest" else "time"
+        t = 0.0
+        try:
+            with SampleLogWriter(path, columns, metadata=metadata, fsync_every=FSYNC_EVERY) as log:
+                for t_nominal, t in scheduler.ticks():
+                    with scheduler.phase("query"):
+                        values, sample = read()
+                    with scheduler.phase("save"):
+                        log.append(t, *values)
+                    state.update(t, sample["I"], sample["P"])
+                    ended = end.check(t, sample)
+                    if ended is not None:
+                        reason = ended
+                        break
+                    if adaptive is not None:
+                        scheduler.setInterval(adaptive.update(t, U=sample["U"], I=sample["I"]))
+                count = log.count
+        except BaseException as e:
+            reason = f"error: {type(e).__name__}: {e}" if not isinstance(e, KeyboardInterrupt) else "stopped by the user"
+            raise
+        finally:
+            if run_metadata is not None:
+                run_metadata.end(reason, state.sample_count, float(t), charge=state.charge, energy=state.energy)
+        scheduler.close()
+
+        if step["type"] != "rest":
+            fields = {k: v for k, v in metadata.items() if k != "run_metadata"}
+            updateCatalog(path, mode="charging" if step["type"] == "charge" else "discharging", columns=len(columns),
+                sample_count=count, t_start=0.0, t_end=float(t), **fields, **run_metadata.catalogFields())
+        record = {"cycle": cycle, "step": index, "type": step["type"], "path": path, "end_reason": reason, "duration": float(t),
+            "samples": count, "charge": state.charge, "energy": state.energy, "setpoints": setpoints}
+        print(f"Step ended after {t:.0f} s ({reason}): {state.charge:.3f} Ah, {state.energy:.3f} Wh, {count} samples")
+        return record
+
+    def run(self):
+        for cycle in range(1, self.protocol["repeat"] + 1):
+            for index, step in enumerate(self.protocol["steps"]):
+                self.records.append(self.runStep(step, cycle, index))
+                self.saveSummary()
+        self.allOff()
+
+    def saveSummary(self):
+        os.makedirs("data/protocol", exist_ok=True)
+        with open(f"data/protocol/{self.name}.json", "w") as f:
+            json.dump({"protocol": self.protocol, "steps": self.records}, f, indent=4)
+
+    def close(self):
+        try:
+            self.allOff()
+        finally:
+            for ser in [self.charger, self.load]:
+                if ser is not None:
+                    ser.close()
+
+def main():
+    from wakepy import keepawake # For keeping the computer turned awake when running
+
+    runner = ProtocolRunner(loadProtocol())
+    try:
+        with keepawake(keep_screen_awake=False):
+            runner.connect()
+            print("Protocol started!")
+            runner.run()
+            print("Protocol done!\n")
+    finally:
+        print("***********************************************************")
+        print("Program exiting... Turning off both instruments and closing ports.")
+        runner.close()
+        print("***********************************************************\n")
+
+if __name__ == "__main__":
+    main()
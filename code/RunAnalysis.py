@@ -0,0 +1,149 @@
+# RunAnalysis.py
+# DATE: 18/10 2026
+
+# Capacity and energy analysis of charging and discharging runs.
+#
+# Charge (Ah) and energy (Wh) are integrated with the trapezoidal rule, so non-uniform sampling
+# (resumed runs, adaptive sampling, missed slots) is handled correctly. Threshold crossings are
+# found with searchsorted on the running minimum/maximum of the signal, and interpolated linearly
+# between the two samples around the crossing. If a threshold is never crossed the time is None
+# and the totals of the whole run are reported instead of crashing.
+#
+# Capacity and energy of a charge are over the whole run, as current keeps flowing after the
+# time_to_charged threshold. The cycle efficiencies compare the whole run totals of both runs.
+#
+# Running this file analyzes every run in the run catalog and writes the results to data/analysis.json.
+
+import json
+import numpy as np
+from RunData import Run
+from RunCatalog import RunCatalog
+
+# Parameters
+VOLTAGE_THRESHOLD = 0.5 # Discharge cutoff: the battery counts as empty when the voltage drops below this (V)
+CURRENT_THRESHOLD = 0.5 # Charge end: the battery counts as charged when the current drops below this (A)
+CV_TOLERANCE = 0.02 # CC->CV transition: current more than this fraction below the CC setpoint
+ANALYSIS_PATH = "data/analysis.json"
+
+# Pairs of (charging run, discharging run) that were done right after each other (dates in runs.txt)
+CYCLES = [("4", "4"), ("5", "5"), ("6", "6"), ("8", "7")]
+
+# Cumulative integral of y over t with the trapezoidal rule. Same length as t, starting at 0
+def cumulativeTrapezoid(y, t):
+    result = np.empty(len(t))
+    if len(t) == 0:
+        return result
+    result[0] = 0
+    np.cumsum((y[1:] + y[:-1]) / 2 * np.diff(t), out=result[1:])
+    return result
+
+# First index where y < threshold (below=True) or y > threshold (below=False). None if it never happens
+def firstCrossingIndex(y, threshold, below=True):
+    if below:
+        running = -np.minimum.accumulate(y) # Non-decreasing
+        index = np.searchsorted(running, -threshold, side="right")
+    else:
+        running = np.maximum.accumulate(y) # Non-decreasing
+        index = np.searchsorted(running, threshold, side="right")
+    return int(index) if index < len(y) else None
+
+# Time at which y crosses the threshold, interpolated between the samples around the crossing
+def crossingTime(t, y, threshold, below=True):
+    index = firstCrossingIndex(y, threshold, below)
+    if index is None:
+        return None
+    if index == 0:
+        return float(t[0])
+    y0, y1 = y[index - 1], y[index]
+    fraction = (threshold - y0) / (y1 - y0) if y1 != y0 else 1.0
+    return float(t[index - 1] + fraction * (t[index] - t[index - 1]))
+
+# Value of the cumulative integral at time t_end (interpolated), or at the end of the run if t_end is None
+def integralUntil(t, cumulative, t_end):
+    if len(t) == 0:
+        return 0.0
+    if t_end is None:
+        return float(cumulative[-1])
+    return float(np.interp(t_end, t, cumulative))
+
+def dischargeSummary(t_array, I_array, U_array, P_array=None, voltage_threshold=VOLTAGE_THRESHOLD):
+    if P_array is None:
+        P_array = U_array * I_array
+    time_to_cutoff = crossingTime(t_array, U_array, voltage_threshold, below=True)
+    charge = cumulativeTrapezoid(I_array, t_array)
+    energy = cumulativeTrapezoid(P_array, t_array)
+    return {
+        "time_to_cutoff": time_to_cutoff, # s, None if the cutoff was never reached
+        "capacity": integralUntil(t_array, charge, time_to_cutoff) / 3600, # Ah until the cutoff
+        "energy": integralUntil(t_array, energy, time_to_cutoff) / 3600, # Wh until the cutoff
+        "total_capacity": integralUntil(t_array, charge, None) / 3600, # Ah over the whole run
+        "total_energy": integralUntil(t_array, energy, None) / 3600, # Wh over the whole run
+    }
+
+def chargeSummary(t_array, I_array, U_array, cc_current=None, current_threshold=CURRENT_THRESHOLD, cv_tolerance=CV_TOLERANCE):
+    time_to_charged = crossingTime(t_array, I_array, current_threshold, below=True)
+    cv_transition_time = None
+    if cc_current is not None:
+        cv_transition_time = crossingTime(t_array, I_array, cc_current * (1 - cv_tolerance), below=True)
+    charge = cumulativeTrapezoid(I_array, t_array)
+    energy = cumulativeTrapezoid(U_array * I_array, t_array)
+    return {
+        "time_to_charged": time_to_charged, # s, None if the current never dropped below the threshold
+        "cv_transition_time": cv_transition_time, # s, None if CV was never reached
+        "capacity": integralUntil(t_array, charge, None) / 3600, # Ah over the whole run (current keeps flowing after time_to_charged)
+        "energy": integralUntil(t_array, energy, None) / 3600, # Wh over the whole run
+        "capacity_until_charged": integralUntil(t_array, charge, time_to_charged) / 3600, # Ah
+        "energy_until_charged": integralUntil(t_array, energy, time_to_charged) / 3600, # Wh
+    }
+
+# Coulombic and energy efficiency of a charge followed by a discharge, from everything that went in and came out
+def cycleEfficiency(charge, discharge):
+    return {
+        "coulombic_efficiency": discharge["total_capacity"] / charge["capacity"] if charge["capacity"] > 0 else None,
+        "energy_efficiency": discharge["total_energy"] / charge["energy"] if charge["energy"] > 0 else None,
+    }
+
+def analyzeRun(entry):
+    if entry["mode"] == "discharging":
+        return dischargeSummary(*Run(entry["path"], entry=entry).arrays("t", "I", "U", "P"))
+    if entry["mode"] == "charging":
+        return chargeSummary(*Run(entry["path"], entry=entry).arrays("t", "I", "U"), cc_current=entry.get("cc_current"))
+    return None
+
+# Analyze all charging and discharging runs in the catalog, plus the cycles in CYCLES
+def analyzeCatalog(catalog, cycles=CYCLES):
+    results = {"charging": {}, "discharging": {}, "cycles": []}
+    for entry in catalog.findRuns():
+        summary = analyzeRun(entry)
+        if summary is not None:
+            results[entry["mode"]][entry["run_id"]] = summary
+    for charge_id, discharge_id in cycles:
+        if charge_id in results["charging"] and discharge_id in results["discharging"]:
+            efficiency = cycleEfficiency(results["charging"][charge_id], results["discharging"][discharge_id])
+            results["cycles"].append({"charging_run": charge_id, "discharging_run": discharge_id, **efficiency})
+    return results
+
+def formatTime(t):
+    return "-" if t is None else f"{t / 3600:.1f} h"
+
+def formatRatio(r):
+    return "-" if r is None else f"{r * 100:.0f} %"
+
+def main():
+    results = analyzeCatalog(RunCatalog())
+    with open(ANALYSIS_PATH, "w") as f:
+        json.dump(results, f, indent=4)
+
+    print("Charging:")
+    for run_id, s in results["charging"].items():
+        print(f"\tRUN_ID {run_id:<10} {s['capacity']:6.2f} Ah {s['energy']:7.2f} Wh  CC->CV: {formatTime(s['cv_transition_time']):>8}  charged: {formatTime(s['time_to_charged']):>8}")
+    print("Discharging:")
+    for run_id, s in results["discharging"].items():
+        print(f"\tRUN_ID {run_id:<10} {s['capacity']:6.2f} Ah {s['energy']:7.2f} Wh  cutoff: {formatTime(s['time_to_cutoff']):>8}")
+    print("Cycles:")
+    for c in results["cycles"]:
+        print(f"\tCharging {c['charging_run']} -> discharging {c['discharging_run']}: coulombic efficiency {formatRatio(c['coulombic_efficiency'])}, energy efficiency {formatRatio(c['energy_efficiency'])}")
+    print(f"Results written to {ANALYSIS_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# RunArchive.py
+# DATE: 18/10 2026
+
+# Compressed, column oriented archive for finished runs. Each column is stored (and can be read)
+# on its own, and the file carries its own metadata (setpoints, temperature, instrument IDN, ...)
+# so that readers dont have to know the column order or the filename conventions.
+#
+# File layout:
+#   [fixed header: magic, version, header size]
+#   [JSON header: metadata and, per column, name, dtype, count, offset, size, codec and min/max/first/last]
+#   [column 0 bytes][column 1 bytes]...
+#
+# Columns are encoded losslessly as: float bits as integers -> delta -> byte shuffle -> compress.
+# The voltage and current traces change slowly, so consecutive samples have nearly the same bits,
+# the deltas are small and the shuffled high bytes are almost all zero, which compresses well.
+# zstd is used if the zstandard package is installed, otherwise zlib.
+
+import importlib.util
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+# zstandard is imported when a zstd column is first compressed or decompressed, not on every import
+HAS_ZSTANDARD = importlib.util.find_spec("zstandard") is not None
+
+MAGIC = b"BARC"
+VERSION = 1
+FIXED_HEADER = struct.Struct("<4sHI") # magic, version, total header size
+ARCHIVE_EXTENSION = ".arc"
+DEFAULT_CODEC = "zstd" if HAS_ZSTANDARD else "zlib"
+COMPRESSION_LEVEL = {"zstd": 9, "zlib": 9}
+
+def compress(data, codec):
+    if codec == "zstd":
+        if not HAS_ZSTANDARD:
+            raise Exception("The zstandard package is needed for zstd compression")
+        import zstandard
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL[codec]).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, COMPRESSION_LEVEL[codec])
+    raise Exception(f"Unknown codec {codec}")
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if not HAS_ZSTANDARD:
+            raise Exception("The zstandard package is needed to read zstd compressed columns")
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise Exception(f"Unknown codec {codec}")
+
+# Delta of the raw bits, then byte shuffle (all first bytes, then all second bytes, ...). Lossless
+def encodeColumn(array):
+    array = np.ascontiguousarray(array)
+    bits = array.view(f"<i{array.dtype.itemsize}")
+    delta = np.diff(bits, prepend=bits.dtype.type(0)) # Wraps around on overflow, which is undone by cumsum
+    return delta.view(np.uint8).reshape(-1, array.dtype.itemsize).T.tobytes()
+
+def decodeColumn(data, dtype, count):
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, count)
+    delta = np.ascontiguousarray(shuffled.T).view(f"<i{dtype.itemsize}").ravel()
+    return np.cumsum(delta, dtype=delta.dtype).view(dtype)
+
+# Write an archive. columns is a dict of name -> 1D array, in column order
+def writeArchive(path, columns, metadata=None, codec=DEFAULT_CODEC):
+    blobs = []
+    entries = []
+    offset = 0
+    for name, array in columns.items():
+        array = np.asarray(array)
+        blob = compress(encodeColumn(array), codec)
+        entry = {"name": name, "dtype": array.dtype.str, "count": len(array), "offset": offset, "size": len(blob), "codec": codec}
+        if len(array) > 0:
+            entry.update(first=array[0].item(), last=array[-1].item(), min=array.min().item(), max=array.max().item())
+        entries.append(entry)
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({"metadata": metadata or {}, "columns": entries}).encode()
+    header_size = FIXED_HEADER.size + len(header)
+    # Written to a temporary file that is moved into place when complete. An interrupted write never
+    # leaves a partial .arc, which the run catalog would prefer over the good .npy file
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(FIXED_HEADER.pack(MAGIC, VERSION, header_size))
+            f.write(header)
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class RunArchive:
+    # Only reads the header. Columns are read and decoded when they are asked for
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            fixed = f.read(FIXED_HEADER.size)
+            if len(fixed) < FIXED_HEADER.size:
+                raise Exception("Run archive header is truncated")
+            magic, version, self.header_size = FIXED_HEADER.unpack(fixed)
+            if magic != MAGIC:
+                raise Exception(f"Not a run archive (magic was {magic})")
+            if version != VERSION:
+                raise Exception(f"Unsupported run archive version {version}")
+            header = json.loads(f.read(self.header_size - FIXED_HEADER.size).decode())
+        self.metadata = header["metadata"]
+        self.entries = {entry["name"]: entry for entry in header["columns"]}
+        self.columns = [entry["name"] for entry in header["columns"]]
+
+    def __len__(self):
+        return self.entries[self.columns[0]]["count"] if self.columns else 0
+
+    def column(self, name):
+        entry = self.entries[name]
+        with open(self.path, "rb") as f:
+            f.seek(self.header_size + entry["offset"])
+            data = decompress(f.read(entry["size"]), entry["codec"])
+        return decodeColumn(data, entry["dtype"], entry["count"])
+
+    # All columns, in column order
+    def arrays(self):
+        return tuple(self.column(name) for name in self.columns)
+
+# Load an archive as separate column arrays, in the same order as the .npy files (t, I, U[, P])
+def loadArchive(path):
+    return RunArchive(path).arrays()
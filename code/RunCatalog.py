@@ -0,0 +1,310 @@
+# RunCatalog.py
+# DATE: 18/10 2026
+
+# Persistent index of all runs in data/ (data/catalog.json). Holds the run id, mode, setpoints,
+# temperature, date and notes (from the run metadata file, see RunMetadata.py, or else from runs.txt),
+# sample count, time range and file path of every run, so that the
+# merger, the plotters and the analysis scripts dont have to list directories and slice filenames.
+#
+# The collectors update their entry as they write. Queries such as "all 24 W discharges at -50 C"
+# are answered from an in-memory index of (field, value) -> runs, without scanning all entries.
+#
+# Several processes may write the catalog at the same time (two collectors, a merge during a run).
+# save() takes a lock file, reads the catalog on disk again and only applies the entries that were
+# changed or removed through this object, so an update of another process is not lost. The new
+# catalog is written to a temporary file of its own and moved into place.
+#
+# Running this file rebuilds the catalog from the files in data/ (one time import of the old runs).
+
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+import numpy as np
+from SampleLog import SAMPLE_LOG_EXTENSION, mapSampleLog
+from RunArchive import ARCHIVE_EXTENSION, RunArchive
+from RunMetadata import loadCatalogFields
+
+CATALOG_PATH = "data/catalog.json"
+RUNS_TXT_PATH = "runs.txt"
+DATA_DIRECTORIES = {"charging": "data/charging", "discharging": "data/discharging", "multi": "data/multi"}
+
+LOCK_TIMEOUT = 30 # s to wait for the catalog lock
+LOCK_STALE = 120 # s after which a lock file is taken to be left behind by a crashed process
+
+# Fields that are indexed for find()
+INDEXED_FIELDS = ["run_id", "mode", "cw_power", "cc_current", "cc_voltage", "temperature", "measuring_interval"]
+
+# Number of columns in the older .npy files
+NPY_COLUMNS = {"charging": 3, "discharging": 4}
+
+# Parse a run filename such as DischargeData_RUN_ID-3.1_POWER-12_TIME-259200_INTERVAL-120.npy.
+# Only used when importing files that are not in the catalog yet. Returns None for other files.
+def parseRunFilename(filename):
+    stem, extension = os.path.splitext(filename)
+    if extension not in [".npy", SAMPLE_LOG_EXTENSION, ARCHIVE_EXTENSION] or stem.endswith("_timing"):
+        return None
+    parts = stem.split("_")
+    if len(parts) < 2 or not parts[1] == "RUN":
+        return None
+    fields = dict(part.split("-", 1) for part in parts[2:] if "-" in part) # ID-3.1, POWER-12, ...
+    if parts[0] == "DischargeData":
+        entry = {"mode": "discharging", "cw_power": float(fields["POWER"])}
+    elif parts[0] == "PowerSupplyData":
+        entry = {"mode": "charging", "cc_current": float(fields["CURRENT"]), "cc_voltage": float(fields["VOLTAGE"])}
+    elif parts[0] == "MultiData":
+        entry = {"mode": "multi"}
+    else:
+        return None
+    entry["run_id"] = fields["ID"]
+    entry["measuring_time"] = int(fields["TIME"])
+    entry["measuring_interval"] = int(fields["INTERVAL"])
+    return entry
+
+# Read runs.txt into {(mode, run_id): {key: value as written}}. Notes may go on over several lines.
+# A run with several ids shares one dict, e.g. "RUN_ID 2 (+ 2.1):" describes both run 2 and run 2.1
+def readRunsTxt(path=RUNS_TXT_PATH):
+    runs = {}
+    if not os.path.exists(path):
+        return runs
+    mode = None
+    current = None
+    key = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("###"):
+                mode = "charging" if "Charging" in stripped else "discharging"
+                current = None
+            elif stripped.startswith("RUN_ID"):
+                current = {}
+                for run_id in re.findall(r"[\d.]+", stripped.split(":")[0]):
+                    runs[(mode, run_id)] = current
+            elif current is not None and re.match(r"^[A-Za-z][\w ]*:", stripped):
+                key, value = [s.strip() for s in stripped.split(":", 1)]
+                current[key] = value
+            elif current is not None and stripped != "" and key == "Notes":
+                current[key] += " " + stripped # Notes continued on the next line
+    return runs
+
+# Parse runs.txt into {(mode, run_id): {"date": ..., "temperature": ..., "notes": ...}}
+def parseRunsTxt(path=RUNS_TXT_PATH):
+    runs = {}
+    for run, raw in readRunsTxt(path).items():
+        info = {}
+        if "Temperature" in raw:
+            info["temperature"] = float(raw["Temperature"].split()[0])
+        if raw.get("Date", "?") != "?":
+            info["date"] = raw["Date"]
+        if "Notes" in raw:
+            info["notes"] = raw["Notes"]
+        runs[run] = info
+    return runs
+
+# Resumed and merged runs (3.1, 3-merged) are described by the original run in runs.txt
+def isResumedRun(run_id):
+    return "." in run_id.split("-")[0]
+
+def isMergedRun(run_id):
+    return "-" in run_id
+
+# The run id in runs.txt that describes a run: its own, or the one of the original run for resumed and
+# merged runs. None if runs.txt does not have the run
+def runsTxtRunId(runs_txt, mode, run_id):
+    for candidate in [run_id, run_id.split("-")[0], run_id.split("-")[0].split(".")[0]]:
+        if (mode, candidate) in runs_txt:
+            return candidate
+    return None
+
+# Look up the runs.txt info of a run. Resumed and merged runs get the info of the original run, but a
+# resumed run not its date: it started later, on a day that runs.txt does not tell
+def runsTxtInfo(runs_txt, mode, run_id):
+    original = runsTxtRunId(runs_txt, mode, run_id)
+    if original is None:
+        return {}
+    info = runs_txt[(mode, original)]
+    if original != run_id and isResumedRun(run_id) and not isResumedRun(original):
+        info = {k: v for k, v in info.items() if k != "date"}
+    return info
+
+# Number of columns, sample count and time range of a run file
+def fileSummary(path, mode):
+    if path.endswith(SAMPLE_LOG_EXTENSION):
+        data, metadata = mapSampleLog(path)
+        columns = data.shape[1]
+        t_array = data[:, 0]
+    elif path.endswith(ARCHIVE_EXTENSION):
+        archive = RunArchive(path) # The summary is in the header, no need to decompress
+        t = archive.entries[archive.columns[0]]
+        return {"columns": len(archive.columns), "sample_count": t["count"], "t_start": t.get("first"), "t_end": t.get("last")}
+    else:
+        columns = NPY_COLUMNS[mode]
+        with open(path, "rb") as f:
+            t_array = np.load(f)
+    if len(t_array) == 0:
+        return {"columns": columns, "sample_count": 0, "t_start": None, "t_end": None}
+    return {"columns": columns, "sample_count": int(len(t_array)), "t_start": float(t_array[0]), "t_end": float(t_array[-1])}
+
+# Hold the lock file of the catalog at path. Works across processes and on Windows (no fcntl)
+@contextmanager
+def catalogLock(path, timeout=LOCK_TIMEOUT, stale=LOCK_STALE):
+    lock_path = path + ".lock"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale:
+                    os.remove(lock_path) # Left behind by a crashed process
+                    continue
+            except OSError:
+                continue # Released in the meantime
+            if time.monotonic() > deadline:
+                raise Exception(f"Could not lock the run catalog, {lock_path} is held by another process. Remove it if no other process is running")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock_path)
+
+def loadRuns(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["runs"]
+
+class RunCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.runs = loadRuns(path) # file path -> entry
+        self.changed = set() # Paths updated or removed through this object, written by save()
+        self.buildIndex()
+
+    def buildIndex(self):
+        self.index = {}
+        for key, entry in self.runs.items():
+            self.addToIndex(key, entry)
+
+    def addToIndex(self, key, entry):
+        for field in INDEXED_FIELDS:
+            if entry.get(field) is not None:
+                self.index.setdefault((field, entry[field]), set()).add(key)
+
+    def removeFromIndex(self, key, entry):
+        for field in INDEXED_FIELDS:
+            if entry.get(field) is not None:
+                self.index.get((field, entry[field]), set()).discard(key)
+
+    # Add or update the entry of the run stored in `path` with the given fields
+    def update(self, path, **fields):
+        entry = self.runs.get(path, {"path": path})
+        self.removeFromIndex(path, entry)
+        entry.update(fields)
+        self.runs[path] = entry
+        self.addToIndex(path, entry)
+        self.changed.add(path)
+        return entry
+
+    def remove(self, path):
+        if path in self.runs:
+            self.removeFromIndex(path, self.runs.pop(path))
+            self.changed.add(path)
+
+    # Find runs by field values, e.g. find(mode="discharging", cw_power=24, temperature=-50).
+    # Uses the index for indexed fields. Returns entries sorted by run id
+    def find(self, **criteria):
+        keys = None
+        for field, value in criteria.items():
+            if field in INDEXED_FIELDS:
+                matching = self.index.get((field, value), set())
+                keys = matching if keys is None else keys & matching
+        if keys is None:
+            keys = self.runs.keys()
+        entries = [self.runs[k] for k in keys]
+        entries = [e for e in entries if all(e.get(field) == value for field, value in criteria.items() if field not in INDEXED_FIELDS)]
+        return sorted(entries, key=lambda e: (e["mode"], e["run_id"]))
+
+    # The run with the given mode and id (None if it is not in the catalog).
+    # A sample log is preferred over a run archive, and a run archive over an .npy file
+    def get(self, mode, run_id):
+        entries = self.find(mode=mode, run_id=run_id)
+        entries.sort(key=lambda e: (not e["path"].endswith(SAMPLE_LOG_EXTENSION), not e["path"].endswith(ARCHIVE_EXTENSION)))
+        return entries[0] if entries else None
+
+    # Like find, but one entry per run: a run converted to an archive (ArchiveConverter.py) has an entry
+    # per file, of which the one that get prefers is returned
+    def findRuns(self, **criteria):
+        return [self.get(mode, run_id) for mode, run_id in dict.fromkeys((e["mode"], e["run_id"]) for e in self.find(**criteria))]
+
+    # Write the changes to the catalog on disk, under the lock and atomically, so a crash never
+    # leaves a half written catalog and the changes of other processes are kept
+    def save(self):
+        import tempfile # Only loaded when saving, the commands that only read the catalog dont pay for it
+        with catalogLock(self.path):
+            runs = loadRuns(self.path)
+            for path in self.changed:
+                if path in self.runs:
+                    runs[path] = self.runs[path]
+                else:
+                    runs.pop(path, None)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"runs": runs}, f, indent=4, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        self.runs = runs
+        self.changed = set()
+        self.buildIndex()
+
+    # Add all run files in the data directories that are not in the catalog yet (or all if rescan is True)
+    def scan(self, rescan=False, runs_txt_path=RUNS_TXT_PATH):
+        runs_txt = parseRunsTxt(runs_txt_path)
+        added = 0
+        for mode, directory in DATA_DIRECTORIES.items():
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                path = f"{directory}/{filename}"
+                if path in self.runs and not rescan:
+                    continue
+                entry = parseRunFilename(filename)
+                if entry is None:
+                    continue
+                entry.update(runsTxtInfo(runs_txt, entry["mode"], entry["run_id"]))
+                entry.update(loadCatalogFields(path))
+                entry.update(fileSummary(path, entry["mode"]))
+                self.update(path, **entry)
+                added += 1
+        return added
+
+# Update the catalog entry of a run that is being written. Used by the collectors, also several at once
+def updateCatalog(path, catalog_path=CATALOG_PATH, **fields):
+    catalog = RunCatalog(catalog_path)
+    catalog.update(path, **fields)
+    catalog.save()
+
+def main():
+    catalog = RunCatalog()
+    added = catalog.scan(rescan=True)
+    catalog.save()
+    print(f"Catalog {CATALOG_PATH}: {len(catalog.runs)} runs ({added} scanned)")
+    for entry in catalog.find():
+        if entry["mode"] == "discharging":
+            setpoints = f"{entry['cw_power']} W"
+        elif entry["mode"] == "charging":
+            setpoints = f"{entry['cc_current']} A, {entry['cc_voltage']} V"
+        else:
+            setpoints = "-"
+        print(f"\t{entry['mode']:<12} RUN_ID {entry['run_id']:<10} {setpoints:<16} {entry.get('temperature')} C, {entry['sample_count']} samples")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# RunCheckpoint.py
+# DATE: 18/10 2026
+
+# Checkpointed state of a running measurement, so that a run can be resumed after a reboot or a
+# lost serial link instead of being started over (and stitched together with the merger later).
+#
+# The checkpoint is a small JSON file next to the sample log, rewritten atomically every time the
+# sample log is synced to disk. It holds the elapsed time, the charge and energy delivered so far,
+# the write position (samples in the log) and the setpoints. On resume, the collector reopens the
+# same sample log, restores the setpoints and continues the time where the run left off.
+
+import json
+import os
+import time
+import numpy as np
+from SampleLog import loadSampleLog, readHeader
+
+CHECKPOINT_SUFFIX = "_checkpoint.json"
+
+def checkpointPath(run_file):
+    return os.path.splitext(run_file)[0] + CHECKPOINT_SUFFIX
+
+class RunState:
+    def __init__(self, setpoints, measuring_interval):
+        self.setpoints = dict(setpoints)
+        self.measuring_interval = measuring_interval
+        self.elapsed = 0.0 # Time of the last sample, in s on the run timebase
+        self.charge = 0.0 # Ah delivered so far
+        self.energy = 0.0 # Wh delivered so far
+        self.sample_count = 0 # Samples in the sample log (the write position)
+        self.t_offset = 0.0 # Added to the scheduler time, so that the time continues over resumes
+        self.resumes = [] # One entry per resume: sample index, time offset and wall clock time
+        self.finished = False
+        self.last = None # (t, current, power) of the last sample
+
+    # Add a sample. O(1), trapezoidal integration of current and power
+    def update(self, t, current, power):
+        if self.last is not None:
+            t_last, current_last, power_last = self.last
+            dt = t - t_last
+            self.charge += (current + current_last) / 2 * dt / 3600
+            self.energy += (power + power_last) / 2 * dt / 3600
+        self.last = (t, current, power)
+        self.elapsed = t
+        self.sample_count += 1
+
+    def toDict(self):
+        return {
+            "setpoints": self.setpoints, "measuring_interval": self.measuring_interval, "elapsed": self.elapsed,
+            "charge": self.charge, "energy": self.energy, "sample_count": self.sample_count, "t_offset": self.t_offset,
+            "resumes": self.resumes, "finished": self.finished, "last": self.last, "saved_at": time.time(),
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        state = cls(d["setpoints"], d["measuring_interval"])
+        for field in ["elapsed", "charge", "energy", "sample_count", "t_offset", "resumes", "finished"]:
+            setattr(state, field, d[field])
+        state.last = tuple(d["last"]) if d["last"] is not None else None
+        return state
+
+    # Write the checkpoint atomically, so a crash never leaves a half written checkpoint
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.toDict(), f, indent=4)
+        os.replace(tmp_path, path)
+
+def loadCheckpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return RunState.fromDict(json.load(f))
+
+# The state at the start of a run, from the setpoints in the header of its sample log. Used when a
+# run stopped before its first checkpoint was written
+def stateFromSampleLog(run_file):
+    with open(run_file, "rb") as f:
+        _, _, metadata = readHeader(f)
+    setpoints = {k: v for k, v in metadata.items() if k not in ["columns", "run_metadata"]}
+    if "measuring_interval" not in setpoints:
+        raise Exception(f"The header of {run_file} has no measuring interval, so the run can not be resumed")
+    return RunState(setpoints, setpoints["measuring_interval"])
+
+# Load the state of an interrupted run and the samples it has so far. The sample log may have a few
+# samples more than the checkpoint (synced after the last checkpoint), they are added to the state.
+# Without a checkpoint the state is rebuilt from the whole sample log.
+# power_of maps the columns of a sample to (current, power). Returns (state, column arrays)
+def resumeRun(run_file, power_of):
+    state = loadCheckpoint(checkpointPath(run_file))
+    if state is None:
+        if not os.path.exists(run_file):
+            raise Exception(f"There is no checkpoint and no sample log for {run_file}, so the run can not be resumed")
+        print(f"There is no checkpoint for {run_file}. Rebuilding the state from the sample log...")
+        state = stateFromSampleLog(run_file)
+    if state.finished:
+        raise Exception(f"Run {run_file} is already finished")
+    # Copy the samples out of the memory map: the sample log writer truncates a partial record at the
+    # end of the same file when it reopens it, and a mapped file can not be truncated on Windows
+    arrays = tuple(np.array(column) for column in loadSampleLog(run_file))
+    count = len(arrays[0])
+    if count < state.sample_count:
+        raise Exception(f"Sample log {run_file} has {count} samples, but the checkpoint has {state.sample_count}")
+    for k in range(state.sample_count, count):
+        state.update(arrays[0][k], *power_of(*(a[k] for a in arrays[1:])))
+
+    # Continue one interval after the last sample, so the time does not restart at zero
+    state.t_offset = (state.elapsed + state.measuring_interval) if count > 0 else 0.0
+    state.resumes.append({"sample": count, "t_offset": state.t_offset, "wall_clock": time.time()})
+    return state, arrays
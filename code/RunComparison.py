@@ -0,0 +1,208 @@
+# RunComparison.py
+# DATE: 18/10 2026
+
+# Compares runs with each other in one figure: the runs overlaid on a shared x axis, and below that
+# the difference of every run to the first (reference) run. The shared axis is either
+#   - "time": the time since the start of the run, on a fixed grid of TIME_STEP s, or
+#   - "soc": the normalized state of charge, 0 (empty) to 1 (full), from the charge integrated over
+#     the run divided by the total charge of the run. This lines up runs of different power or
+#     temperature, where the time axis only shows that they lasted for different lengths of time.
+#
+# Every run is resampled onto its grid once with np.interp (linear interpolation of the whole column
+# at once) and the result is cached in data/comparison_cache, keyed by the run file (path, size and
+# modification time), the axis and the grid. A repeated comparison, or a new comparison with runs
+# that were compared before, only loads the cached arrays. Run files are opened (memory mapped) only
+# on a cache miss.
+#
+# The runs of a comparison are given as (mode, run_id) pairs, or as catalog criteria, e.g.
+# {"mode": "discharging", "cw_power": 24}.
+
+import hashlib
+import os
+import numpy as np
+from RunCatalog import RunCatalog
+from RunData import Run
+from RunAnalysis import cumulativeTrapezoid
+
+# Parameters
+CACHE_DIRECTORY = "data/comparison_cache"
+OUTPUT_DIRECTORY = "data/comparison"
+TIME_STEP = 60 # Grid step of the time axis in s
+SOC_POINTS = 1001 # Amount of grid points of the state of charge axis
+FIGSIZE = (6, 6)
+DPI = 300
+
+COMPARISONS = [
+    {"name": "discharge_24W_temperature", "runs": [("discharging", "7"), ("discharging", "5"), ("discharging", "6")], "axis": "time", "quantity": "U"},
+    {"name": "discharge_power_voltage", "runs": [("discharging", "7"), ("discharging", "3-merged"), ("discharging", "2-merged")], "axis": "soc", "quantity": "U"},
+    {"name": "charge_current", "criteria": {"mode": "charging"}, "axis": "time", "quantity": "I"},
+]
+
+QUANTITIES = {"I": ("Current", "A"), "U": ("Voltage", "V"), "P": ("Power", "W")}
+AXIS_LABELS = {"time": "Time (h)", "soc": "State of charge (-)"}
+
+def timeGrid(t_end, step=TIME_STEP):
+    return np.arange(0, t_end + step / 2, step)
+
+def socGrid(points=SOC_POINTS):
+    return np.linspace(0, 1, points)
+
+# A run of a comparison. The columns are only memory mapped when they are needed (on a cache miss)
+class ComparedRun:
+    def __init__(self, entry):
+        self.entry = entry
+        self.mode = entry["mode"]
+        self.run_id = entry["run_id"]
+        self.path = entry["path"]
+        self._columns = None
+
+    @property
+    def label(self):
+        setpoint = f"{self.entry['cw_power']:g} W" if "cw_power" in self.entry else f"{self.entry.get('cc_voltage', '?')} V"
+        temperature = f", {self.entry['temperature']:g} C" if self.entry.get("temperature") is not None else ""
+        return f"{self.mode} {self.run_id} ({setpoint}{temperature})"
+
+    # {"t", "I", "U", "P"} column arrays. Charging runs have no power column, it is calculated
+    def columns(self):
+        if self._columns is None:
+            run = Run(self.path, entry=self.entry)
+            t, I, U = run.arrays("t", "I", "U")
+            P = run["P"] if "P" in run.columns else I * U
+            self._columns = {"t": t, "I": I, "U": U, "P": P}
+        return self._columns
+
+    # Key of the resampled arrays in the cache. The file is not read, only its size and modification time
+    def cacheKey(self, axis):
+        stat = os.stat(self.path)
+        grid = TIME_STEP if axis == "time" else SOC_POINTS
+        key = f"{os.path.abspath(self.path)}|{stat.st_size}|{stat.st_mtime_ns}|{axis}|{grid}"
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    # Resample all quantities onto the grid of the axis. Returns {quantity: array}, and "x" for the grid
+    def resample(self, axis):
+        c = self.columns()
+        t = np.asarray(c["t"], dtype=np.float64)
+        if axis == "time":
+            x = timeGrid(t[-1]) if len(t) > 0 else timeGrid(0)
+            xp = t
+        elif axis == "soc":
+            x = socGrid()
+            charge = cumulativeTrapezoid(np.abs(np.asarray(c["I"], dtype=np.float64)), t)
+            total = charge[-1] if len(charge) > 0 else 0.0
+            if total <= 0:
+                return {"x": x, **{q: np.full(len(x), np.nan) for q in QUANTITIES}}
+            fraction = charge / total
+            # The state of charge falls during a discharge and rises during a charge. np.interp needs it increasing
+            if self.mode == "discharging":
+                xp = (1 - fraction)[::-1]
+                c = {q: np.asarray(c[q])[::-1] for q in QUANTITIES}
+            else:
+                xp = fraction
+        else:
+            raise Exception(f"Unknown comparison axis '{axis}'. Known axes: time, soc")
+        resampled = {"x": x}
+        for q in QUANTITIES:
+            resampled[q] = np.interp(x, xp, c[q], left=np.nan, right=np.nan) if len(xp) > 1 else np.full(len(x), np.nan)
+        return resampled
+
+# Resampled arrays of runs, in memory and in CACHE_DIRECTORY
+class ResampleCache:
+    def __init__(self, directory=CACHE_DIRECTORY):
+        self.directory = directory
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, run, axis):
+        key = run.cacheKey(axis)
+        if key in self.memory:
+            self.hits += 1
+            return self.memory[key]
+        path = f"{self.directory}/{key}.npz"
+        if os.path.exists(path):
+            with np.load(path) as f:
+                resampled = {name: f[name] for name in f.files}
+            self.hits += 1
+        else:
+            resampled = run.resample(axis)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, **resampled)
+            os.replace(tmp_path, path)
+            self.misses += 1
+        self.memory[key] = resampled
+        return resampled
+
+# The catalog entries of a comparison, as ComparedRuns
+def selectRuns(comparison, catalog):
+    if "runs" in comparison:
+        runs = []
+        for mode, run_id in comparison["runs"]:
+            entry = catalog.get(mode, run_id)
+            if entry is None:
+                raise Exception(f"Run {mode} {run_id} is not in the run catalog")
+            runs.append(ComparedRun(entry))
+        return runs
+    return [ComparedRun(entry) for entry in catalog.findRuns(**comparison.get("criteria", {}))]
+
+# Resample the runs onto one shared axis. Returns the grid and a (runs, grid points) array per quantity.
+# On the time axis, runs that ended earlier are padded with NaN
+def alignRuns(runs, axis, cache):
+    resampled = [cache.get(run, axis) for run in runs]
+    x = max((r["x"] for r in resampled), key=len)
+    aligned = {}
+    for q in QUANTITIES:
+        aligned[q] = np.full((len(runs), len(x)), np.nan)
+        for k, r in enumerate(resampled):
+            aligned[q][k, :len(r[q])] = r[q]
+    return x, aligned
+
+# Overlay of all runs and their difference to the first run, in one figure
+def plotComparison(name, runs, x, values, axis, quantity, path=OUTPUT_DIRECTORY):
+    from matplotlib import pyplot as plt
+    os.makedirs(path, exist_ok=True)
+    title, unit = QUANTITIES[quantity]
+    x_plot = x / 3600 if axis == "time" else x
+    fig, (ax_overlay, ax_difference) = plt.subplots(2, 1, sharex=True, figsize=FIGSIZE)
+    difference = values - values[0] # Broadcast over all runs at once
+    for k, run in enumerate(runs):
+        ax_overlay.plot(x_plot, values[k], label=run.label)
+        if k > 0:
+            ax_difference.plot(x_plot, difference[k], color=f"C{k}")
+    ax_overlay.set_ylabel(f"{title} ({unit})")
+    ax_overlay.set_title(f"{title} - {name}")
+    ax_overlay.legend(fontsize="small")
+    ax_overlay.grid(True, "both")
+    ax_difference.set_ylabel(f"Difference to {runs[0].run_id} ({unit})")
+    ax_difference.set_xlabel(AXIS_LABELS[axis])
+    ax_difference.grid(True, "both")
+    if axis == "soc":
+        ax_difference.invert_xaxis() # Full to the left, like the time axis of a discharge
+    fig.tight_layout()
+    filename = f"{path}/{name}_{quantity}_{axis}.png"
+    fig.savefig(filename, dpi=DPI)
+    plt.close(fig)
+    return filename
+
+def compare(comparison, catalog, cache):
+    runs = selectRuns(comparison, catalog)
+    if len(runs) == 0:
+        raise Exception(f"Comparison {comparison['name']} has no runs")
+    axis = comparison.get("axis", "time")
+    quantity = comparison.get("quantity", "U")
+    x, aligned = alignRuns(runs, axis, cache)
+    return plotComparison(comparison["name"], runs, x, aligned[quantity], axis, quantity)
+
+def main():
+    import matplotlib
+    matplotlib.use("Agg")
+
+    catalog = RunCatalog()
+    cache = ResampleCache()
+    for comparison in COMPARISONS:
+        filename = compare(comparison, catalog, cache)
+        print(f"Saved {filename}")
+    print(f"Resampled runs: {cache.misses} computed, {cache.hits} from the cache")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# RunData.py
+# DATE: 18/10 2026
+
+# The data of one run, with named columns, for all run file formats (sample log, run archive and
+# the older .npy files), so the scripts dont have to know the column order (t, I, U[, P]) or the format.
+#
+# Nothing is read when a Run is created. A column is memory mapped the first time it is used, so
+# only the pages that are actually touched are read from disk, and opening the whole catalog to pick
+# a few runs is cheap. Run archives are compressed and can not be memory mapped, only the columns
+# that are used are decompressed. Usage:
+#
+#   run = openRun("discharging", "7")
+#   run["U"]                          # Voltage column
+#   run.between(3600, 7200)["I"]      # Current between 1 h and 2 h
+#   run.summary()                     # Length, time range and min/max per column, cached
+
+import os
+import numpy as np
+from SampleLog import SAMPLE_LOG_EXTENSION, readHeader, mapSampleLog, mapNpyColumns, CHARGE_COLUMNS, DISCHARGE_COLUMNS
+from RunArchive import ARCHIVE_EXTENSION, RunArchive
+from RunCatalog import RunCatalog, parseRunFilename
+
+COLUMNS = {"charging": CHARGE_COLUMNS, "discharging": DISCHARGE_COLUMNS}
+
+class Run:
+    # mode is taken from the catalog entry or the filename if it is not given
+    def __init__(self, path, mode=None, entry=None):
+        self.path = path
+        self.entry = dict(entry or {})
+        if mode is None:
+            mode = self.entry.get("mode") or (parseRunFilename(os.path.basename(path)) or {}).get("mode")
+        self.mode = mode
+        self.start = 0 # Index range of the samples of this run (or slice of a run)
+        self.stop = None
+        self._summary = None
+        self._source = {} # Mapped columns, shared with the slices of the run
+
+    def __repr__(self):
+        return f"Run({self.path!r}, samples {self.start}:{self.stop if self.stop is not None else ''})"
+
+    @property
+    def run_id(self):
+        return self.entry.get("run_id")
+
+    # Column names, in file order. Only the header is read
+    @property
+    def columns(self):
+        if "columns" not in self._source:
+            if self.path.endswith(SAMPLE_LOG_EXTENSION):
+                with open(self.path, "rb") as f:
+                    ncols, header_size, metadata = readHeader(f)
+                self._source["metadata"] = metadata
+                self._source["columns"] = metadata.get("columns", COLUMNS[self.mode][:ncols])
+            elif self.path.endswith(ARCHIVE_EXTENSION):
+                self._source["archive"] = RunArchive(self.path)
+                self._source["metadata"] = self._source["archive"].metadata
+                self._source["columns"] = self._source["archive"].columns
+            else:
+                if self.mode not in COLUMNS:
+                    raise Exception(f"The columns of {self.path} are unknown, give the mode of the run")
+                self._source["metadata"] = {}
+                self._source["columns"] = COLUMNS[self.mode]
+        return self._source["columns"]
+
+    # The catalog entry together with the metadata in the file header
+    @property
+    def metadata(self):
+        self.columns
+        return {**self.entry, **self._source["metadata"]}
+
+    # The whole column, memory mapped (or decompressed for run archives). Cached
+    def fullColumn(self, name):
+        if name not in self.columns:
+            raise Exception(f"Run {self.path} has no column '{name}'. Columns: {', '.join(self.columns)}")
+        mapped = self._source.setdefault("mapped", {})
+        if name not in mapped:
+            if self.path.endswith(SAMPLE_LOG_EXTENSION):
+                data, metadata = mapSampleLog(self.path)
+                mapped.update({column: data[:, k] for k, column in enumerate(self.columns)})
+            elif self.path.endswith(ARCHIVE_EXTENSION):
+                mapped[name] = self._source["archive"].column(name)
+            else:
+                mapped.update(zip(self.columns, mapNpyColumns(self.path, len(self.columns))))
+        return mapped[name]
+
+    def column(self, name):
+        return self.fullColumn(name)[self.start:self.stop]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    # Columns as a tuple, by default all of them in file order
+    def arrays(self, *names):
+        return tuple(self.column(name) for name in (names or self.columns))
+
+    def __len__(self):
+        if self.stop is not None:
+            return self.stop - self.start
+        return len(self.fullColumn("t")) - self.start
+
+    # The samples with t_start <= t <= t_end, as a Run that shares the mapped columns. None is open ended
+    def between(self, t_start=None, t_end=None):
+        t = self.column("t")
+        first = np.searchsorted(t, t_start, side="left") if t_start is not None else 0
+        last = np.searchsorted(t, t_end, side="right") if t_end is not None else len(t)
+        part = Run(self.path, self.mode, self.entry)
+        part._source = self._source
+        part.start = self.start + int(first)
+        part.stop = self.start + int(max(first, last))
+        return part
+
+    # Length, time range and min/max of every column. Computed once. For a whole run archive it
+    # comes from the header, without decompressing anything
+    def summary(self):
+        if self._summary is None:
+            if self.path.endswith(ARCHIVE_EXTENSION) and self.start == 0 and self.stop is None:
+                self.columns
+                entries = self._source["archive"].entries
+                t = entries[self.columns[0]]
+                self._summary = {"length": t["count"], "t_start": t.get("first"), "t_end": t.get("last"),
+                    "columns": {name: {"min": entries[name].get("min"), "max": entries[name].get("max")} for name in self.columns}}
+            else:
+                length = len(self)
+                t = self.column("t")
+                self._summary = {"length": length, "t_start": float(t[0]) if length > 0 else None, "t_end": float(t[-1]) if length > 0 else None,
+                    "columns": {name: {"min": float(np.min(self.column(name))) if length > 0 else None,
+                        "max": float(np.max(self.column(name))) if length > 0 else None} for name in self.columns}}
+        return self._summary
+
+# The run with the given mode and id in the catalog. Nothing is read from the run file yet
+def openRun(mode, run_id, catalog=None):
+    if catalog is None:
+        catalog = RunCatalog()
+    entry = catalog.get(mode, run_id)
+    if entry is None:
+        raise Exception(f"{mode.capitalize()} run {run_id} is not in the run catalog")
+    return Run(entry["path"], entry=entry)
+
+# All runs in the catalog that match the criteria (see RunCatalog.find). Nothing is read from the run files yet
+def openRuns(catalog=None, **criteria):
+    if catalog is None:
+        catalog = RunCatalog()
+    return [Run(entry["path"], entry=entry) for entry in catalog.find(**criteria)]
@@ -0,0 +1,89 @@
+# RunMerger.py
+# DATE: 18/10 2026
+
+# Merges runs that were split over several files (e.g. run 3 + 3.1 after a restart) into one run.
+# The parts are memory mapped and copied to the output sample log in fixed size chunks, so memory
+# use does not depend on the length of the runs. The time of every part is offset by the last time
+# of the previous part, and the offsets, setpoints and part ids are kept in the output header.
+
+import os
+import numpy as np
+from RunCatalog import RunCatalog, fileSummary
+from SampleLog import SampleLogWriter, CHARGE_COLUMNS, DISCHARGE_COLUMNS
+from RunData import Run
+
+CHUNK_SIZE = 65536 # Samples per chunk
+
+COLUMNS = {"charging": CHARGE_COLUMNS, "discharging": DISCHARGE_COLUMNS}
+
+# Setpoints that must be the same in all parts
+SETPOINT_FIELDS = {"charging": ["cc_current", "cc_voltage"], "discharging": ["cw_power"]}
+
+def mergedFilename(mode, run_id, setpoints, measuring_time, measuring_interval):
+    if mode == "charging":
+        return f"data/charging/PowerSupplyData_RUN_ID-{run_id}_CURRENT-{setpoints['cc_current']:g}_VOLTAGE-{setpoints['cc_voltage']:g}_TIME-{measuring_time}_INTERVAL-{measuring_interval}.bin"
+    return f"data/discharging/DischargeData_RUN_ID-{run_id}_POWER-{setpoints['cw_power']:g}_TIME-{measuring_time}_INTERVAL-{measuring_interval}.bin"
+
+# Copy one part to the output in chunks, with time offset. Returns the last time written
+def copyPart(log, columns, offset, chunk_size=CHUNK_SIZE):
+    length = len(columns[0])
+    block = np.empty((chunk_size, len(columns)))
+    last_t = offset
+    for start in range(0, length, chunk_size):
+        end = min(start + chunk_size, length)
+        chunk = block[:end - start]
+        for i, column in enumerate(columns):
+            chunk[:, i] = column[start:end]
+        chunk[:, 0] += offset
+        log.appendArray(chunk)
+        last_t = chunk[-1, 0]
+    return last_t
+
+# Merge the runs with ids_to_merge (in that order) into a new run merge_to_id. Returns the path of the merged run
+def mergeRuns(mode, ids_to_merge, merge_to_id, catalog=None, chunk_size=CHUNK_SIZE):
+    if catalog is None:
+        catalog = RunCatalog()
+        catalog.scan() # Pick up runs that are not in the catalog yet
+
+    runs = []
+    for id in ids_to_merge:
+        run = catalog.get(mode, id)
+        if run is None:
+            raise Exception(f"{mode.capitalize()} run {id} is not in the run catalog")
+        runs.append(run)
+
+    setpoints = {field: runs[0][field] for field in SETPOINT_FIELDS[mode]}
+    for run in runs: # Make sure the setpoints are the same for all runs
+        for field, value in setpoints.items():
+            if run[field] != value:
+                raise Exception(f"Run {run['run_id']} has {field} {run[field]}, expected {value} as in run {runs[0]['run_id']}")
+
+    measuring_time_total = sum(run["measuring_time"] for run in runs)
+    measuring_interval = runs[0]["measuring_interval"] # Take first measuring interval as the measuring interval
+    merged_path = mergedFilename(mode, merge_to_id, setpoints, measuring_time_total, measuring_interval)
+
+    # Time offset of every part: the first part is not offset, the others by the last time of the previous part
+    offsets = []
+    part_columns = []
+    last_t = 0.0
+    for run in runs:
+        columns = Run(run["path"], mode, run).arrays(*COLUMNS[mode])
+        offsets.append(last_t if offsets else 0.0)
+        part_columns.append(columns)
+        if len(columns[0]) > 0:
+            last_t = offsets[-1] + float(columns[0][-1])
+
+    metadata = dict(setpoints, merged_from=list(ids_to_merge), time_offsets=offsets, measuring_interval=measuring_interval)
+    if os.path.exists(merged_path):
+        os.remove(merged_path) # Start from an empty file, the writer would otherwise append to an old merge
+    with SampleLogWriter(merged_path, COLUMNS[mode], metadata=metadata, fsync_every=chunk_size) as log:
+        for columns, offset in zip(part_columns, offsets):
+            copyPart(log, columns, offset, chunk_size)
+
+    # Add the merged run to the catalog
+    merged_entry = {k: v for k, v in runs[0].items() if k not in ["path", "notes", "merged_from"]}
+    merged_entry.update(run_id=merge_to_id, measuring_time=measuring_time_total, merged_from=list(ids_to_merge))
+    merged_entry.update(fileSummary(merged_path, mode))
+    catalog.update(merged_path, **merged_entry)
+    catalog.save()
+    return merged_path
@@ -0,0 +1,112 @@
+# RunMetadata.py
+# DATE: 18/10 2026
+
+# Machine readable record of how a run was made, written by the collectors next to the run data as
+# <run name>_metadata.json, so that nothing has to be looked up in runs.txt or parsed from filenames.
+#
+#   start: wall clock start time, host, user, git revision of the code, instrument (*IDN? reply and
+#          port), the configured setpoints, the setpoints read back from the instrument, and the user
+#          fields of the collector (chamber temperature, notes, ...)
+#   end:   wall clock end time, why the run ended, samples, run time, charge and energy
+#   resumes: one entry per resume of the run, with the same fields as start
+#
+# The start record is also stored in the sample log header. The run catalog takes its temperature,
+# date and notes from this file (CATALOG_FIELDS). Runs from before this file existed get their record
+# from runs.txt with RunsTxtImporter.py.
+
+import datetime
+import json
+import os
+
+METADATA_SUFFIX = "_metadata.json"
+VERSION = 1
+
+# Fields of the record that are copied to the run catalog
+CATALOG_FIELDS = ["temperature", "date", "date_note", "notes", "started_at", "ended_at", "end_reason", "instrument_idn", "git_revision"]
+
+def metadataPath(run_file):
+    return os.path.splitext(run_file)[0] + METADATA_SUFFIX
+
+def wallClock():
+    return datetime.datetime.now().astimezone().isoformat(timespec="seconds")
+
+# Git revision of the code that is running, with "-dirty" if it has uncommitted changes. None outside a git repository
+def gitRevision():
+    import subprocess # Only needed by the collectors, not when the catalog reads the records
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=directory, capture_output=True, text=True, timeout=5)
+        if revision.returncode != 0:
+            return None
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revision.stdout.strip() + ("-dirty" if status.stdout.strip() else "")
+
+# Where and with what the run is made
+def environment():
+    import getpass, platform, socket
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = None
+    return {"host": socket.gethostname(), "user": user, "platform": platform.platform(), "python": platform.python_version(), "git_revision": gitRevision()}
+
+class RunMetadata:
+    def __init__(self, path):
+        self.path = path
+        self.record = {"version": VERSION, "start": None, "end": None, "resumes": []}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.record = json.load(f)
+
+    # Record the start (or a resume) of the run. readback: setpoints as reported by the instrument
+    def start(self, mode, setpoints, readback, instrument_idn, port, user_fields=None, resumed=False):
+        record = {
+            "mode": mode, "started_at": wallClock(), **environment(),
+            "instrument": {"idn": instrument_idn, "port": port},
+            "setpoints": dict(setpoints), "setpoints_readback": dict(readback), "user_fields": dict(user_fields or {}),
+        }
+        if resumed and self.record["start"] is not None:
+            self.record["resumes"].append(record)
+            self.record["end"] = None
+        else:
+            self.record["start"] = record
+        self.save()
+        return record
+
+    def end(self, end_reason, sample_count, t_end, charge=None, energy=None):
+        self.record["end"] = {
+            "ended_at": wallClock(), "end_reason": end_reason, "sample_count": sample_count, "t_end": t_end,
+            "charge": charge, "energy": energy,
+        }
+        self.save()
+
+    # The fields of the run catalog, flat
+    def catalogFields(self):
+        return catalogFields(self.record)
+
+    # Written atomically, so a crash never leaves a half written record
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.record, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+def catalogFields(record):
+    start = record.get("start") or {}
+    end = record.get("end") or {}
+    fields = {
+        "started_at": start.get("started_at"), "date": (start.get("started_at") or "")[:10] or None,
+        "instrument_idn": (start.get("instrument") or {}).get("idn"), "git_revision": start.get("git_revision"),
+        "ended_at": end.get("ended_at"), "end_reason": end.get("end_reason"),
+    }
+    fields.update(start.get("user_fields") or {})
+    return {k: v for k, v in fields.items() if k in CATALOG_FIELDS and v not in [None, ""]}
+
+# The catalog fields from the metadata file of a run, {} if it has none
+def loadCatalogFields(run_file):
+    path = metadataPath(run_file)
+    if not os.path.exists(path):
+        return {}
+    return RunMetadata(path).catalogFields()
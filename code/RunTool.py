@@ -0,0 +1,113 @@
+# RunTool.py
+# DATE: 18/10 2026
+
+# One command line tool for the scripts, with a subcommand per task:
+#   python RunTool.py collect discharging [--simulate] [--resume]   Run a collector with the parameters in its file
+#   python RunTool.py merge discharging 3 3.1 --to 3-merged         Merge runs (see RunMerger.py)
+#   python RunTool.py plot [discharging 7] [--force]                Plot one run, or all runs that are out of date (BatchPlotter.py)
+#   python RunTool.py analyze [discharging 7]                       Analyze one run, or all runs into data/analysis.json (RunAnalysis.py)
+#
+# Only argparse is imported at startup. The modules of a subcommand are imported when it runs
+# (loadCommand), and matplotlib and wakepy only when something is plotted or collected, so merging
+# and analyzing do not pay for them. The optional features of the collectors (telemetry, adaptive
+# sampling) import their modules only when they are turned on. StartupBenchmark.py measures the
+# startup time of every subcommand.
+#
+# Paths such as data/catalog.json are relative to this directory, like when running the scripts directly.
+
+import argparse
+import importlib
+import os
+
+MODES = ["discharging", "charging"]
+
+# Modules of every subcommand, per mode
+COMMAND_MODULES = {
+    "collect": {"discharging": ["DischargeDataCollector"], "charging": ["PowerSupplyDataCollector"]},
+    "merge": {"discharging": ["RunMerger"], "charging": ["RunMerger"]},
+    "plot": {"discharging": ["RunCatalog", "DischargeDataPlotter"], "charging": ["RunCatalog", "PowerSupplyDataPlotter"], None: ["BatchPlotter"]},
+    "analyze": {"discharging": ["RunCatalog", "RunAnalysis"], "charging": ["RunCatalog", "RunAnalysis"], None: ["RunAnalysis"]},
+}
+
+# Import the modules of a subcommand. mode is None for the subcommands that work on all runs
+def loadCommand(command, mode=None):
+    return [importlib.import_module(name) for name in COMMAND_MODULES[command][mode]]
+
+def collect(args):
+    [collector] = loadCommand("collect", args.mode)
+    collector.SIMULATE = collector.SIMULATE or args.simulate
+    collector.RESUME = collector.RESUME or args.resume
+    collector.main()
+
+def merge(args):
+    [merger] = loadCommand("merge", args.mode)
+    merged_path = merger.mergeRuns(args.mode, args.run_ids, args.to)
+    print(f"Merged into {merged_path}")
+
+def runEntry(catalog, mode, run_id):
+    entry = catalog.get(mode, run_id)
+    if entry is None:
+        raise Exception(f"{mode.capitalize()} run {run_id} is not in the run catalog")
+    return entry
+
+def plot(args):
+    if args.mode is None:
+        [batch_plotter] = loadCommand("plot")
+        batch_plotter.FORCE_REPLOT = batch_plotter.FORCE_REPLOT or args.force
+        batch_plotter.main()
+        return
+    run_catalog, plotter = loadCommand("plot", args.mode)
+    entry = runEntry(run_catalog.RunCatalog(), args.mode, args.run_id)
+    name = os.path.splitext(os.path.basename(entry["path"]))[0]
+    path = plotter.plotPath(args.run_id)
+    plotter.plotRun(entry["path"], path, name)
+    print(f"Plotted {name} into {path}")
+
+def analyze(args):
+    if args.mode is None:
+        [run_analysis] = loadCommand("analyze")
+        run_analysis.main()
+        return
+    run_catalog, run_analysis = loadCommand("analyze", args.mode)
+    summary = run_analysis.analyzeRun(runEntry(run_catalog.RunCatalog(), args.mode, args.run_id))
+    for key, value in summary.items():
+        print(f"\t{key:<20} {value if value is not None else '-'}")
+
+def parser():
+    parser = argparse.ArgumentParser(prog="RunTool.py", description="Collect, merge, plot and analyze battery runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("collect", help="run a collector with the parameters in its file")
+    p.add_argument("mode", choices=MODES)
+    p.add_argument("--simulate", action="store_true", help="use a simulated instrument (see SimulatedInstruments.py)")
+    p.add_argument("--resume", action="store_true", help="continue the interrupted run from its checkpoint")
+    p.set_defaults(run=collect)
+
+    p = commands.add_parser("merge", help="merge runs into one run")
+    p.add_argument("mode", choices=MODES)
+    p.add_argument("run_ids", nargs="+", help="runs to merge, in order")
+    p.add_argument("--to", required=True, help="run id of the merged run (dont use _ in it)")
+    p.set_defaults(run=merge)
+
+    p = commands.add_parser("plot", help="plot one run, or all runs whose figures are out of date")
+    p.add_argument("mode", choices=MODES, nargs="?")
+    p.add_argument("run_id", nargs="?")
+    p.add_argument("--force", action="store_true", help="replot all runs, even if they are up to date")
+    p.set_defaults(run=plot)
+
+    p = commands.add_parser("analyze", help="analyze one run, or all runs into data/analysis.json")
+    p.add_argument("mode", choices=MODES, nargs="?")
+    p.add_argument("run_id", nargs="?")
+    p.set_defaults(run=analyze)
+    return parser
+
+def main(argv=None):
+    tool = parser()
+    args = tool.parse_args(argv)
+    if args.command in ["plot", "analyze"] and args.mode is not None and args.run_id is None:
+        tool.error(f"give the run id of the {args.mode} run to {args.command}")
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# RunsTxtImporter.py
+# DATE: 18/10 2026
+
+# One time import of runs.txt into run metadata files (see RunMetadata.py), for the runs that were
+# made before the collectors wrote their own. Every key of a run in runs.txt is parsed into a typed
+# field: temperature in C, the date as YYYY-MM-DD with the text in brackets as date_note, notes over
+# several lines and the formula of the CV voltage ("9*1.50 = 13.5 V"). The setpoints, measuring time
+# and interval are taken from the run file name (the run catalog entry), which has what the collector
+# actually ran with.
+#
+# A run in runs.txt also describes its resumed and merged runs (3 -> 3.1, 3-merged), as in the run
+# catalog, except for their date: a merged run starts on the date of the original run, the date a
+# resumed run started is not known.
+#
+# Runs that already have a metadata file are not touched, unless OVERWRITE is True. Runs in
+# runs.txt without a run file are listed at the end. The run catalog is updated with the new fields.
+
+import datetime
+import os
+import re
+from RunCatalog import RunCatalog, RUNS_TXT_PATH, readRunsTxt, runsTxtRunId, isResumedRun, isMergedRun
+from RunMetadata import RunMetadata, metadataPath, catalogFields, CATALOG_FIELDS
+
+# Parameters
+OVERWRITE = False # Flag to choose if existing metadata files are replaced
+
+SETPOINT_FIELDS = ["cw_power", "cc_current", "cc_voltage", "measuring_time", "measuring_interval"] # Setpoints in the run file name
+
+def parseNumber(value):
+    numbers = re.findall(r"-?\d+(?:\.\d+)?", value)
+    return float(numbers[-1]) if numbers else None
+
+# "16/5-2022 (after Discharging RUN_ID 4)" -> ("2022-05-16", "after Discharging RUN_ID 4"). "?" -> (None, None)
+def parseDate(value):
+    match = re.match(r"\s*(\d+)/(\d+)-(\d+)\s*(?:\((.*)\))?", value)
+    if match is None:
+        return None, None
+    day, month, year, note = match.groups()
+    return datetime.date(int(year), int(month), int(day)).isoformat(), note
+
+# Typed record fields of a run: (setpoints, user fields). entry is its catalog entry, raw the runs.txt
+# entry of original, the run id in runs.txt that describes it
+def convertRun(entry, raw, original):
+    setpoints = {field: float(entry[field]) for field in SETPOINT_FIELDS if field in entry}
+    if "=" in raw.get("CV max voltage", "") and parseNumber(raw["CV max voltage"]) == setpoints.get("cc_voltage"):
+        setpoints["cc_voltage_formula"] = raw["CV max voltage"].split("=")[0].strip()
+    user_fields = {}
+    if "Temperature" in raw:
+        user_fields["temperature"] = parseNumber(raw["Temperature"])
+    date, note = parseDate(raw.get("Date", ""))
+    if original != entry["run_id"] and isResumedRun(entry["run_id"]) and not isResumedRun(original):
+        date, note = None, f"resumed after RUN_ID {original}, the date it started is not known"
+    elif original != entry["run_id"] and isMergedRun(entry["run_id"]) and date is not None:
+        note = f"date of RUN_ID {original}, the first part of the merged run"
+    if date is not None:
+        user_fields["date"] = date
+    if note:
+        user_fields["date_note"] = note
+    if raw.get("Notes"):
+        user_fields["notes"] = raw["Notes"]
+    return setpoints, user_fields
+
+def importRunsTxt(catalog, path=RUNS_TXT_PATH, overwrite=OVERWRITE):
+    runs_txt = readRunsTxt(path)
+    imported = []
+    used = set()
+    for entry in catalog.find():
+        original = runsTxtRunId(runs_txt, entry["mode"], entry["run_id"])
+        if original is None:
+            continue
+        used.add((entry["mode"], original))
+        record_path = metadataPath(entry["path"])
+        if os.path.exists(record_path) and not overwrite:
+            continue
+        setpoints, user_fields = convertRun(entry, runs_txt[(entry["mode"], original)], original)
+        metadata = RunMetadata(record_path)
+        metadata.record = {"version": metadata.record["version"], "start": {
+            "mode": entry["mode"], "imported_from": os.path.basename(path), "started_at": None,
+            "instrument": None, "setpoints": setpoints, "setpoints_readback": None, "user_fields": user_fields,
+        }, "end": None, "resumes": []}
+        metadata.save()
+        # The entry is replaced, so fields of the original run that do not apply (a resumed run's date) are gone
+        fields = {k: v for k, v in entry.items() if k not in CATALOG_FIELDS and k != "path"}
+        fields.update(catalogFields(metadata.record))
+        catalog.remove(entry["path"])
+        catalog.update(entry["path"], **fields)
+        imported.append(entry)
+    return imported, [key for key in runs_txt if key not in used]
+
+def main():
+    catalog = RunCatalog()
+    imported, missing = importRunsTxt(catalog)
+    catalog.save()
+    print(f"Imported runs.txt into {len(imported)} run metadata files:")
+    for entry in imported:
+        print(f"\t{entry['mode']:<12} RUN_ID {entry['run_id']:<10} -> {metadataPath(entry['path'])}")
+    for mode, run_id in missing:
+        print(f"No run file for {mode} RUN_ID {run_id} in runs.txt")
+
+if __name__ == "__main__":
+    main()
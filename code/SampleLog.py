@@ -0,0 +1,175 @@
+# SampleLog.py
+# DATE: 18/10 2026
+
+# Append-only log of measurement samples. Replaces rewriting the whole .npy file on every tick,
+# which costs O(n) per sample and loses everything if the program dies in the middle of np.save.
+#
+# File layout:
+#   [fixed header: magic, version, number of columns, header size]
+#   [JSON metadata (column names, setpoints, ...), space padded so records are 8 byte aligned]
+#   [record 0: ncols * float64][record 1: ncols * float64]...
+#
+# Every record has the same size, so a crash can at most leave one partial record at the end of
+# the file. That tail is cut off when the log is reopened (or ignored when it is loaded).
+
+import json
+import os
+import struct
+import numpy as np
+from RunArchive import ARCHIVE_EXTENSION, loadArchive
+from Profiling import NULL_PROFILER
+
+MAGIC = b"BLOG"
+VERSION = 1
+FIXED_HEADER = struct.Struct("<4sHHI") # magic, version, number of columns, total header size
+RECORD_DTYPE = np.dtype("<f8")
+SAMPLE_LOG_EXTENSION = ".bin"
+
+DISCHARGE_COLUMNS = ["t", "I", "U", "P"]
+CHARGE_COLUMNS = ["t", "I", "U"]
+
+def buildHeader(columns, metadata=None):
+    meta = dict(metadata or {})
+    meta["columns"] = list(columns)
+    meta_bytes = json.dumps(meta).encode()
+    header_size = FIXED_HEADER.size + len(meta_bytes)
+    padding = (-header_size) % RECORD_DTYPE.itemsize
+    header_size += padding
+    return FIXED_HEADER.pack(MAGIC, VERSION, len(columns), header_size) + meta_bytes + b" " * padding
+
+# Read the header of an open log file. Returns (number of columns, header size, metadata)
+def readHeader(f):
+    fixed = f.read(FIXED_HEADER.size)
+    if len(fixed) < FIXED_HEADER.size:
+        raise Exception("Sample log header is truncated")
+    magic, version, ncols, header_size = FIXED_HEADER.unpack(fixed)
+    if magic != MAGIC:
+        raise Exception(f"Not a sample log (magic was {magic})")
+    if version != VERSION:
+        raise Exception(f"Unsupported sample log version {version}")
+    metadata = json.loads(f.read(header_size - FIXED_HEADER.size).decode())
+    return ncols, header_size, metadata
+
+class SampleLogWriter:
+    # Opens (or creates) a sample log for appending. If the file already exists, the columns must
+    # match and any partially written record at the end is truncated away.
+    def __init__(self, path, columns, metadata=None, fsync_every=10):
+        self.path = path
+        self.columns = list(columns)
+        self.record = struct.Struct(f"<{len(self.columns)}d")
+        self.fsync_every = fsync_every
+        self.unsynced = 0
+        self.profiler = NULL_PROFILER # Counts bytes written and fsyncs when profiling (see Profiling.py)
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                ncols, self.header_size, self.metadata = readHeader(f)
+            if self.metadata["columns"] != self.columns:
+                raise Exception(f"Columns of existing sample log {path} are {self.metadata['columns']}, expected {self.columns}")
+            self.f = open(path, "r+b")
+            self.count = recoverTail(self.f, self.header_size, self.record.size)
+        else:
+            header = buildHeader(self.columns, metadata)
+            self.header_size = len(header)
+            self.metadata = json.loads(header[FIXED_HEADER.size:].decode())
+            self.f = open(path, "wb")
+            self.f.write(header)
+            self.sync()
+            self.count = 0
+
+    def append(self, *values):
+        self.f.write(self.record.pack(*values))
+        self.profiler.count("bytes_written", self.record.size)
+        self.count += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+
+    # Append many samples at once from a (samples, columns) array
+    def appendArray(self, block):
+        block = np.ascontiguousarray(block, dtype=RECORD_DTYPE)
+        if block.ndim != 2 or block.shape[1] != len(self.columns):
+            raise Exception(f"Expected a (samples, {len(self.columns)}) array, got shape {block.shape}")
+        self.f.write(block.tobytes())
+        self.profiler.count("bytes_written", block.nbytes)
+        self.count += len(block)
+        self.unsynced += len(block)
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+
+    # Flush python and OS buffers so everything appended so far survives a crash
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.profiler.count("fsyncs")
+        self.unsynced = 0
+
+    def close(self):
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Cut off a partially written record at the end of the file. Returns the number of complete records
+def recoverTail(f, header_size, record_size):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    count = (size - header_size) // record_size
+    complete_size = header_size + count * record_size
+    if complete_size != size:
+        print(f"Sample log had a partial record at the end ({size - complete_size} bytes). Truncating.")
+        f.truncate(complete_size)
+        f.flush()
+        os.fsync(f.fileno())
+    f.seek(complete_size)
+    return count
+
+# Memory map a sample log. Returns a (samples, columns) array and the metadata.
+# A partial record at the end of the file is ignored, so this is safe while a collector is writing.
+def mapSampleLog(path):
+    with open(path, "rb") as f:
+        ncols, header_size, metadata = readHeader(f)
+    count = (os.path.getsize(path) - header_size) // (ncols * RECORD_DTYPE.itemsize)
+    if count == 0:
+        return np.zeros((0, ncols), dtype=RECORD_DTYPE), metadata
+    data = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=header_size, shape=(count, ncols))
+    return data, metadata
+
+# Load a sample log as separate column arrays, in the same order as the .npy files (t, I, U[, P])
+def loadSampleLog(path):
+    data, metadata = mapSampleLog(path)
+    return tuple(data[:, i] for i in range(data.shape[1]))
+
+# Load run data from a sample log, a run archive or the older format with np.save'd arrays after each other
+def loadRunArrays(path, number_of_columns):
+    if path.endswith(SAMPLE_LOG_EXTENSION):
+        return loadSampleLog(path)
+    if path.endswith(ARCHIVE_EXTENSION):
+        return loadArchive(path)
+    with open(path, "rb") as f:
+        return tuple(np.load(f) for _ in range(number_of_columns))
+
+# Memory map the arrays of an .npy file with several np.save'd arrays after each other (t, I, U[, P])
+def mapNpyColumns(path, number_of_columns):
+    columns = []
+    with open(path, "rb") as f:
+        for _ in range(number_of_columns):
+            version = np.lib.format.read_magic(f)
+            read_array_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_array_header(f)
+            offset = f.tell()
+            columns.append(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C"))
+            f.seek(offset + int(np.prod(shape)) * dtype.itemsize)
+    return columns
+
+# Pick the sample log for a run if it exists, then the run archive, otherwise the .npy file. path_stem is the filename without extension
+def findRunFile(path_stem):
+    for extension in [SAMPLE_LOG_EXTENSION, ARCHIVE_EXTENSION]:
+        if os.path.exists(path_stem + extension):
+            return path_stem + extension
+    return path_stem + ".npy"
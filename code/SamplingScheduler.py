@@ -0,0 +1,115 @@
+# SamplingScheduler.py
+# DATE: 18/10 2026
+
+# Drift-free sampling loop. Ticks fire at start + slot * interval on the monotonic clock, instead of
+# sleeping a fixed interval after the work (which makes the real period interval + work time).
+# If a tick runs so long that whole slots are missed, those slots are skipped and counted.
+# The interval can be changed between ticks (setInterval, for adaptive sampling): the next tick is
+# then a whole number of slots later, so the ticks stay on the same drift-free grid.
+#
+# Per tick, the nominal and actual sample times and the time spent in each phase (query, save, plot)
+# are recorded. They are appended to a sample log next to the run data, and latency statistics
+# (p50/p99 per phase, jitter, missed slots) are saved as JSON.
+
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from ColumnBuffer import ColumnBuffer
+from SampleLog import SampleLogWriter
+
+PHASES = ["query", "save", "plot"]
+MAX_PREALLOCATED_TICKS = 65536 # The timing buffer grows if there are more ticks
+TIMING_COLUMNS = ["slot", "t_nominal", "t_actual", "missed"] + PHASES
+
+class SamplingScheduler:
+    # interval and duration in s. timing_path is the sample log for the per tick timing (None to not save it)
+    def __init__(self, interval, duration, timing_path=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.duration = duration
+        self.clock = clock
+        self.sleep = sleep
+        self.timing = ColumnBuffer(TIMING_COLUMNS, capacity=min(int(duration // interval) + 1, MAX_PREALLOCATED_TICKS))
+        self.timing_log = SampleLogWriter(timing_path, TIMING_COLUMNS, metadata={"interval": interval}) if timing_path else None
+        self.current = None
+        self.missed_total = 0
+        self.step = 1 # Slots from one tick to the next
+
+    # Change the time to the next tick. Rounded to a whole number of slots (at least one)
+    def setInterval(self, interval):
+        self.step = max(1, round(interval / self.interval))
+
+    # Generator that yields (t_nominal, t_actual) for each tick, relative to the start, sleeping until the deadline
+    def ticks(self):
+        self.start = self.clock()
+        slot = 0
+        missed = 0
+        while slot * self.interval < self.duration:
+            deadline = self.start + slot * self.interval
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+                now = self.clock()
+            self.current = {"slot": slot, "t_nominal": slot * self.interval, "t_actual": now - self.start, "missed": missed}
+            for phase in PHASES:
+                self.current[phase] = 0.0
+            yield self.current["t_nominal"], self.current["t_actual"]
+            self.endTick()
+
+            # Skip the slots whose deadline has already passed by more than one interval
+            slot += self.step
+            late = self.clock() - (self.start + slot * self.interval)
+            missed = int(late // self.interval) if late > 0 else 0
+            if missed > 0:
+                print(f"Tick took too long, skipping {missed} sample slot(s)")
+                self.missed_total += missed
+                slot += missed
+
+    # Time a phase of the current tick: with scheduler.phase("query"): ...
+    @contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            if self.current is not None:
+                self.current[name] += self.clock() - start
+
+    def endTick(self):
+        if self.current is None:
+            return
+        values = [self.current[c] for c in TIMING_COLUMNS]
+        self.timing.append(*values)
+        if self.timing_log is not None:
+            self.timing_log.append(*values)
+        self.current = None
+
+    # Latency statistics over all ticks so far
+    def stats(self):
+        jitter = self.timing.column("t_actual") - self.timing.column("t_nominal")
+        result = {"ticks": len(self.timing), "interval": self.interval, "missed_slots": self.missed_total}
+        if len(self.timing) == 0:
+            return result
+        for name, values in [("jitter", jitter)] + [(phase, self.timing.column(phase)) for phase in PHASES]:
+            result[name] = {
+                "p50": float(np.percentile(values, 50)),
+                "p99": float(np.percentile(values, 99)),
+                "max": float(np.max(values)),
+            }
+        return result
+
+    def printStats(self):
+        s = self.stats()
+        if s["ticks"] == 0:
+            return
+        print(f"Timing: {s['ticks']} ticks, {s['missed_slots']} missed slots, jitter p50/p99: {s['jitter']['p50']*1000:.1f}/{s['jitter']['p99']*1000:.1f} ms")
+        print("\t" + ", ".join(f"{phase} p50/p99: {s[phase]['p50']*1000:.1f}/{s[phase]['p99']*1000:.1f} ms" for phase in PHASES))
+
+    def saveStats(self, path):
+        with open(path, "w") as f:
+            json.dump(self.stats(), f, indent=4)
+
+    def close(self):
+        self.endTick()
+        if self.timing_log is not None:
+            self.timing_log.close()
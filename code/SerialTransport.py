@@ -0,0 +1,204 @@
+# SerialTransport.py
+# DATE: 18/10 2026
+
+# Shared request/response layer for the instruments, used instead of calling ser.write and
+# ser.readline directly. One garbled reply or a short USB hiccup used to crash a multi-day run;
+# the transport instead:
+#   - frames requests and replies (one command per line, replies split into ;-separated fields)
+#   - retries a bounded number of times on timeouts (empty reply) and replies that dont parse, and
+#     discards whatever is left in the input buffer before every retry, so a late reply to the
+#     previous attempt is not taken as the reply to the next one
+#   - closes and reopens the port when it fails (e.g. the USB adapter was re-enumerated)
+#   - keeps, per command, a latency histogram and counters of timeouts, parse errors and port errors
+#
+# The statistics are saved next to the run data (saveStats), so the polling rate can be tuned
+# against what the link actually handles.
+
+import json
+import re
+import time
+from Profiling import NULL_PROFILER
+
+# Upper edges of the latency histogram bins in ms. The last bin is everything above
+LATENCY_BINS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+
+# Raised when a request still fails after all retries
+class TransportError(Exception):
+    pass
+
+def openPort(port):
+    import serial # Only loaded when a real port is opened
+    return serial.Serial(port, baudrate=115200, timeout=1)
+
+# Name of a command for the statistics, without its value: ":POW 24W" -> ":POW", ":INPut ON" -> ":INPut", "ISET01:2.0" -> "ISET01"
+def commandName(command):
+    return re.sub(r"( \S+|:[\d.]+\w*)$", "", command)
+
+class CommandStats:
+    def __init__(self):
+        self.requests = 0
+        self.timeouts = 0
+        self.parse_errors = 0
+        self.port_errors = 0
+        self.failures = 0 # Requests that failed after all retries
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.histogram = [0] * (len(LATENCY_BINS) + 1)
+
+    def addLatency(self, latency):
+        ms = latency * 1000
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        k = 0
+        while k < len(LATENCY_BINS) and ms > LATENCY_BINS[k]:
+            k += 1
+        self.histogram[k] += 1
+
+    def toDict(self):
+        answered = sum(self.histogram)
+        return {
+            "requests": self.requests, "timeouts": self.timeouts, "parse_errors": self.parse_errors,
+            "port_errors": self.port_errors, "failures": self.failures,
+            "latency_mean_ms": self.latency_total / answered * 1000 if answered > 0 else None,
+            "latency_max_ms": self.latency_max * 1000,
+            "histogram_ms": {f"<={edge}": count for edge, count in zip(LATENCY_BINS, self.histogram)} | {f">{LATENCY_BINS[-1]}": self.histogram[-1]},
+        }
+
+class SerialTransport:
+    # open: function(port) returning a serial.Serial like object (write, readline, reset_input_buffer, close)
+    def __init__(self, port, open=openPort, retries=3, reopen_delay=1.0, sleep=time.sleep):
+        self.port = port
+        self.open = open
+        self.retries = retries
+        self.reopen_delay = reopen_delay
+        self.sleep = sleep
+        self.stats = {}
+        self.reopens = 0
+        self.profiler = NULL_PROFILER # Counts serial calls and bytes when profiling (see Profiling.py)
+        self.ser = open(port)
+
+    @property
+    def is_open(self):
+        return self.ser is not None and self.ser.is_open
+
+    def commandStats(self, command):
+        name = commandName(command)
+        if name not in self.stats:
+            self.stats[name] = CommandStats()
+        return self.stats[name]
+
+    # Close the port (ignoring errors) and forget it, so the next request reopens it. The failed handle
+    # has to be closed: on Windows an open COM handle keeps the port from being opened again
+    def dropPort(self):
+        try:
+            if self.ser is not None:
+                self.ser.close()
+        except OSError:
+            pass
+        self.ser = None
+
+    # Close the port and open it again. Used after a port error
+    def reopen(self):
+        self.dropPort()
+        self.sleep(self.reopen_delay)
+        self.ser = self.open(self.port)
+        self.reopens += 1
+        print(f"Reopened serial port {self.port}")
+
+    def discardInput(self):
+        try:
+            self.ser.reset_input_buffer()
+        except OSError:
+            pass
+
+    # Send a command that has no reply
+    def send(self, command):
+        stats = self.commandStats(command)
+        stats.requests += 1
+        for attempt in range(self.retries + 1):
+            try:
+                if not self.is_open:
+                    self.reopen()
+                self.ser.write((command + "\n").encode())
+                self.profiler.count("serial_calls")
+                self.profiler.count("serial_bytes_out", len(command) + 1)
+                return
+            except OSError as e:
+                stats.port_errors += 1
+                print(f"Serial port error on {command} ({e}). Reopening port...")
+                self.dropPort()
+        stats.failures += 1
+        raise TransportError(f"Could not send {command} to {self.port} after {self.retries + 1} attempts")
+
+    # Send a query and return the parsed reply. The reply is split into `fields` ;-separated fields,
+    # which may also arrive on separate lines. parse is applied to every field, or is a list with a
+    # parse function per field; a single field is returned as is, several as a tuple. A parse function
+    # raises ValueError to reject a reply (e.g. one with the wrong unit), which is then retried.
+    # retries overrides the number of retries of the transport
+    def query(self, command, parse=str, fields=1, retries=None):
+        stats = self.commandStats(command)
+        stats.requests += 1
+        retries = self.retries if retries is None else retries
+        parsers = list(parse) if isinstance(parse, (list, tuple)) else [parse] * fields
+        for attempt in range(retries + 1):
+            try:
+                if not self.is_open:
+                    self.reopen()
+                elif attempt > 0:
+                    self.discardInput() # A late reply to the previous attempt must not answer this one
+                start = time.perf_counter()
+                self.ser.write((command + "\n").encode())
+                self.profiler.count("serial_calls")
+                self.profiler.count("serial_bytes_out", len(command) + 1)
+                replies = []
+                while len(replies) < fields:
+                    raw = self.ser.readline()
+                    self.profiler.count("serial_bytes_in", len(raw))
+                    line = raw.decode(errors="replace").strip()
+                    if line == "":
+                        break
+                    replies += line.split(";")
+                latency = time.perf_counter() - start
+                if len(replies) == 0:
+                    stats.timeouts += 1
+                    self.profiler.count("serial_timeouts")
+                    continue
+                if len(replies) != fields:
+                    raise ValueError(f"Expected {fields} fields, got {replies}")
+                values = tuple(parse(r) for parse, r in zip(parsers, replies))
+                stats.addLatency(latency)
+                return values[0] if fields == 1 else values
+            except ValueError as e:
+                stats.parse_errors += 1
+                print(f"Could not parse reply to {command} ({e}). Retrying...")
+            except OSError as e:
+                stats.port_errors += 1
+                print(f"Serial port error on {command} ({e}). Reopening port...")
+                self.dropPort()
+        stats.failures += 1
+        raise TransportError(f"No valid reply to {command} from {self.port} after {retries + 1} attempts")
+
+    # Read one raw line, for commands that may or may not answer
+    def readline(self):
+        return self.ser.readline()
+
+    def reset_input_buffer(self):
+        self.discardInput()
+
+    def close(self):
+        if self.ser is not None:
+            self.ser.close()
+
+    def statsReport(self):
+        return {"port": self.port, "reopens": self.reopens, "commands": {name: s.toDict() for name, s in self.stats.items()}}
+
+    def printStats(self):
+        for name, s in self.stats.items():
+            answered = sum(s.histogram)
+            mean = f"{s.latency_total / answered * 1000:.1f}" if answered > 0 else "-"
+            print(f"\t{name:<20} {s.requests} requests, mean {mean} ms, max {s.latency_max * 1000:.1f} ms, "
+                f"{s.timeouts} timeouts, {s.parse_errors} parse errors, {s.port_errors} port errors, {s.failures} failed")
+
+    def saveStats(self, path):
+        with open(path, "w") as f:
+            json.dump(self.statsReport(), f, indent=4)
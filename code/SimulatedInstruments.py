@@ -0,0 +1,219 @@
+# SimulatedInstruments.py
+# DATE: 18/10 2026
+
+# Stand-ins for the instruments, so that the collectors can be run, tested and benchmarked without
+# hardware. They have the subset of the serial.Serial interface that the collectors use (write,
+# readline, reset_input_buffer, close, is_open, port) and answer the same commands as:
+#   - the KORAD style power supply (ISET01?, VSET01?, IOUT01?, VOUT01?, OUT01?, ISET01:x, VSET01:x, OUT01:1)
+#   - the SCPI electronic load (*IDN?, :FUNC?, :INPut?, :INPut ON, :POW?, :POW xW, :CURR xW, :MEASure:CURRent?, ...)
+#
+# Both are connected to a simple battery model (open circuit voltage curve + internal resistance),
+# and have configurable reply latency, measurement noise and fault injection (dropped, garbled
+# replies and disconnects). Time in the battery model can run faster than real time (time_scale),
+# so that a multi-day run can be simulated in minutes.
+
+import math
+import time
+import random
+
+# Raised when a simulated port is used while disconnected. Same base class (OSError) as serial.SerialException
+class SimulatedSerialException(OSError):
+    pass
+
+class BatteryModel:
+    # Defaults roughly match the 9 cell Saft Sunica pack: ~12 V nominal, ~100 Ah
+    def __init__(self, capacity=100.0, soc=1.0, cells=9, resistance=0.05, temperature=20):
+        self.capacity = capacity # Ah
+        self.soc = soc # State of charge, 0-1
+        self.cells = cells
+        self.resistance = resistance # Ohm
+        self.temperature = temperature # C. Below 0 C the resistance goes up and the usable capacity goes down
+        self.current = 0.0 # A, positive when charging and negative when discharging
+        self.last_update = time.monotonic() # Kept here so that two instruments on the same battery dont both advance it
+
+    def effectiveResistance(self):
+        return self.resistance * (1 + max(0, -self.temperature) * 0.1)
+
+    # Open circuit voltage: flat plateau with a steep knee at both ends
+    def ocv(self):
+        soc = min(max(self.soc, 0.0), 1.0)
+        cell = 1.05 + 0.25 * soc + 0.05 * math.log((soc + 0.01) / 0.01) / 4.6 - 0.15 * math.exp(-soc * 40) + 0.1 * math.exp((soc - 1) * 30)
+        return self.cells * cell
+
+    def terminalVoltage(self):
+        if self.soc <= 0 and self.current <= 0:
+            return 0.0 # Empty battery, the voltage collapses
+        return self.ocv() + self.current * self.effectiveResistance()
+
+    # Advance the model dt seconds with the present current
+    def step(self, dt):
+        efficiency = 0.85 if self.current > 0 else 1.0 # Part of the charge goes to gassing
+        self.soc += self.current * efficiency * dt / 3600 / self.capacity
+        self.soc = min(max(self.soc, 0.0), 1.0)
+
+class SimulatedSerial:
+    # latency: reply latency in s. noise: standard deviation of measurement noise (relative)
+    # faults: probabilities per reply, e.g. {"drop": 0.01, "garble": 0.01, "disconnect": 0.001}
+    # time_scale: simulated seconds per real second for the battery model
+    def __init__(self, port, battery, latency=0.005, noise=0.001, faults=None, time_scale=1.0, timeout=1.0, baudrate=115200, seed=None):
+        self.port = port
+        self.battery = battery
+        self.latency = latency
+        self.noise = noise
+        self.faults = faults or {}
+        self.time_scale = time_scale
+        self.timeout = timeout
+        self.baudrate = baudrate
+        self.rng = random.Random(seed)
+        self.replies = []
+        self.is_open = True
+        self.writes = 0
+        self.bytes_written = 0
+
+    def checkOpen(self):
+        if not self.is_open:
+            raise SimulatedSerialException(f"Simulated port {self.port} is not open")
+
+    def open(self):
+        self.is_open = True
+        self.replies = []
+
+    def close(self):
+        self.is_open = False
+
+    def reset_input_buffer(self):
+        self.checkOpen()
+        self.replies = []
+
+    # Advance the battery to now (at most one minute at a time, so the model stays accurate)
+    def update(self):
+        now = time.monotonic()
+        dt = (now - self.battery.last_update) * self.time_scale
+        self.battery.last_update = now
+        while dt > 0:
+            step = min(dt, 60)
+            self.applyOutput()
+            self.battery.step(step)
+            dt -= step
+        self.applyOutput()
+
+    def measured(self, value):
+        return value * (1 + self.rng.gauss(0, self.noise))
+
+    def write(self, data):
+        self.checkOpen()
+        self.writes += 1
+        self.bytes_written += len(data)
+        self.update()
+        for line in data.decode().strip().split("\n"):
+            self.handleLine(line.strip())
+        return len(data)
+
+    def readline(self):
+        self.checkOpen()
+        if self.rng.random() < self.faults.get("disconnect", 0):
+            self.is_open = False
+            raise SimulatedSerialException(f"Simulated port {self.port} disconnected")
+        if not self.replies or self.rng.random() < self.faults.get("drop", 0):
+            self.replies = self.replies[1:]
+            time.sleep(self.timeout) # No reply, so readline times out
+            return b""
+        reply = self.replies.pop(0)
+        if self.rng.random() < self.faults.get("garble", 0):
+            reply = reply[:self.rng.randrange(len(reply) + 1)] + "#"
+        time.sleep(self.latency + (len(reply) + 1) * 10 / self.baudrate) # Reply latency + transfer time (10 bits per byte)
+        return (reply + "\n").encode()
+
+    def reply(self, s):
+        self.replies.append(s)
+
+class SimulatedPowerSupply(SimulatedSerial):
+    def __init__(self, port="SIM-PSU", battery=None, **kwargs):
+        super().__init__(port, battery if battery is not None else BatteryModel(soc=0.05), **kwargs)
+        self.iset = 0.0
+        self.vset = 0.0
+        self.on = False
+
+    # CC-CV: the current is limited by the set current, or by the set voltage minus the battery voltage
+    def applyOutput(self):
+        if not self.on:
+            self.battery.current = 0.0 if self.battery.current > 0 else self.battery.current
+            return
+        cv_current = (self.vset - self.battery.ocv()) / self.battery.effectiveResistance()
+        self.battery.current = max(0.0, min(self.iset, cv_current))
+
+    def handleLine(self, line):
+        if line == "ISET01?":
+            self.reply(f"{self.iset:.3f}")
+        elif line == "VSET01?":
+            self.reply(f"{self.vset:.2f}")
+        elif line == "IOUT01?":
+            self.reply(f"{self.measured(self.battery.current if self.on else 0.0):.3f}")
+        elif line == "VOUT01?":
+            self.reply(f"{self.measured(self.battery.terminalVoltage() if self.on else 0.0):.2f}")
+        elif line == "OUT01?":
+            self.reply("1" if self.on else "0")
+        elif line.startswith("ISET01:"):
+            self.iset = float(line[7:])
+        elif line.startswith("VSET01:"):
+            self.vset = float(line[7:])
+        elif line.startswith("OUT01:"):
+            self.on = line[6:] == "1"
+        self.applyOutput()
+
+class SimulatedElectronicLoad(SimulatedSerial):
+    def __init__(self, port="SIM-LOAD", battery=None, supports_batch=True, **kwargs):
+        super().__init__(port, battery if battery is not None else BatteryModel(), **kwargs)
+        self.supports_batch = supports_batch
+        self.power = 0.0
+        self.max_current = 10.0
+        self.on = False
+
+    # CW: solve U * I = P with U = OCV - I * R for the discharge current
+    def applyOutput(self):
+        if not self.on or self.battery.soc <= 0:
+            self.battery.current = 0.0 if self.battery.current < 0 else self.battery.current
+            return
+        ocv = self.battery.ocv()
+        r = self.battery.effectiveResistance()
+        discriminant = ocv * ocv - 4 * r * self.power
+        current = (ocv - math.sqrt(discriminant)) / (2 * r) if discriminant >= 0 else self.max_current
+        self.battery.current = -min(current, self.max_current)
+
+    def measurement(self, query):
+        current = -self.battery.current if self.on else 0.0
+        voltage = self.battery.terminalVoltage()
+        if query == ":MEASure:CURRent?":
+            return f"{self.measured(current):.4f}A"
+        if query == ":MEASure:VOLTage?":
+            return f"{self.measured(voltage):.3f}V"
+        if query == ":MEASure:POWer?":
+            return f"{self.measured(current * voltage):.3f}W"
+        return None
+
+    def handleLine(self, line):
+        if ";" in line:
+            if self.supports_batch:
+                replies = [self.measurement(q) for q in line.split(";")]
+                if None not in replies:
+                    self.reply(";".join(replies))
+            return # An instrument without batch support does not answer
+        if line == "*IDN?":
+            self.reply("SIMULATED,ELECTRONIC LOAD,0,1.0")
+        elif line == ":FUNC?":
+            self.reply("CW")
+        elif line == ":INPut?":
+            self.reply("ON" if self.on else "OFF")
+        elif line == ":INPut ON":
+            self.on = True
+        elif line == ":INPut OFF":
+            self.on = False
+        elif line == ":POW?":
+            self.reply(f"{self.power:.3f}W")
+        elif line.startswith(":POW "):
+            self.power = float(line[5:].rstrip("W"))
+        elif line.startswith(":CURR "):
+            self.max_current = float(line[6:].rstrip("AW"))
+        elif line.startswith(":MEASure:") and self.measurement(line) is not None:
+            self.reply(self.measurement(line))
+        self.applyOutput()
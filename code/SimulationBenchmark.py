@@ -0,0 +1,88 @@
+# SimulationBenchmark.py
+# DATE: 18/10 2026
+
+# Hardware-free benchmark of the acquisition path, using the simulated instruments:
+#   1. Samples/s of the electronic load measurement queries, one query at a time vs. batched
+#   2. Tick jitter and phase times of a collector style loop (scheduler + queries + sample log)
+#   3. Missing samples and jitter of the AcquisitionEngine with many channels
+
+import os
+import tempfile
+import DischargeDataCollector as load
+import PowerSupplyDataCollector as psu
+from SimulatedInstruments import SimulatedElectronicLoad, SimulatedPowerSupply
+from SamplingScheduler import SamplingScheduler
+from SampleLog import SampleLogWriter, DISCHARGE_COLUMNS
+from AcquisitionEngine import AcquisitionEngine, Channel
+from SerialTransport import SerialTransport
+
+# Parameters
+LATENCIES = [0.002, 0.01, 0.03] # Simulated reply latencies in s
+QUERY_SAMPLES = 50 # Samples per latency in the query benchmark
+TICK_INTERVAL = 0.05 # s
+TICKS = 100
+ENGINE_CHANNELS = 8
+ENGINE_INTERVAL = 0.2 # s
+ENGINE_TICKS = 25
+ENGINE_LATENCY = 0.02 # s
+
+def resetQueryStats(batched):
+    load.query_stats.update(samples=0, round_trips=0, time=0.0, batched=batched)
+
+def benchmarkQueries():
+    print("1. Electronic load measurement queries")
+    print(f"{'Latency (ms)':>14} {'Sequential (samples/s)':>24} {'Batched (samples/s)':>21}")
+    for latency in LATENCIES:
+        rates = []
+        for batched in [False, True]:
+            ser = SerialTransport("SIM", open=lambda port: SimulatedElectronicLoad(port, latency=latency, seed=0))
+            load.setCWPower(ser, 24)
+            load.setOnState(ser, True)
+            resetQueryStats(batched)
+            for _ in range(QUERY_SAMPLES):
+                load.getMeasureAll(ser)
+            rates.append(load.query_stats["samples"] / load.query_stats["time"])
+        print(f"{latency * 1000:>14.0f} {rates[0]:>24.1f} {rates[1]:>21.1f}")
+
+def benchmarkCollectorLoop(directory):
+    print(f"\n2. Collector loop, {TICKS} ticks at {TICK_INTERVAL * 1000:.0f} ms")
+    ser = SerialTransport("SIM", open=lambda port: SimulatedElectronicLoad(port, latency=0.005, seed=0))
+    load.setCWPower(ser, 24)
+    load.setOnState(ser, True)
+    resetQueryStats(True)
+    scheduler = SamplingScheduler(TICK_INTERVAL, TICKS * TICK_INTERVAL)
+    with SampleLogWriter(os.path.join(directory, "collector.bin"), DISCHARGE_COLUMNS) as log:
+        for t_nominal, t in scheduler.ticks():
+            with scheduler.phase("query"):
+                i, u, p = load.getMeasureAll(ser)
+            with scheduler.phase("save"):
+                log.append(t, i, u, p)
+    scheduler.close()
+    scheduler.printStats()
+
+def benchmarkEngine(directory):
+    print(f"\n3. Acquisition engine, {ENGINE_CHANNELS} channels at {ENGINE_INTERVAL * 1000:.0f} ms, {ENGINE_LATENCY * 1000:.0f} ms latency")
+    channels = []
+    for k in range(ENGINE_CHANNELS):
+        if k % 2 == 0:
+            channels.append(Channel(f"load{k}", f"SIM{k}", load.getMeasureAll, ["I", "U", "P"],
+                setup=lambda ser: (load.setCWPower(ser, 24), load.setOnState(ser, True)),
+                open=lambda port: SerialTransport(port, open=lambda p: SimulatedElectronicLoad(p, latency=ENGINE_LATENCY))))
+        else:
+            channels.append(Channel(f"psu{k}", f"SIM{k}", lambda ser: (psu.getOutputCurrent(ser), psu.getOutputVoltage(ser)), ["I", "U"],
+                setup=lambda ser: (psu.setSetCurrent(ser, 2), psu.setSetVoltage(ser, 13.5), psu.setOnState(ser, True)),
+                open=lambda port: SerialTransport(port, open=lambda p: SimulatedPowerSupply(p, latency=ENGINE_LATENCY))))
+    engine = AcquisitionEngine(channels, ENGINE_INTERVAL, ENGINE_TICKS * ENGINE_INTERVAL, os.path.join(directory, "engine.bin"))
+    engine.connect()
+    engine.run()
+    engine.close()
+    print("Missing samples per channel: " + ", ".join(f"{c.name}: {c.missing}" for c in channels))
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarkQueries()
+        benchmarkCollectorLoop(directory)
+        benchmarkEngine(directory)
+
+if __name__ == "__main__":
+    main()
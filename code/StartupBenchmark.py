@@ -0,0 +1,65 @@
+# StartupBenchmark.py
+# DATE: 18/10 2026
+
+# Benchmark of the startup time of the subcommands of RunTool.py: the time from starting python until
+# the modules of the subcommand are imported and it can start working. Every case runs in a fresh
+# python process, best of REPEATS. Reported are the total time, the time above an empty python
+# process (interpreter startup is the same for every command and is not ours to speed up) and which
+# of the heavy modules got imported. Non-plotting commands should stay below TARGET above the interpreter.
+# The commands that work on the data need numpy, so its import time is printed too: it is the floor for them,
+# and the time of a command above python and numpy is what our own modules cost.
+
+import json
+import subprocess
+import sys
+import time
+
+# Parameters
+REPEATS = 7
+TARGET = 0.1 # s above the interpreter startup, for the commands that dont plot
+HEAVY_MODULES = ["numpy", "matplotlib", "wakepy", "serial", "zstandard"]
+
+# (name, command, mode, plots). mode None is the command on all runs
+CASES = [
+    ("help", None, None, False),
+    ("collect discharging", "collect", "discharging", False),
+    ("collect charging", "collect", "charging", False),
+    ("merge", "merge", "discharging", False),
+    ("analyze (one run)", "analyze", "discharging", False),
+    ("analyze (all runs)", "analyze", None, False),
+    ("plot (one run)", "plot", "discharging", True),
+    ("plot (all runs)", "plot", None, True),
+]
+
+def caseScript(command, mode):
+    load = f"RunTool.loadCommand({command!r}, {mode!r})" if command is not None else "RunTool.parser()"
+    return (f"import sys, json, RunTool; {load}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+
+# Best wall clock time of running script in a fresh python process, and its output
+def timeProcess(script, repeats=REPEATS):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best, output
+
+def main():
+    baseline, _ = timeProcess("pass")
+    numpy_time, _ = timeProcess("import numpy")
+    print(f"Empty python process: {baseline * 1000:.0f} ms, import numpy: {(numpy_time - baseline) * 1000:.0f} ms above that")
+    print(f"{'Command':<22} {'Total (ms)':>10} {'Above python (ms)':>18} {'Above numpy (ms)':>17}  Heavy modules imported")
+    for name, command, mode, plots in CASES:
+        duration, output = timeProcess(caseScript(command, mode))
+        overhead = duration - baseline
+        modules = json.loads(output)
+        above_numpy = f"{(duration - numpy_time) * 1000:.0f}" if "numpy" in modules else "-"
+        verdict = "" if plots else ("  OK" if overhead < TARGET else f"  SLOWER THAN {TARGET * 1000:.0f} ms")
+        print(f"{name:<22} {duration * 1000:>10.0f} {overhead * 1000:>18.0f} {above_numpy:>17}  {', '.join(modules) or '-'}{verdict}")
+    duration, _ = timeProcess("from matplotlib import pyplot")
+    print(f"{'(matplotlib.pyplot)':<22} {duration * 1000:>10.0f} {(duration - baseline) * 1000:>18.0f}  paid by plotting only")
+
+if __name__ == "__main__":
+    main()
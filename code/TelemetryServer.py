@@ -0,0 +1,129 @@
+# TelemetryServer.py
+# DATE: 18/10 2026
+
+# Small local HTTP endpoint that lets a dashboard follow a run while it is being measured, instead
+# of opening the PNGs that the collectors overwrite. Clients keep a cursor (the number of samples
+# they already have) and only get the samples after it, so following a multi-day run costs the
+# collector a few bytes per sample. Runs in a thread of the collector and only reads its buffer.
+#
+#   GET /status                            -> {"status": {...setpoints, on state...}, "columns": [...], "samples": n}
+#   GET /samples?cursor=N[&limit=M][&wait=s] -> {"cursor": next cursor, "samples": n, "data": {"t": [...], ...}, "status": {...}}
+#
+# With wait, the request blocks (long polling) until there are samples after the cursor or the
+# wait time has passed, so a client can follow the run without polling in a loop.
+#
+# Missing samples (NaN) are sent as null, so the replies are valid JSON. If the port is taken, the
+# run goes on without the endpoint.
+
+import json
+import threading
+import numpy as np
+
+HOST = "127.0.0.1" # Local only
+MAX_SAMPLES_PER_RESPONSE = 10000
+MAX_WAIT = 60 # s
+
+class TelemetryServer:
+    # samples is the ColumnBuffer of the collector. Once the server is started, append to it
+    # through append(), so that the server never reads it in the middle of a resize.
+    # port None turns the endpoint off; append() and updateStatus() still work
+    def __init__(self, samples, status=None, port=None, host=HOST):
+        self.samples = samples
+        self.status = dict(status or {})
+        self.port = port
+        self.host = host
+        self.condition = threading.Condition()
+        self.server = None
+        self.thread = None
+
+    # Bind the port and start serving. Returns False (and the run goes on without telemetry) if the port can not be bound
+    def start(self):
+        if self.port is None:
+            return False
+        from http.server import ThreadingHTTPServer # Only loaded when the endpoint is on, http.server is slow to import
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), makeHandler(self))
+        except OSError as e:
+            print(f"Could not start the telemetry on port {self.port} ({e}). Continuing without it...")
+            return False
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Telemetry on http://{self.host}:{self.server.server_port}/samples")
+        return True
+
+    def append(self, *values):
+        with self.condition:
+            self.samples.append(*values)
+            self.condition.notify_all()
+
+    # Update status fields such as the on state
+    def updateStatus(self, **fields):
+        with self.condition:
+            self.status.update(fields)
+            self.condition.notify_all()
+
+    def statusReply(self):
+        with self.condition:
+            return {"status": dict(self.status), "columns": list(self.samples.columns), "samples": len(self.samples)}
+
+    # The samples after cursor. Waits at most `wait` seconds for new samples if there are none
+    def samplesReply(self, cursor, limit=MAX_SAMPLES_PER_RESPONSE, wait=0):
+        with self.condition:
+            if wait > 0:
+                self.condition.wait_for(lambda: len(self.samples) > cursor, timeout=min(wait, MAX_WAIT))
+            count = len(self.samples)
+            start = min(cursor, count)
+            end = min(start + min(limit, MAX_SAMPLES_PER_RESPONSE), count)
+            data = {name: self.samples.data[name][start:end].copy() for name in self.samples.columns} # Copied while holding the lock
+            status = dict(self.status)
+        return {"cursor": end, "samples": count, "data": {name: jsonList(array) for name, array in data.items()}, "status": status}
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# Array as a list for JSON, with NaN (a missing sample) as None
+def jsonList(array):
+    values = array.tolist()
+    if array.dtype.kind == "f" and np.isnan(array).any():
+        values = [None if v != v else v for v in values]
+    return values
+
+def makeHandler(telemetry):
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+    class TelemetryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                if url.path == "/status":
+                    self.reply(200, telemetry.statusReply())
+                elif url.path == "/samples":
+                    cursor = int(query.get("cursor", ["0"])[0])
+                    limit = int(query.get("limit", [str(MAX_SAMPLES_PER_RESPONSE)])[0])
+                    wait = float(query.get("wait", ["0"])[0])
+                    if cursor < 0 or limit < 1:
+                        raise ValueError("cursor must be >= 0 and limit >= 1")
+                    self.reply(200, telemetry.samplesReply(cursor, limit, wait))
+                else:
+                    self.reply(404, {"error": f"Unknown path {url.path}"})
+            except ValueError as e:
+                self.reply(400, {"error": str(e)})
+
+        def reply(self, code, body):
+            data = json.dumps(body, allow_nan=False).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass # Dont print every request in the collector output
+
+    return TelemetryHandler